@@ -40,7 +40,7 @@ def main():
     pipeline = MoCapToRobot(
         args.hand, args.mano_config, dataset.finger_names,
         record_mapping_config=args.record_mapping_config,
-        robot_config=args.robot_config)
+        robot_config=args.robot_config, headless=True)
 
     if args.hand == "mia":
         angle = 1.0 if args.mia_thumb_adducted else -1.0
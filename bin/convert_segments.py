@@ -1,10 +1,12 @@
 """Convert MoCap segments to a robotic hand: record and embodiment mapping."""
 import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 from hand_embodiment.mocap_dataset import SegmentedHandMotionCaptureDataset
 from hand_embodiment.pipelines import MoCapToRobot
 from hand_embodiment.target_dataset import convert_mocap_to_robot
-from hand_embodiment.timing import timing_report
+from hand_embodiment.timing import TimeableMixin, timing_report
 from hand_embodiment.command_line import (
     add_hand_argument, add_configuration_arguments,
     add_frame_transform_arguments)
@@ -42,6 +44,9 @@ def parse_args():
     parser.add_argument(
         "--measure-time", action="store_true",
         help="Measure time of record and embodiment mapping.")
+    parser.add_argument(
+        "--n-jobs", type=int, default=1,
+        help="Number of processes that convert demonstrations in parallel.")
     add_frame_transform_arguments(parser)
 
     return parser.parse_args()
@@ -53,47 +58,138 @@ def main():
     dataset = SegmentedHandMotionCaptureDataset(
         args.demo_files[0], args.segment_label, mocap_config=args.mocap_config,
         label_field=args.label_field)
-    pipeline = MoCapToRobot(args.hand, args.mano_config, dataset.finger_names,
-                            record_mapping_config=args.record_mapping_config,
-                            robot_config=args.robot_config,
-                            measure_time=args.measure_time)
+    finger_names = dataset.finger_names
 
-    total_segment_idx = 0
-    for demo_file in args.demo_files:
-        dataset = SegmentedHandMotionCaptureDataset(
-            demo_file, args.segment_label, mocap_config=args.mocap_config,
-            interpolate_missing_markers=args.interpolate_missing_markers,
-            label_field=args.label_field)
-        if dataset.n_segments == 0:
-            continue
+    if args.n_jobs > 1:
+        record_timings, embodiment_timings = convert_parallel(
+            args, finger_names)
+    else:
+        record_timings, embodiment_timings = convert_serial(
+            args, finger_names)
+
+    if args.measure_time:
+        timing_report(record_timings, title="record mapping")
+        timing_report(embodiment_timings, title="embodiment mapping")
 
-        if args.hand == "mia":
-            angle = 1.0 if args.mia_thumb_adducted else -1.0
-            pipeline.set_constant_joint("j_thumb_opp_binary", angle)
 
+def convert_serial(args, finger_names):
+    """Convert all segments in this process."""
+    pipeline = make_pipeline(args, finger_names)
+
+    total_segment_idx = 0
+    for demo_file in args.demo_files:
+        dataset = load_dataset(args, demo_file)
         for i in range(dataset.n_segments):
             dataset.select_segment(i)
+            output_filename = convert_segment(
+                args, pipeline, dataset, total_segment_idx)
+            print(f"Saved demonstration to '{output_filename}'")
+            total_segment_idx += 1
 
-            mocap_origin2origin = extract_mocap_origin2object_generic(args, dataset)
+    return pipeline.record_mapping_, pipeline.embodiment_mapping_
 
-            output_dataset = convert_mocap_to_robot(
-                dataset, pipeline, mocap_origin2origin=mocap_origin2origin,
-                verbose=1)
 
-            if args.hand == "mia":
-                j_min, j_max = pipeline.transform_manager_.get_joint_limits("j_thumb_opp")
-                thumb_opp = j_max if args.mia_thumb_adducted else j_min
-                output_dataset.add_constant_finger_joint("j_thumb_opp", thumb_opp)
+def convert_parallel(args, finger_names):
+    """Distribute demonstrations to a process pool.
 
-            output_filename = args.output % total_segment_idx
-            output_dataset.export(output_filename, pipeline.hand_config_)
-            # TODO convert frequency
-            print(f"Saved demonstration to '{output_filename}'")
-            total_segment_idx += 1
+    Each worker creates its pipeline once and loads each of its
+    demonstrations once. Outputs are numbered and reported in the same order
+    as in the serial conversion.
+    """
+    record_timings = TimeableMixin(True)
+    embodiment_timings = TimeableMixin(True)
+    total_segment_idx = 0
+    with ProcessPoolExecutor(
+            max_workers=args.n_jobs, initializer=_init_worker,
+            initargs=(args, finger_names)) as executor:
+        for demo_idx, (tmp_filenames, record_timings_,
+                       embodiment_timings_) in enumerate(executor.map(
+                _convert_demo_file, args.demo_files,
+                range(len(args.demo_files)))):
+            # numbers of segments are only known after loading, so workers
+            # write temporary files that we rename in order
+            for tmp_filename in tmp_filenames:
+                output_filename = args.output % total_segment_idx
+                os.replace(tmp_filename, output_filename)
+                print(f"Saved demonstration to '{output_filename}'")
+                total_segment_idx += 1
+            record_timings.timings_.extend(record_timings_)
+            embodiment_timings.timings_.extend(embodiment_timings_)
+    return record_timings, embodiment_timings
+
+
+_worker_state = {}
+
+
+def _init_worker(args, finger_names):
+    _worker_state["args"] = args
+    _worker_state["pipeline"] = make_pipeline(args, finger_names)
+
+
+def _convert_demo_file(demo_file, demo_idx):
+    args = _worker_state["args"]
+    pipeline = _worker_state["pipeline"]
+    dataset = load_dataset(args, demo_file)
+
+    pipeline.clear_timings()
+    record_timings = []
+    embodiment_timings = []
+    tmp_filenames = []
+    for i in range(dataset.n_segments):
+        dataset.select_segment(i)
+        output_dir, output_name = os.path.split(args.output % 0)
+        tmp_filename = os.path.join(
+            output_dir, f".{demo_idx}_{i}_{output_name}.tmp")
+        tmp_filenames.append(convert_segment(
+            args, pipeline, dataset, None, progress_bar=False,
+            output_filename=tmp_filename))
+        record_timings.extend(pipeline.record_mapping_.timings_)
+        embodiment_timings.extend(pipeline.embodiment_mapping_.timings_)
+        pipeline.clear_timings()
+    return tmp_filenames, record_timings, embodiment_timings
+
+
+def make_pipeline(args, finger_names):
+    pipeline = MoCapToRobot(args.hand, args.mano_config, finger_names,
+                            record_mapping_config=args.record_mapping_config,
+                            robot_config=args.robot_config,
+                            measure_time=args.measure_time, headless=True)
+    if args.hand == "mia":
+        angle = 1.0 if args.mia_thumb_adducted else -1.0
+        pipeline.set_constant_joint("j_thumb_opp_binary", angle)
+    return pipeline
 
-    if args.measure_time:
-        timing_report(pipeline.record_mapping_, title="record mapping")
-        timing_report(pipeline.embodiment_mapping_, title="embodiment mapping")
+
+def load_dataset(args, demo_file):
+    return SegmentedHandMotionCaptureDataset(
+        demo_file, args.segment_label, mocap_config=args.mocap_config,
+        interpolate_missing_markers=args.interpolate_missing_markers,
+        label_field=args.label_field)
+
+
+def convert_segment(args, pipeline, dataset, total_segment_idx,
+                    progress_bar=True, output_filename=None):
+    """Convert selected segment of dataset and export it.
+
+    The output file is named after total_segment_idx unless output_filename
+    is given.
+    """
+    mocap_origin2origin = extract_mocap_origin2object_generic(args, dataset)
+
+    output_dataset = convert_mocap_to_robot(
+        dataset, pipeline, mocap_origin2origin=mocap_origin2origin,
+        verbose=1, progress_bar=progress_bar)
+
+    if args.hand == "mia":
+        j_min, j_max = pipeline.transform_manager_.get_joint_limits("j_thumb_opp")
+        thumb_opp = j_max if args.mia_thumb_adducted else j_min
+        output_dataset.add_constant_finger_joint("j_thumb_opp", thumb_opp)
+
+    if output_filename is None:
+        output_filename = args.output % total_segment_idx
+    output_dataset.export(output_filename, pipeline.hand_config_)
+    # TODO convert frequency
+    return output_filename
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+"""Evaluate embodiment mapping for frames of all segments of demonstrations.
+
+In contrast to eval_segment_frame_embodiment.py, the pipeline and the robot
+model will only be created once and each demonstration will only be loaded
+once. Results of all evaluated frames will be written to one table that can
+be summarized with eval_embodiment_summary.py.
+
+Example call:
+python bin/eval_embodiment.py mia close --frames -1 --mocap-config examples/config/markers/20210819_april.yaml --mano-config examples/config/mano/20210610_april.yaml --mia-thumb-adducted --demo-files data/20210819_april/20210819_r_WK37_insole_set0.json data/20210819_april/20210819_r_WK37_insole_set1.json --output-file result_metric/20210819_grasp_insole_mia.csv
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from hand_embodiment.mocap_dataset import SegmentedHandMotionCaptureDataset
+from hand_embodiment.pipelines import MoCapToRobot
+from hand_embodiment.command_line import (
+    add_hand_argument, add_configuration_arguments)
+from hand_embodiment.metrics import (
+    CONTACT_SURFACE_VERTICES, distances_robot_to_mano)
+from hand_embodiment.target_configurations import TARGET_CONFIG
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    add_hand_argument(parser)
+    parser.add_argument(
+        "segment_label", type=str,
+        help="Label of the segments that should be used.")
+    parser.add_argument(
+        "--demo-files", type=str, nargs="*",
+        default=["data/20210616_april/metadata/Measurement24.json"],
+        help="Demonstrations that should be used.")
+    parser.add_argument(
+        "--segments", type=int, nargs="*", default=None,
+        help="Segments of each demonstration that should be used. "
+             "All segments will be used by default.")
+    parser.add_argument(
+        "--frames", type=int, nargs="*", default=[-1],
+        help="Frames of each segment that should be used.")
+    add_configuration_arguments(parser)
+    parser.add_argument(
+        "--label-field", type=str, default="l1",
+        help="Name of the label field in metadata file.")
+    parser.add_argument(
+        "--interpolate-missing-markers", action="store_true",
+        help="Interpolate NaNs.")
+    parser.add_argument(
+        "--mia-thumb-adducted", action="store_true",
+        help="Adduct thumb of Mia hand.")
+    parser.add_argument(
+        "--output-file", type=str, default="embodiment_metric.csv",
+        help="File to which the results should be written (.csv).")
+    parser.add_argument(
+        "--n-jobs", type=int, default=1,
+        help="Number of processes that evaluate demonstrations in parallel.")
+    parser.add_argument(
+        "--contact-surface-cache", type=str, default=None,
+        help="Directory in which samples of robot contact surfaces will be "
+             "cached.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # one task per demonstration so that each file is only loaded once
+    if args.n_jobs > 1:
+        with ProcessPoolExecutor(
+                max_workers=args.n_jobs, initializer=_init_worker,
+                initargs=(args,)) as executor:
+            results = list(executor.map(_evaluate_demo_file, args.demo_files))
+    else:
+        _init_worker(args)
+        results = list(map(_evaluate_demo_file, args.demo_files))
+
+    results = pd.DataFrame([row for rows in results for row in rows])
+    results.to_csv(args.output_file, index=False)
+    print(f"Saved {len(results)} results to '{args.output_file}'")
+
+
+_worker_state = {}
+
+
+def _init_worker(args):
+    _worker_state["args"] = args
+    _worker_state["evaluator"] = None
+
+
+def _evaluate_demo_file(demo_file):
+    args = _worker_state["args"]
+    dataset = load_dataset(args, demo_file)
+    if _worker_state["evaluator"] is None:  # reuse for next demonstration
+        _worker_state["evaluator"] = EmbodimentEvaluator(args, dataset)
+    evaluator = _worker_state["evaluator"]
+
+    n_segments = dataset.n_segments
+    segments = range(n_segments) if args.segments is None else [
+        i for i in args.segments if i < n_segments]
+    rows = []
+    for segment_idx in segments:
+        dataset.select_segment(segment_idx)
+        for frame in args.frames:
+            print(f"{demo_file}: segment {segment_idx}, frame {frame}")
+            distances = evaluator.evaluate_frame(dataset, frame)
+            rows.append(dict(demo_file=demo_file, segment=segment_idx,
+                             frame=frame, **distances))
+    return rows
+
+
+class EmbodimentEvaluator:
+    """Computes distances between contact surfaces of MANO and robot.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Command line arguments.
+
+    dataset : SegmentedHandMotionCaptureDataset
+        Dataset from which we take the available fingers.
+    """
+    def __init__(self, args, dataset):
+        self.finger_names = [
+            finger_name for finger_name in dataset.finger_names
+            if finger_name in TARGET_CONFIG[args.hand]["ee_frames"]]
+
+        self.pipeline = MoCapToRobot(
+            args.hand, args.mano_config, self.finger_names,
+            record_mapping_config=args.record_mapping_config,
+            robot_config=args.robot_config)
+        if args.hand == "mia":
+            angle = 1.0 if args.mia_thumb_adducted else -1.0
+            self.pipeline.set_constant_joint("j_thumb_opp_binary", angle)
+
+        self.robot = self.pipeline.make_robot_artist()
+        self.robot_contact_surface_vertices = \
+            CONTACT_SURFACE_VERTICES[args.hand]
+        self.contact_surface_cache = args.contact_surface_cache
+
+    def evaluate_frame(self, dataset, frame):
+        """Evaluate embodiment mapping for a frame of the selected segment.
+
+        Parameters
+        ----------
+        dataset : SegmentedHandMotionCaptureDataset
+            Dataset with selected segment.
+
+        frame : int
+            Index of the frame.
+
+        Returns
+        -------
+        distances : dict
+            Average distance between contact surfaces per finger.
+        """
+        self.pipeline.reset()
+        self.pipeline.estimate_hand(
+            dataset.get_hand_markers(frame), dataset.get_finger_markers(frame))
+        self.pipeline.estimate_robot()
+        self.robot.set_data()
+        return distances_robot_to_mano(
+            self.pipeline.embodiment_mapping_.hand_state_, self.robot,
+            self.robot_contact_surface_vertices, self.finger_names,
+            cache_dir=self.contact_surface_cache)
+
+
+def load_dataset(args, demo_file):
+    return SegmentedHandMotionCaptureDataset(
+        demo_file, args.segment_label, mocap_config=args.mocap_config,
+        interpolate_missing_markers=args.interpolate_missing_markers,
+        label_field=args.label_field)
+
+
+if __name__ == "__main__":
+    main()
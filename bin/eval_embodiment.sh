@@ -1,6 +1,8 @@
 #!/bin/bash
 
 # perform quantitative evaluation of embodiment mapping
+# (frames that should be inspected visually can be rendered with
+# bin/eval_segment_frame_embodiment.py)
 
 #: <<'END'
 #END
@@ -8,205 +10,91 @@
 export OUTPUT_DIR=result_metric
 mkdir -p $OUTPUT_DIR
 
-export METRIC= #--no-metric
+export N_JOBS=${N_JOBS:-1}
 export RECORD_CONFIG="--record-mapping-config examples/config/record_mapping/20211105_april.yaml"
 export SUBJECT=r_WK37
 export HAND=robotiq  # mia shadow robotiq barrett
 
-export MESH=--insole
 export MOCAP_CONFIG="--mocap-config examples/config/markers/20210819_april.yaml"
 export MANO_CONFIG="--mano-config examples/config/mano/20210610_april.yaml"
 export LABEL=close
 export DATE=20210819
-declare -a SEGMENTS=(12 15 16 17 18)
-for i in "${!SEGMENTS[@]}"; do
-    for (( j=0; j < SEGMENTS[i]; j++ )); do
-        echo "Set ${i}; segment ${j}"
-        export SET=${i}
-        export SEGMENT=${j}
-        export FRAME=-1
-        python bin/eval_segment_frame_embodiment.py \
-            $HAND $LABEL $SEGMENT $FRAME $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG \
-            --demo-file data/${DATE}_april/${DATE}_${SUBJECT}_insole_set${SET}.json \
-            --output-image ${OUTPUT_DIR}/${DATE}_${SET}_grasp_insole_${HAND}_${SEGMENT}_${FRAME}.jpg \
-            --output-file ${OUTPUT_DIR}/${DATE}_${SET}_grasp_insole_${HAND}_${SEGMENT}_${FRAME}.json \
-            --show-mano $MESH $METRIC
-    done
-done
+python bin/eval_embodiment.py \
+    $HAND $LABEL --frames -1 $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --n-jobs $N_JOBS \
+    --demo-files data/${DATE}_april/${DATE}_${SUBJECT}_insole_set{0..4}.json \
+    --output-file ${OUTPUT_DIR}/${DATE}_grasp_insole_${HAND}.csv
 export DATE=20210820
-declare -a SEGMENTS=(15 15 15 17 18 16 19 20)
-for i in "${!SEGMENTS[@]}"; do
-    for (( j=0; j < SEGMENTS[i]; j++ )); do
-        echo "Set ${i}; segment ${j}"
-        export SET=${i}
-        export SEGMENT=${j}
-        export FRAME=-1
-        python bin/eval_segment_frame_embodiment.py \
-            $HAND $LABEL $SEGMENT $FRAME $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG \
-            --demo-file data/20210819_april/${DATE}_${SUBJECT}_insole_set${SET}.json \
-            --output-image ${OUTPUT_DIR}/${DATE}_${SET}_grasp_insole_${HAND}_${SEGMENT}_${FRAME}.jpg \
-            --output-file ${OUTPUT_DIR}/${DATE}_${SET}_grasp_insole_${HAND}_${SEGMENT}_${FRAME}.json \
-            --show-mano $MESH $METRIC
-    done
-done
+python bin/eval_embodiment.py \
+    $HAND $LABEL --frames -1 $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --n-jobs $N_JOBS \
+    --demo-files data/20210819_april/${DATE}_${SUBJECT}_insole_set{0..7}.json \
+    --output-file ${OUTPUT_DIR}/${DATE}_grasp_insole_${HAND}.csv
 
-export MESH=--pillow
 export MOCAP_CONFIG="--mocap-config examples/config/markers/20210826_april.yaml"
 export MANO_CONFIG="--mano-config examples/config/mano/20210610_april.yaml"
 export LABEL=close
 export DATE=20210826
-declare -a SEGMENTS=(21 21 19 40 19 24)
-for i in "${!SEGMENTS[@]}"; do
-    for (( j=0; j < SEGMENTS[i]; j++ )); do
-        echo "Set ${i}; segment ${j}"
-        export SET=${i}
-        export SEGMENT=${j}
-        export FRAME=-1
-        python bin/eval_segment_frame_embodiment.py \
-            $HAND $LABEL $SEGMENT $FRAME $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --mia-thumb-adducted \
-            --demo-file data/${DATE}_april/${DATE}_${SUBJECT}_small_pillow_set${SET}.json \
-            --output-image ${OUTPUT_DIR}/${DATE}_${SET}_pillow_small_${HAND}_${SEGMENT}_${FRAME}.jpg \
-            --output-file ${OUTPUT_DIR}/${DATE}_${SET}_pillow_small_${HAND}_${SEGMENT}_${FRAME}.json \
-            --show-mano $MESH $METRIC
-    done
-done
+python bin/eval_embodiment.py \
+    $HAND $LABEL --frames -1 $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --mia-thumb-adducted --n-jobs $N_JOBS \
+    --demo-files data/${DATE}_april/${DATE}_${SUBJECT}_small_pillow_set{0..5}.json \
+    --output-file ${OUTPUT_DIR}/${DATE}_pillow_small_${HAND}.csv
 export DATE=20210916
-declare -a SEGMENTS=(18 23 19 20)
-for i in "${!SEGMENTS[@]}"; do
-    for (( j=0; j < SEGMENTS[i]; j++ )); do
-        echo "Set ${i}; segment ${j}"
-        export SET=${i}
-        export SEGMENT=${j}
-        export FRAME=-1
-        python bin/eval_segment_frame_embodiment.py \
-            $HAND $LABEL $SEGMENT $FRAME $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --mia-thumb-adducted \
-            --demo-file data/20210826_april/${DATE}_${SUBJECT}_small_pillow_set${SET}.json \
-            --output-image ${OUTPUT_DIR}/${DATE}_${SET}_pillow_small_${HAND}_${SEGMENT}_${FRAME}.jpg \
-            --output-file ${OUTPUT_DIR}/${DATE}_${SET}_pillow_small_${HAND}_${SEGMENT}_${FRAME}.json \
-            --show-mano $MESH $METRIC
-    done
-done
+python bin/eval_embodiment.py \
+    $HAND $LABEL --frames -1 $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --mia-thumb-adducted --n-jobs $N_JOBS \
+    --demo-files data/20210826_april/${DATE}_${SUBJECT}_small_pillow_set{0..3}.json \
+    --output-file ${OUTPUT_DIR}/${DATE}_pillow_small_${HAND}.csv
 
-export MESH=--electronic
 export MOCAP_CONFIG="--mocap-config examples/config/markers/20211105_april.yaml"
 export MANO_CONFIG="--mano-config examples/config/mano/20210610_april.yaml"
 export LABEL=grasp
 export DATE=20211105
-declare -a SEGMENTS=(5 7 6 6 8 8 7 8)
-for i in "${!SEGMENTS[@]}"; do
-    for (( j=0; j < SEGMENTS[i]; j++ )); do
-        echo "Set ${i}; segment ${j}"
-        export SET=${i}
-        export SEGMENT=${j}
-        export FRAME=-1
-        python bin/eval_segment_frame_embodiment.py \
-            $HAND $LABEL $SEGMENT $FRAME $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG \
-            --demo-file data/${DATE}_april/${DATE}_${SUBJECT}_electronic_set${SET}.json \
-            --output-image ${OUTPUT_DIR}/${DATE}_${SET}_electronic_grasp_${HAND}_${SEGMENT}_${FRAME}.jpg \
-            --output-file ${OUTPUT_DIR}/${DATE}_${SET}_electronic_grasp_${HAND}_${SEGMENT}_${FRAME}.json \
-            --show-mano $MESH $METRIC
-    done
-done
+python bin/eval_embodiment.py \
+    $HAND $LABEL --frames -1 $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --n-jobs $N_JOBS \
+    --demo-files data/${DATE}_april/${DATE}_${SUBJECT}_electronic_set{0..7}.json \
+    --output-file ${OUTPUT_DIR}/${DATE}_electronic_grasp_${HAND}.csv
 
-export MESH=--electronic
 export MOCAP_CONFIG="--mocap-config examples/config/markers/20211105_april.yaml"
 export MANO_CONFIG="--mano-config examples/config/mano/20210610_april.yaml"
 export LABEL=insert
 export DATE=20211105
-declare -a SEGMENTS=(5 6 6 6 8 8 7 8)
-for i in "${!SEGMENTS[@]}"; do
-    for (( j=0; j < SEGMENTS[i]; j++ )); do
-        echo "Set ${i}; segment ${j}"
-        export SET=${i}
-        export SEGMENT=${j}
-        export FRAME=0
-        python bin/eval_segment_frame_embodiment.py \
-            $HAND $LABEL $SEGMENT $FRAME $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG \
-            --demo-file data/${DATE}_april/${DATE}_${SUBJECT}_electronic_set${SET}.json \
-            --output-image ${OUTPUT_DIR}/${DATE}_${SET}_electronic_insert_${HAND}_${SEGMENT}_${FRAME}.jpg \
-            --output-file ${OUTPUT_DIR}/${DATE}_${SET}_electronic_insert_${HAND}_${SEGMENT}_${FRAME}.json \
-            --show-mano $MESH $METRIC
-    done
-done
+python bin/eval_embodiment.py \
+    $HAND $LABEL --frames 0 $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --n-jobs $N_JOBS \
+    --demo-files data/${DATE}_april/${DATE}_${SUBJECT}_electronic_set{0..7}.json \
+    --output-file ${OUTPUT_DIR}/${DATE}_electronic_insert_${HAND}.csv
 
-export MESH=--passport
 export MOCAP_CONFIG="--mocap-config examples/config/markers/20211112_april.yaml"
 export MANO_CONFIG="--mano-config examples/config/mano/20210610_april.yaml"
 export LABEL=flip
 export DATE=20211112
-declare -a SEGMENTS=(11 13 14)
-for i in "${!SEGMENTS[@]}"; do
-    for (( j=0; j < SEGMENTS[i]; j++ )); do
-        echo "Set ${i}; segment ${j}"
-        export SET=${i}
-        export SEGMENT=${j}
-        export FRAME=0
-        python bin/eval_segment_frame_embodiment.py \
-            $HAND $LABEL $SEGMENT $FRAME $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --mia-thumb-adducted \
-            --demo-file data/${DATE}_april/${DATE}_${SUBJECT}_passport_set${SET}.json \
-            --output-image ${OUTPUT_DIR}/${DATE}_${SET}_flip_passport_${HAND}_${SEGMENT}_${FRAME}.jpg \
-            --output-file ${OUTPUT_DIR}/${DATE}_${SET}_flip_passport_${HAND}_${SEGMENT}_${FRAME}.json \
-            --show-mano $MESH $METRIC
-    done
-done
+python bin/eval_embodiment.py \
+    $HAND $LABEL --frames 0 $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --mia-thumb-adducted --n-jobs $N_JOBS \
+    --demo-files data/${DATE}_april/${DATE}_${SUBJECT}_passport_set{0..2}.json \
+    --output-file ${OUTPUT_DIR}/${DATE}_flip_passport_${HAND}.csv
 
 export MOCAP_CONFIG="--mocap-config examples/config/markers/20211126_april_insole.yaml"
 export MANO_CONFIG="--mano-config examples/config/mano/20211105_april.yaml"
 export LABEL=insert
 export DATE=20211126
-declare -a SEGMENTS=(6 6)
-for i in "${!SEGMENTS[@]}"; do
-    for (( j=0; j < SEGMENTS[i]; j++ )); do
-        echo "Set ${i}; segment ${j}"
-        export SET=${i}
-        export SEGMENT=${j}
-        export FRAME=0
-        python bin/eval_segment_frame_embodiment.py \
-            $HAND $LABEL $SEGMENT $FRAME $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --mia-thumb-adducted \
-            --demo-file data/${DATE}_april_insole/${DATE}_${SUBJECT}_insert_insole_set${SET}.json \
-            --output-image ${OUTPUT_DIR}/${DATE}_${SET}_insole_insert_${HAND}_${SEGMENT}_${FRAME}.jpg \
-            --output-file ${OUTPUT_DIR}/${DATE}_${SET}_insole_insert_${HAND}_${SEGMENT}_${FRAME}.json \
-            --show-mano $METRIC
-    done
-done
+python bin/eval_embodiment.py \
+    $HAND $LABEL --frames 0 $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --mia-thumb-adducted --n-jobs $N_JOBS \
+    --demo-files data/${DATE}_april_insole/${DATE}_${SUBJECT}_insert_insole_set{0..1}.json \
+    --output-file ${OUTPUT_DIR}/${DATE}_insole_insert_${HAND}.csv
 
 export MOCAP_CONFIG="--mocap-config examples/config/markers/20211126_april_pillow.yaml"
 export MANO_CONFIG="--mano-config examples/config/mano/20211105_april.yaml"
 export LABEL=grasp
 export DATE=20211126
-declare -a SEGMENTS=(33 37 30 30)
-for i in "${!SEGMENTS[@]}"; do
-    for (( j=0; j < SEGMENTS[i]; j++ )); do
-        echo "Set ${i}; segment ${j}"
-        export SET=${i}
-        export SEGMENT=${j}
-        export FRAME=-1
-        python bin/eval_segment_frame_embodiment.py \
-            $HAND $LABEL $SEGMENT $FRAME $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --mia-thumb-adducted \
-            --demo-file data/${DATE}_april_pillow/${DATE}_${SUBJECT}_big_pillow_set${SET}.json \
-            --output-image ${OUTPUT_DIR}/${DATE}_${SET}_pillow_big_${HAND}_${SEGMENT}_${FRAME}.jpg \
-            --output-file ${OUTPUT_DIR}/${DATE}_${SET}_pillow_big_${HAND}_${SEGMENT}_${FRAME}.json \
-            --show-mano $METRIC
-    done
-done
+python bin/eval_embodiment.py \
+    $HAND $LABEL --frames -1 $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --mia-thumb-adducted --n-jobs $N_JOBS \
+    --demo-files data/${DATE}_april_pillow/${DATE}_${SUBJECT}_big_pillow_set{0..3}.json \
+    --output-file ${OUTPUT_DIR}/${DATE}_pillow_big_${HAND}.csv
 
-export MESH=--passport-closed
 export MOCAP_CONFIG="--mocap-config examples/config/markers/20211217_april.yaml"
 export MANO_CONFIG="--mano-config examples/config/mano/20211105_april.yaml"
 export LABEL=insert
 export DATE=20211217
-declare -a SEGMENTS=(8 8 9 12)
-for i in "${!SEGMENTS[@]}"; do
-    for (( j=0; j < SEGMENTS[i]; j++ )); do
-        echo "Set ${i}; segment ${j}"
-        export SET=${i}
-        export SEGMENT=${j}
-        export FRAME=0
-        python bin/eval_segment_frame_embodiment.py \
-            $HAND $LABEL $SEGMENT $FRAME $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --mia-thumb-adducted \
-            --demo-file data/${DATE}_april/${DATE}_${SUBJECT}_passport_box_set${SET}.json \
-            --output-image ${OUTPUT_DIR}/${DATE}_${SET}_passport_insert_${HAND}_${SEGMENT}_${FRAME}.jpg \
-            --output-file ${OUTPUT_DIR}/${DATE}_${SET}_passport_insert_${HAND}_${SEGMENT}_${FRAME}.json \
-            --show-mano $MESH $METRIC
-    done
-done
+python bin/eval_embodiment.py \
+    $HAND $LABEL --frames 0 $MOCAP_CONFIG $MANO_CONFIG $RECORD_CONFIG --mia-thumb-adducted --n-jobs $N_JOBS \
+    --demo-files data/${DATE}_april/${DATE}_${SUBJECT}_passport_box_set{0..3}.json \
+    --output-file ${OUTPUT_DIR}/${DATE}_passport_insert_${HAND}.csv
+
+python bin/eval_embodiment_summary.py "${OUTPUT_DIR}/*_${HAND}.csv"
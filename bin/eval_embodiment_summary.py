@@ -1,8 +1,14 @@
-"""Summarize results of evaluation of embodiment mapping."""
+"""Summarize results of evaluation of embodiment mapping.
+
+Results can either be JSON files of eval_segment_frame_embodiment.py with
+one sample per file or CSV tables of eval_embodiment.py with one sample per
+row.
+"""
 import argparse
 import glob
 import json
 import numpy as np
+import pandas as pd
 
 
 def parse_args():
@@ -12,19 +18,43 @@ def parse_args():
     return parser.parse_args()
 
 
+def load_results(filename):
+    """Load results of evaluated frames.
+
+    Parameters
+    ----------
+    filename : str
+        JSON file with one result or CSV table with one result per row.
+
+    Returns
+    -------
+    results : list of dict
+        Distances per finger for each frame.
+    """
+    if filename.endswith(".csv"):
+        table = pd.read_csv(filename)
+        table = table.drop(columns=["demo_file", "segment", "frame"])
+        return [{finger: distance for finger, distance in row.items()
+                 if not np.isnan(distance)}
+                for row in table.to_dict(orient="records")]
+    with open(filename, "r") as f:
+        return [json.load(f)]
+
+
 def summary(args):
     filenames = list(glob.glob(args.pattern))
     metrics = {}
+    n_samples = 0
 
     for filename in filenames:
-        with open(filename, "r") as f:
-            result = json.load(f)
+        for result in load_results(filename):
+            n_samples += 1
             for finger in result:
                 if finger not in metrics:
                     metrics[finger] = []
                 metrics[finger].append(result[finger])
 
-    print(f"{len(filenames)} samples")
+    print(f"{n_samples} samples")
     for finger in metrics:
         print(f"{finger}:\t{np.mean(metrics[finger]):.4f} in "
               f"[{min(metrics[finger]):.4f}, {max(metrics[finger]):.4f}]")
@@ -1,98 +1,151 @@
-"""Live visualization of data streamed from MoCap system."""
-import json
+"""Live visualization of data streamed from MoCap system.
+
+Marker frames are received via UDP (see vis_qualisys_live.py) or replayed
+from a Qualisys tsv file and converted by a MarkerToRobotService that runs
+in a background thread. Published states are applied to a separate model of
+the robotic hand that is only used for visualization.
+
+Example calls:
+python bin/experimental/vis_live.py shadow --port 6543
+python bin/experimental/vis_live.py mia --replay test/data/recording.tsv --replay-speed 1
+"""
+import argparse
+import asyncio
+import threading
+
 import numpy as np
 import pytransform3d.visualizer as pv
-from hand_embodiment.record_markers import MarkerBasedRecordMapping
-from hand_embodiment.embodiment import HandEmbodiment
-from hand_embodiment.config import load_mano_config
-from hand_embodiment.target_configurations import MIA_CONFIG, SHADOW_HAND_CONFIG
-from hand_embodiment.vis_utils import ManoHand
-
-
-def animation_callback(step, markers, mbrm, hand, emb, robot):
-    try:
-        with open("comm.json", "r") as f:
-            result = json.load(f)
-    except:
-        return []
-
-    marker_pos = np.empty((len(result), 3))
-    for i, marker_name in enumerate(result):
-        marker_pos[i] = result[marker_name]
-
-    # Filter positions
-    nan = np.isnan(marker_pos)
-    valid = not np.any(nan)
-    marker_pos[nan] = 0.0
-
-    markers.set_data(marker_pos)
-
-    if not valid:
-        return markers
-
-    hand_markers = [np.array(result["hand_top"]),
-                    np.array(result["hand_left"]),
-                    np.array(result["hand_right"])]
-    finger_markers = {
-        "thumb": np.array(result["thumb_tip"]),
-        "index": np.array(result["index_tip"]),
-        "middle": np.array(result["middle_tip"]),
-        "ring": np.array(result["ring_tip"]),
-        "little": np.array(result["little_tip"])
-    }
-    mbrm.estimate(hand_markers, finger_markers)
-
-    emb.solve(mbrm.mano2world_, use_cached_forward_kinematics=True)
-
-    artists = [markers]
-    if show_mano:
-        hand.set_data()
-        artists.append(hand)
-    if show_robot:
-        robot.set_data()
-        artists.append(robot)
-
-    return artists
-
-
-hand = "shadow_hand"
-show_mano = False
-show_robot = True
-
-
-if hand == "shadow_hand":
-    hand_config = SHADOW_HAND_CONFIG
-elif hand == "mia":
-    hand_config = MIA_CONFIG
-else:
-    raise Exception(f"Unknown hand: '{hand}'")
-
-
-mano2hand_markers, betas = load_mano_config(
-    "examples/config/april_test_mano.yaml")
-mbrm = MarkerBasedRecordMapping(
-    left=False, mano2hand_markers=mano2hand_markers,
-    shape_parameters=betas, verbose=1)
-emb = HandEmbodiment(
-    mbrm.hand_state_, hand_config,
-    use_fingers=("thumb", "index", "middle", "ring", "little"),
-    mano_finger_kinematics=mbrm.mano_finger_kinematics_,
-    initial_handbase2world=mbrm.mano2world_, verbose=1)
-hand = ManoHand(mbrm, show_mesh=True, show_vertices=False)
-robot = pv.Graph(
-    emb.target_kin.tm, "world", show_frames=True, whitelist=[hand_config["base_frame"]],
-    show_connections=False, show_visuals=True, show_collision_objects=False,
-    show_name=False, s=0.02)
-
-fig = pv.figure()
-fig.plot_transform(s=0.5)
-markers = fig.scatter(fig, np.zeros((13, 3)), s=0.006)
-if show_mano:
-    hand.add_artist(fig)
-if show_robot:
+from hand_embodiment.embodiment import load_kinematic_model
+from hand_embodiment.pipelines import MoCapToRobot
+from hand_embodiment.streaming import (
+    MarkerToRobotService, UdpMarkerSource, ReplayMarkerSource)
+from hand_embodiment.command_line import (
+    add_hand_argument, add_configuration_arguments)
+from hand_embodiment.target_configurations import TARGET_CONFIG
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    add_hand_argument(parser)
+    add_configuration_arguments(parser)
+    parser.add_argument(
+        "--host", type=str, default="0.0.0.0",
+        help="Local address on which marker frames will be received.")
+    parser.add_argument(
+        "--port", type=int, default=6543,
+        help="Local port on which marker frames will be received.")
+    parser.add_argument(
+        "--replay", type=str, default=None,
+        help="Replay Qualisys tsv file instead of receiving marker frames.")
+    parser.add_argument(
+        "--replay-speed", type=float, default=None,
+        help="Replay speed relative to the frequency of the recording. "
+             "Frames will be replayed as fast as possible by default.")
+    parser.add_argument(
+        "--mia-thumb-adducted", action="store_true",
+        help="Adduct thumb of Mia hand.")
+    return parser.parse_args()
+
+
+class LatestState:
+    """Subscriber that stores the latest state of the robotic hand."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = None
+
+    def __call__(self, state):
+        with self.lock:
+            self.state = state
+
+    def pop(self):
+        with self.lock:
+            state = self.state
+            self.state = None
+        return state
+
+
+class AnimationCallback:
+    """Updates the robotic hand and regularly prints latency statistics."""
+    def __init__(self, latest_state, robot, tm, hand_config, service,
+                 print_every=100):
+        self.latest_state = latest_state
+        self.robot = robot
+        self.tm = tm
+        self.hand_config = hand_config
+        self.service = service
+        self.print_every = print_every
+        self.n_updates = 0
+
+    def __call__(self, step):
+        state = self.latest_state.pop()
+        if state is None:
+            return self.robot
+        for finger_name, joint_angles in state.joint_angles.items():
+            for joint_name, angle in zip(
+                    self.hand_config["joint_names"][finger_name],
+                    joint_angles):
+                self.tm.set_joint(joint_name, angle)
+        self.tm.add_transform(
+            self.hand_config["base_frame"], "world", state.ee_pose)
+        self.robot.set_data()
+        self.n_updates += 1
+        if self.n_updates % self.print_every == 0:
+            for stage, stats in self.service.latency_stats_.items():
+                print(f"{stage}: {stats.summary()}")
+            print(f"received: {self.service.n_received_}, "
+                  f"dropped: {self.service.n_dropped_}, "
+                  f"invalid: {self.service.n_invalid_}")
+        return self.robot
+
+
+def main():
+    args = parse_args()
+
+    finger_names = [
+        finger_name for finger_name in ["thumb", "index", "middle", "ring",
+                                        "little"]
+        if finger_name in TARGET_CONFIG[args.hand]["ee_frames"]]
+    pipeline = MoCapToRobot(args.hand, args.mano_config, finger_names,
+                            record_mapping_config=args.record_mapping_config,
+                            robot_config=args.robot_config, headless=True)
+    # the service thread only writes to the pipeline's model and we only
+    # read from this one
+    _, vis_kin = load_kinematic_model(pipeline.hand_config_)
+    if args.hand == "mia":
+        angle = 1.0 if args.mia_thumb_adducted else -1.0
+        pipeline.set_constant_joint("j_thumb_opp_binary", angle)
+        vis_kin.tm.set_joint("j_thumb_opp_binary", angle)
+
+    service = MarkerToRobotService.from_mocap_config(
+        pipeline, args.mocap_config)
+    latest_state = LatestState()
+    service.subscribe(latest_state)
+    if args.replay is None:
+        source = UdpMarkerSource(args.host, args.port)
+    else:
+        source = ReplayMarkerSource(
+            args.replay, speed=args.replay_speed, drop_late=True)
+    thread = threading.Thread(
+        target=asyncio.run, args=(service.run(source),), daemon=True)
+    thread.start()
+
+    vis_kin.tm.add_transform(
+        pipeline.hand_config_["base_frame"], "world", np.eye(4))
+
+    fig = pv.figure()
+    fig.plot_transform(np.eye(4), s=0.5)
+    robot = pv.Graph(
+        vis_kin.tm, "world", show_frames=True,
+        whitelist=[pipeline.hand_config_["base_frame"]],
+        show_connections=False, show_visuals=True,
+        show_collision_objects=False, show_name=False, s=0.02)
     robot.add_artist(fig)
-fig.view_init(azim=-70)
-fig.animate(
-    animation_callback, 1, loop=True,
-    fargs=(markers, mbrm, hand, emb, robot))
-fig.show()
+    fig.view_init(azim=-70)
+    fig.animate(AnimationCallback(
+        latest_state, robot, vis_kin.tm, pipeline.hand_config_, service), 1,
+        loop=True)
+    fig.show()
+
+
+if __name__ == "__main__":
+    main()
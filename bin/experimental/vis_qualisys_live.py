@@ -1,16 +1,24 @@
-"""Write data streamed from Qualisys MoCap system to file."""
+"""Forward data streamed from Qualisys MoCap system via UDP.
+
+Marker frames can be received and converted with vis_live.py.
+
+Example call:
+python bin/experimental/vis_qualisys_live.py --port 6543 192.168.0.10
+"""
 # Install dependency:
 # python -m pip install qtm
 
 
+import argparse
 import asyncio
 import numpy as np
 import qtm
-import json
+from hand_embodiment.streaming import MarkerFrame, UdpMarkerSink
 
 
 class OnPacket:
-    def __init__(self, verbose=1):
+    def __init__(self, sink, verbose=1):
+        self.sink = sink
         self.verbose = verbose
 
         # label order from AIM model
@@ -36,16 +44,18 @@ class OnPacket:
 
         header, markers = packet.get_3d_markers()
         print("Component info: {}".format(header))
-        result = {}
+        positions = np.full((len(self.labels), 3), np.nan)
         for i, label, marker in zip(range(len(markers)), self.labels, markers):
             if self.verbose:
                 print(f"{marker.x:.1f} {marker.y:.1f} {marker.z:.1f} - {label}")
-            result[label] = (marker.x / 1000.0, marker.y / 1000.0, marker.z / 1000.0)
-        with open("comm.json", "w") as f:
-            json.dump(result, f)
+            positions[i] = marker.x, marker.y, marker.z
+        positions /= 1000.0
+        self.sink.send(MarkerFrame(
+            packet.framenumber, packet.timestamp * 1e-6, self.labels,
+            positions))
 
 
-async def setup(ip, frequency=None):
+async def setup(ip, sink, frequency=None):
     """ Main function """
     connection = await qtm.connect(ip)
     if connection is None:
@@ -63,11 +73,26 @@ async def setup(ip, frequency=None):
     #'skeleton:global'
 
     await connection.stream_frames(
-        frames=frames, components=components, on_packet=OnPacket())
+        frames=frames, components=components, on_packet=OnPacket(sink))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("ip", type=str, help="IP of QTM.")
+    parser.add_argument(
+        "--host", type=str, default="127.0.0.1",
+        help="Address to which marker frames will be sent.")
+    parser.add_argument(
+        "--port", type=int, default=6543,
+        help="Port to which marker frames will be sent.")
+    parser.add_argument(
+        "--frequency", type=int, default=20,
+        help="Frequency at which QTM streams frames.")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    import sys
-    ip = sys.argv[-1]
-    asyncio.ensure_future(setup(ip, frequency=20))
+    args = parse_args()
+    sink = UdpMarkerSink(args.host, args.port)
+    asyncio.ensure_future(setup(args.ip, sink, frequency=args.frequency))
     asyncio.get_event_loop().run_forever()
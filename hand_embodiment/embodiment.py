@@ -45,6 +45,16 @@ class HandEmbodiment(TimeableMixin):
     measure_time : bool
         Measure computation time for each frame.
 
+    ik_solver : str, optional (default: 'slsqp')
+        Solver for inverse kinematics of the robotic hand: 'slsqp' or 'dls'
+        (damped least squares). See MultiChain.
+
+    headless : bool, optional (default: False)
+        Only load the kinematic model that is used for inverse kinematics,
+        without visuals and collision objects. The unscaled visual model and
+        its forward kinematics in each step will be skipped. Joint angles of
+        the transform manager will not be updated.
+
     Attributes
     ----------
     finger_names_ : tuple of str
@@ -67,7 +77,8 @@ class HandEmbodiment(TimeableMixin):
             self, hand_state, target_config,
             use_fingers=("thumb", "index", "middle"),
             mano_finger_kinematics=None, initial_handbase2world=None,
-            only_tip=False, verbose=0, measure_time=False):
+            only_tip=False, verbose=0, measure_time=False,
+            ik_solver="slsqp", headless=False):
         super(HandEmbodiment, self).__init__(verbose or measure_time)
 
         if isinstance(target_config, str):
@@ -85,7 +96,10 @@ class HandEmbodiment(TimeableMixin):
         for finger_name in use_fingers:
             assert finger_name in self.mano_finger_kinematics
 
-        self.target_kin, self.vis_kin = load_kinematic_model(target_config)
+        self.headless = headless
+        self.target_kin, self.vis_kin = load_kinematic_model(
+            target_config, unscaled_visual_model=not headless,
+            headless=headless)
         self.target_finger_chains = {}
         self.vis_finger_chains = {}
         self.joint_angles = {}
@@ -100,11 +114,15 @@ class HandEmbodiment(TimeableMixin):
             self.target_finger_chains[finger_name] = \
                 self.target_kin.create_multi_chain(
                     target_config["joint_names"][finger_name],
-                    self.base_frame, ee_frames)
-            self.vis_finger_chains[finger_name] = \
-                self.vis_kin.create_multi_chain(
-                    target_config["joint_names"][finger_name],
-                    self.base_frame, ee_frames)
+                    self.base_frame, ee_frames, solver=ik_solver)
+            if self.vis_kin is self.target_kin:
+                self.vis_finger_chains[finger_name] = \
+                    self.target_finger_chains[finger_name]
+            else:
+                self.vis_finger_chains[finger_name] = \
+                    self.vis_kin.create_multi_chain(
+                        target_config["joint_names"][finger_name],
+                        self.base_frame, ee_frames)
             self.joint_angles[finger_name] = \
                 np.zeros(len(target_config["joint_names"][finger_name]))
 
@@ -116,6 +134,16 @@ class HandEmbodiment(TimeableMixin):
 
         self.verbose = verbose
 
+    def reset(self):
+        """Set joint angles of all fingers to 0.
+
+        Joint angles are used as initial guess for the next inverse
+        kinematics problem.
+        """
+        for finger_name in self.joint_angles:
+            self.joint_angles[finger_name] = np.zeros_like(
+                self.joint_angles[finger_name])
+
     def solve(self, handbase2world=None, return_desired_positions=False,
               use_cached_forward_kinematics=False):
         """Solve embodiment.
@@ -297,7 +325,8 @@ class HandEmbodiment(TimeableMixin):
         return self.target_finger_chains[finger_name].forward(joint_angles)
 
 
-def load_kinematic_model(hand_config, unscaled_visual_model=True):
+def load_kinematic_model(hand_config, unscaled_visual_model=True,
+                         headless=False):
     """Load kinematic model of a robotic hand.
 
     Parameters
@@ -309,6 +338,9 @@ def load_kinematic_model(hand_config, unscaled_visual_model=True):
         Load an unscaled visual model of the hand in addition to the scaled
         version.
 
+    headless : bool, optional (default: False)
+        Only load kinematics, i.e., skip visuals and collision objects.
+
     Returns
     -------
     kin : Kinematics
@@ -323,13 +355,12 @@ def load_kinematic_model(hand_config, unscaled_visual_model=True):
         extra_args["package_dir"] = model["package_dir"]
     if "mesh_path" in model:
         extra_args["mesh_path"] = model["mesh_path"]
-    extra_args["scale"] = hand_config.get("scale", 1.0)
-    with open(model["urdf"], "r") as f:
-        kin = Kinematics(urdf=f.read(), **extra_args)
+    kin = Kinematics.from_file(
+        model["urdf"], scale=hand_config.get("scale", 1.0), headless=headless,
+        **extra_args)
     if unscaled_visual_model:
-        extra_args.pop("scale")
-        with open(model["urdf"], "r") as f:
-            vis_kin = Kinematics(urdf=f.read(), **extra_args)
+        vis_kin = Kinematics.from_file(
+            model["urdf"], headless=headless, **extra_args)
     else:
         vis_kin = kin
     if "kinematic_model_hook" in model:
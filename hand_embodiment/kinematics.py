@@ -2,6 +2,8 @@
 
 Forward and inverse kinematics for robotic hands.
 """
+import copy
+import os
 import numpy as np
 import math
 import numba
@@ -15,6 +17,7 @@ class FastUrdfTransformManager(urdf.UrdfTransformManager):
     This version has efficient numba-accelerated code to update joints.
     """
     def __init__(self):
+        self._defer_shortest_path = False
         super(FastUrdfTransformManager, self).__init__(check=False)
         self.virtual_joints = {}
 
@@ -41,8 +44,38 @@ class FastUrdfTransformManager(urdf.UrdfTransformManager):
         """
         robot_name, links, joints = urdf.parse_urdf(
             urdf_xml, mesh_path, package_dir, self.strict_check)
+        self.load_parsed_urdf(robot_name, links, joints, scale)
+
+    def load_parsed_urdf(self, robot_name, links, joints, scale=1.0):
+        """Load parsed URDF into transformation manager.
+
+        Parameters
+        ----------
+        robot_name : str
+            Name of the robot
+
+        links : list of Link
+            Links of the robot. Will be modified.
+
+        joints : list of Joint
+            Joints of the robot. Will be modified.
+
+        scale : float, optional (default: 1)
+            Scaling factor.
+        """
         self._scale_urdf(links, joints, scale)
-        urdf.initialize_urdf_transform_manager(self, robot_name, links, joints)
+        # shortest paths are computed once after all transforms are added
+        self._defer_shortest_path = True
+        try:
+            urdf.initialize_urdf_transform_manager(
+                self, robot_name, links, joints)
+        finally:
+            self._defer_shortest_path = False
+            self._recompute_shortest_path()
+
+    def _recompute_shortest_path(self):
+        if not self._defer_shortest_path:
+            super(FastUrdfTransformManager, self)._recompute_shortest_path()
 
     def _scale_urdf(self, links, joints, scale):
         for link in links:
@@ -128,7 +161,9 @@ class FastUrdfTransformManager(urdf.UrdfTransformManager):
         callback : callable
             A callable object that provides the function 'make_virtual_joint'
             to initialize the transform manager. The function call operator
-            will be used to set the joint angle of the virtual joint.
+            will be used to set the joint angle of the virtual joint. It may
+            provide the function 'derivative' that returns the derivatives of
+            the real joint values with respect to the virtual joint value.
         """
         self.virtual_joints[joint_name] = callback
         self._joints[joint_name] = callback.make_virtual_joint(
@@ -164,13 +199,451 @@ def _fast_matrix_from_axis_angle(axis, angle):
     ])
 
 
+class CompiledChain:
+    """Compiled forward kinematics from a base frame to end effectors.
+
+    The paths from the end effectors to the base frame in the graph of the
+    transformation manager are flattened into arrays of fixed transforms,
+    joint axes, and joint types at construction time. Forward kinematics is
+    then computed by a single numba loop that does not touch the graph.
+    The transformation manager is only updated on request.
+
+    Parameters
+    ----------
+    tm : FastUrdfTransformManager
+        Transformation manager
+
+    joint_names : list
+        Names of joints that should be used. Virtual joints are supported.
+        Their callbacks must always set the same real joints.
+
+    base_frame : str
+        Name of the base link
+
+    ee_frames : list of str
+        Name of the end-effector links
+    """
+    def __init__(self, tm, joint_names, base_frame, ee_frames):
+        self.tm = tm
+        self.joint_names = joint_names
+        self.base_frame = base_frame
+        self.ee_frames = ee_frames
+
+        self.virtual_joints = {}
+        real_joint_indices = {}
+        for i, joint_name in enumerate(self.joint_names):
+            if joint_name in self.tm.virtual_joints:
+                callback = self.tm.virtual_joints[joint_name]
+                self.virtual_joints[i] = callback
+                for real_joint_name in callback(0.0).keys():
+                    real_joint_indices.setdefault(
+                        real_joint_name, len(real_joint_indices))
+            else:
+                real_joint_indices.setdefault(
+                    joint_name, len(real_joint_indices))
+        self.real_joint_indices = real_joint_indices
+        self._joint_indices = np.array(
+            [real_joint_indices.get(jn, -1) for jn in self.joint_names],
+            dtype=int)
+
+        n_real_joints = len(real_joint_indices)
+        self._axes = np.zeros((n_real_joints, 3))
+        self._limits = np.empty((n_real_joints, 2))
+        self._prismatic = np.zeros(n_real_joints, dtype=np.bool_)
+        joint_edges = {}
+        for real_joint_name, j in real_joint_indices.items():
+            from_frame, to_frame, _, axis, limits, joint_type = \
+                self.tm._joints[real_joint_name]
+            joint_edges[(from_frame, to_frame)] = real_joint_name
+            self._axes[j] = axis
+            self._limits[j] = limits
+            self._prismatic[j] = joint_type != "revolute"
+
+        base_index = self.tm.nodes.index(self.base_frame)
+        transforms = []
+        edge_joints = []
+        edge_inverted = []
+        self._fixed_edges = []
+        path_starts = [0]
+        for ee_frame in self.ee_frames:
+            path = self.tm._shortest_path(
+                self.tm.nodes.index(ee_frame), base_index)
+            for from_frame, to_frame in zip(path[:-1], path[1:]):
+                inverted = (from_frame, to_frame) not in self.tm.transforms
+                key = (to_frame, from_frame) if inverted else (
+                    from_frame, to_frame)
+                if key in joint_edges:
+                    real_joint_name = joint_edges[key]
+                    edge_joints.append(real_joint_indices[real_joint_name])
+                    transforms.append(self.tm._joints[real_joint_name][2])
+                else:
+                    self._fixed_edges.append((len(transforms), key))
+                    edge_joints.append(-1)
+                    transforms.append(self.tm.transforms[key])
+                edge_inverted.append(inverted)
+            path_starts.append(len(transforms))
+        self._transforms = np.array(transforms, dtype=float).reshape(-1, 4, 4)
+        self._edge_joints = np.array(edge_joints, dtype=int)
+        self._edge_inverted = np.array(edge_inverted, dtype=np.bool_)
+        self._path_starts = np.array(path_starts, dtype=int)
+
+    def update_fixed_transforms(self):
+        """Read transforms that are not controlled by this chain from graph.
+
+        Joints that are on the paths but not in the list of joint names are
+        treated as fixed transforms. Call this function when they have been
+        modified in the transformation manager.
+        """
+        for edge_index, key in self._fixed_edges:
+            self._transforms[edge_index] = self.tm.transforms[key]
+
+    def real_joint_values(self, joint_angles):
+        """Compute values of real joints.
+
+        Parameters
+        ----------
+        joint_angles : array-like, shape (n_joints,)
+            Joint angles of the joints given by joint_names
+
+        Returns
+        -------
+        real_joint_values : array, shape (n_real_joints,)
+            Values of real joints, that is, virtual joints are resolved
+        """
+        if not self.virtual_joints:
+            return np.asarray(joint_angles, dtype=float)
+        real_joint_values = np.empty(len(self.real_joint_indices))
+        for i in range(len(self.joint_names)):
+            if i in self.virtual_joints:
+                actual_joint_states = self.virtual_joints[i](joint_angles[i])
+                for real_joint_name, value in actual_joint_states.items():
+                    real_joint_values[
+                        self.real_joint_indices[real_joint_name]] = value
+            else:
+                real_joint_values[self._joint_indices[i]] = joint_angles[i]
+        return real_joint_values
+
+    def forward(self, joint_angles):
+        """Forward kinematics without updating the transformation manager.
+
+        Parameters
+        ----------
+        joint_angles : array-like, shape (n_joints,)
+            Joint angles
+
+        Returns
+        -------
+        ee2base : array, shape (n_ee_frames, 4, 4)
+            Transformations from end-effectors to base frame
+        """
+        return _compiled_forward_kinematics(
+            self.real_joint_values(joint_angles), self._axes, self._limits,
+            self._prismatic, self._transforms, self._edge_joints,
+            self._edge_inverted, self._path_starts)
+
+    def forward_position_jacobian(self, joint_angles):
+        """Forward kinematics and position Jacobian.
+
+        The Jacobian is computed geometrically for revolute and prismatic
+        joints. The derivatives of real joint values with respect to virtual
+        joints are provided by the function 'derivative' of their callbacks.
+        If it is not available, they are approximated by central differences.
+        Joints that are clipped at their limits have a derivative of 0.
+
+        Parameters
+        ----------
+        joint_angles : array-like, shape (n_joints,)
+            Joint angles
+
+        Returns
+        -------
+        ee2base : array, shape (n_ee_frames, 4, 4)
+            Transformations from end-effectors to base frame
+
+        jacobian : array, shape (n_ee_frames, 3, n_joints)
+            Derivatives of end-effector positions in base frame with respect
+            to joint angles
+        """
+        ee2base, real_jacobian = _compiled_forward_position_jacobian(
+            self.real_joint_values(joint_angles), self._axes, self._limits,
+            self._prismatic, self._transforms, self._edge_joints,
+            self._edge_inverted, self._path_starts)
+        if not self.virtual_joints:
+            return ee2base, real_jacobian
+        return ee2base, real_jacobian.dot(
+            self._real_joint_derivatives(joint_angles))
+
+    def _real_joint_derivatives(self, joint_angles, epsilon=1e-6):
+        """Derivatives of real joint values with respect to joint angles."""
+        derivatives = np.zeros((len(self.real_joint_indices),
+                                len(self.joint_names)))
+        for i in range(len(self.joint_names)):
+            if i in self.virtual_joints:
+                callback = self.virtual_joints[i]
+                if hasattr(callback, "derivative"):
+                    real_derivatives = callback.derivative(joint_angles[i])
+                else:
+                    upper = callback(joint_angles[i] + epsilon)
+                    lower = callback(joint_angles[i] - epsilon)
+                    real_derivatives = {
+                        real_joint_name: (value - lower[real_joint_name])
+                        / (2.0 * epsilon)
+                        for real_joint_name, value in upper.items()}
+                for real_joint_name, value in real_derivatives.items():
+                    derivatives[self.real_joint_indices[real_joint_name], i] = \
+                        value
+            else:
+                derivatives[self._joint_indices[i], i] = 1.0
+        return derivatives
+
+    def update_transform_manager(self, joint_angles):
+        """Set joint angles in transformation manager.
+
+        Parameters
+        ----------
+        joint_angles : array-like, shape (n_joints,)
+            Joint angles
+        """
+        for joint_name, value in zip(self.joint_names, joint_angles):
+            self.tm.set_joint(joint_name, value)
+
+
+@numba.jit(nopython=True, cache=True)
+def _compiled_forward_kinematics(
+        real_joint_values, axes, limits, prismatic, transforms, edge_joints,
+        edge_inverted, path_starts):
+    """Forward kinematics along flattened paths.
+
+    Parameters
+    ----------
+    real_joint_values : array, shape (n_real_joints,)
+        Joint angles or positions of real joints
+
+    axes : array, shape (n_real_joints, 3)
+        Joint axes
+
+    limits : array, shape (n_real_joints, 2)
+        Joint limits, values will be clipped
+
+    prismatic : array, shape (n_real_joints,)
+        Prismatic joints, all others are revolute joints
+
+    transforms : array, shape (n_edges, 4, 4)
+        Fixed transforms of edges, child2parent in case of joints
+
+    edge_joints : array, shape (n_edges,)
+        Index of real joint per edge or -1 if the edge is fixed
+
+    edge_inverted : array, shape (n_edges,)
+        Edge has to be inverted because it is traversed from parent to child
+
+    path_starts : array, shape (n_ee_frames + 1,)
+        Indices of first edge per path from end-effector to base
+
+    Returns
+    -------
+    ee2base : array, shape (n_ee_frames, 4, 4)
+        Transformations from end-effectors to base frame
+    """
+    n_paths = len(path_starts) - 1
+    ee2base = np.empty((n_paths, 4, 4))
+    for p in range(n_paths):
+        A2base = np.eye(4)
+        for e in range(path_starts[p], path_starts[p + 1]):
+            edge2parent = transforms[e]
+            j = edge_joints[e]
+            if j >= 0:
+                value = min(max(real_joint_values[j], limits[j, 0]),
+                            limits[j, 1])
+                if prismatic[j]:
+                    joint2A = np.eye(4)
+                    joint2A[:3, 3] = value * axes[j]
+                else:
+                    joint2A = _fast_matrix_from_axis_angle(axes[j], value)
+                edge2parent = _fast_concat(edge2parent, joint2A)
+            if edge_inverted[e]:
+                edge2parent = _fast_invert_transform(edge2parent)
+            A2base = _fast_concat(edge2parent, A2base)
+        ee2base[p] = A2base
+    return ee2base
+
+
+@numba.jit(nopython=True, cache=True)
+def _compiled_forward_position_jacobian(
+        real_joint_values, axes, limits, prismatic, transforms, edge_joints,
+        edge_inverted, path_starts):
+    """Forward kinematics and position Jacobian along flattened paths.
+
+    The parameters are the same as in _compiled_forward_kinematics.
+    Columns of the Jacobian are computed in the frame of the joint and
+    rotated to the base frame by the remaining edges of the path.
+
+    Returns
+    -------
+    ee2base : array, shape (n_ee_frames, 4, 4)
+        Transformations from end-effectors to base frame
+
+    jacobian : array, shape (n_ee_frames, 3, n_real_joints)
+        Derivatives of end-effector positions in base frame with respect
+        to real joint values
+    """
+    n_paths = len(path_starts) - 1
+    n_real_joints = len(real_joint_values)
+    ee2base = np.empty((n_paths, 4, 4))
+    jacobian = np.zeros((n_paths, 3, n_real_joints))
+    for p in range(n_paths):
+        A2base = np.eye(4)
+        columns = np.zeros((3, n_real_joints))
+        for e in range(path_starts[p], path_starts[p + 1]):
+            edge2parent = transforms[e]
+            j = edge_joints[e]
+            active = False
+            if j >= 0:
+                value = min(max(real_joint_values[j], limits[j, 0]),
+                            limits[j, 1])
+                active = value == real_joint_values[j]
+                if prismatic[j]:
+                    joint2A = np.eye(4)
+                    joint2A[:3, 3] = value * axes[j]
+                else:
+                    joint2A = _fast_matrix_from_axis_angle(axes[j], value)
+                edge2parent = _fast_concat(edge2parent, joint2A)
+            if edge_inverted[e]:
+                edge2parent = _fast_invert_transform(edge2parent)
+            elif active:  # column in joint frame, before this edge
+                if prismatic[j]:
+                    columns[:, j] = axes[j]
+                else:
+                    columns[:, j] = np.cross(axes[j], A2base[:3, 3])
+            for k in range(n_real_joints):
+                columns[:, k] = _fast_rotate(edge2parent, columns[:, k])
+            A2base = _fast_concat(edge2parent, A2base)
+            if active and edge_inverted[e]:  # column in joint frame, after
+                if prismatic[j]:
+                    columns[:, j] = -axes[j]
+                else:
+                    columns[:, j] = -np.cross(axes[j], A2base[:3, 3])
+        ee2base[p] = A2base
+        jacobian[p] = columns
+    return ee2base, jacobian
+
+
+@numba.jit(nopython=True, cache=True)
+def _fast_concat(B2C, A2B):
+    """Concatenate transformations, i.e., compute B2C.dot(A2B)."""
+    A2C = np.zeros((4, 4))
+    for i in range(3):
+        for j in range(4):
+            for k in range(3):
+                A2C[i, j] += B2C[i, k] * A2B[k, j]
+        A2C[i, 3] += B2C[i, 3]
+    A2C[3, 3] = 1.0
+    return A2C
+
+
+@numba.jit(nopython=True, cache=True)
+def _fast_rotate(A2B, v):
+    """Rotate vector with rotation of transformation."""
+    return np.array([
+        A2B[0, 0] * v[0] + A2B[0, 1] * v[1] + A2B[0, 2] * v[2],
+        A2B[1, 0] * v[0] + A2B[1, 1] * v[1] + A2B[1, 2] * v[2],
+        A2B[2, 0] * v[0] + A2B[2, 1] * v[1] + A2B[2, 2] * v[2]])
+
+
+@numba.jit(nopython=True, cache=True)
+def _fast_invert_transform(A2B):
+    """Invert rigid transformation."""
+    B2A = np.zeros((4, 4))
+    for i in range(3):
+        for j in range(3):
+            B2A[i, j] = A2B[j, i]
+            B2A[i, 3] -= A2B[j, i] * A2B[j, 3]
+    B2A[3, 3] = 1.0
+    return B2A
+
+
+_PARSED_URDFS = {}
+
+
+def parse_urdf_file(filename, mesh_path=None, package_dir=None,
+                    headless=False):
+    """Parse URDF file.
+
+    Parsed links and joints are cached per process. The result is a copy
+    that can be modified, e.g., scaled.
+
+    Parameters
+    ----------
+    filename : str
+        URDF file
+
+    mesh_path : str, optional (default: None)
+        Path in which we search for meshes that are defined in the URDF.
+        Meshes will be ignored if it is set to None and no 'package_dir'
+        is given.
+
+    package_dir : str, optional (default: None)
+        Path to corresponding ROS package
+
+    headless : bool, optional (default: False)
+        Remove visuals and collision objects, including their frames.
+
+    Returns
+    -------
+    robot_name : str
+        Name of the robot
+
+    links : list of Link
+        Links of the robot
+
+    joints : list of Joint
+        Joints of the robot
+    """
+    key = (os.path.abspath(filename), package_dir, mesh_path)
+    mtime = os.stat(filename).st_mtime_ns
+    if key not in _PARSED_URDFS or _PARSED_URDFS[key][0] != mtime:
+        with open(filename, "r") as f:
+            _PARSED_URDFS[key] = (mtime, urdf.parse_urdf(
+                f.read(), mesh_path, package_dir, strict_check=True))
+    robot_name, links, joints = _PARSED_URDFS[key][1]
+    return (robot_name, [_copy_link(link, headless) for link in links],
+            [_copy_joint(joint) for joint in joints])
+
+
+def _copy_link(link, headless):
+    result = copy.copy(link)
+    if headless:
+        result.visuals = []
+        result.collision_objects = []
+        transforms = [
+            t for t in link.transforms
+            if not t[0].startswith(("visual:", "collision:"))]
+    else:
+        result.visuals = [copy.deepcopy(v) for v in link.visuals]
+        result.collision_objects = [
+            copy.deepcopy(c) for c in link.collision_objects]
+        transforms = link.transforms
+    result.transforms = [(from_frame, to_frame, A2B.copy())
+                         for from_frame, to_frame, A2B in transforms]
+    result.inertial_frame = link.inertial_frame.copy()
+    result.inertia = link.inertia.copy()
+    return result
+
+
+def _copy_joint(joint):
+    result = copy.copy(joint)
+    result.child2parent = joint.child2parent.copy()
+    return result
+
+
 class Kinematics:
     """Robot kinematics.
 
     Parameters
     ----------
     urdf : str
-        URDF description of a robot
+        URDF description of a robot. The kinematic model will be empty if it
+        is None. See from_file.
 
     mesh_path : str, optional (default: None)
         Path in which we search for meshes that are defined in the URDF.
@@ -184,8 +657,46 @@ class Kinematics:
     """
     def __init__(self, urdf, mesh_path=None, package_dir=None, scale=1.0):
         self.tm = FastUrdfTransformManager()
-        self.tm.load_urdf(
-            urdf, mesh_path=mesh_path, package_dir=package_dir, scale=scale)
+        if urdf is not None:
+            self.tm.load_urdf(
+                urdf, mesh_path=mesh_path, package_dir=package_dir,
+                scale=scale)
+
+    @classmethod
+    def from_file(cls, filename, mesh_path=None, package_dir=None, scale=1.0,
+                  headless=False):
+        """Load robot kinematics from URDF file.
+
+        The parsed URDF will be cached, see parse_urdf_file.
+
+        Parameters
+        ----------
+        filename : str
+            URDF file
+
+        mesh_path : str, optional (default: None)
+            Path in which we search for meshes that are defined in the URDF.
+            Meshes will be ignored if it is set to None.
+
+        package_dir : str, optional (default: None)
+            Path to corresponding ROS package
+
+        scale : float, optional (default: 1)
+            Scaling factor.
+
+        headless : bool, optional (default: False)
+            Do not load visuals and collision objects.
+
+        Returns
+        -------
+        kin : Kinematics
+            Robot kinematics
+        """
+        kin = cls(None)
+        kin.tm.load_parsed_urdf(
+            *parse_urdf_file(filename, mesh_path, package_dir, headless),
+            scale=scale)
+        return kin
 
     def create_chain(self, joint_names, base_frame, ee_frame, verbose=0):
         """Create kinematic chain.
@@ -211,7 +722,8 @@ class Kinematics:
         """
         return Chain(self.tm, joint_names, base_frame, ee_frame, verbose)
 
-    def create_multi_chain(self, joint_names, base_frame, ee_frames, verbose=0):
+    def create_multi_chain(self, joint_names, base_frame, ee_frames, verbose=0,
+                           solver="slsqp"):
         """Create kinematic chain with multiple tips.
 
         Parameters
@@ -228,12 +740,16 @@ class Kinematics:
         verbose : int, optional (default: 0)
             Verbosity level
 
+        solver : str, optional (default: 'slsqp')
+            Solver for inverse kinematics, see MultiChain.
+
         Returns
         -------
         chain : MultiChain
             Kinematic chain
         """
-        return MultiChain(self.tm, joint_names, base_frame, ee_frames, verbose)
+        return MultiChain(self.tm, joint_names, base_frame, ee_frames, verbose,
+                          solver)
 
 
 class Chain:
@@ -275,6 +791,8 @@ class Chain:
 
         self.ee_index = self.tm.nodes.index(ee_frame)
         self.base_index = self.tm.nodes.index(base_frame)
+        self.compiled_chain = CompiledChain(
+            self.tm, self.joint_names, self.base_frame, [self.ee_frame])
 
     def forward(self, joint_angles):
         """Forward kinematics.
@@ -289,9 +807,9 @@ class Chain:
         ee2base : array, shape (4, 4)
             Transformation from end-effector to base frame
         """
-        for i in range(self.n_joints):
-            self.tm.set_joint(self.joint_names[i], joint_angles[i])
-        return self.tm.get_ee2base(self.ee_index, self.base_index)
+        self.compiled_chain.update_fixed_transforms()
+        self.compiled_chain.update_transform_manager(joint_angles)
+        return self.compiled_chain.forward(joint_angles)[0]
 
     def ee_pos_error(self, joint_angles, desired_pos):
         """Compute position error.
@@ -309,7 +827,8 @@ class Chain:
         pos_error : float
             Position error.
         """
-        return np.linalg.norm(desired_pos - self.forward(joint_angles)[:3, 3])
+        ee2base = self.compiled_chain.forward(joint_angles)[0]
+        return np.linalg.norm(desired_pos - ee2base[:3, 3])
 
     def ee_pose_error(self, joint_angles, desired_pose, orientation_weight=1.0, position_weight=1.0):
         """Compute pose error.
@@ -335,7 +854,7 @@ class Chain:
         pose_error : float
             Weighted error between actual pose and desired pose.
         """
-        return pose_dist(desired_pose, self.forward(joint_angles),
+        return pose_dist(desired_pose, self.compiled_chain.forward(joint_angles)[0],
                          orientation_weight, position_weight)
 
     def inverse_position(self, desired_pos, initial_joint_angles, return_error=False, bounds=None):
@@ -365,7 +884,9 @@ class Chain:
         """
         if bounds is None:
             bounds = self.joint_limits
+        self.compiled_chain.update_fixed_transforms()
         res = minimize(self.ee_pos_error, initial_joint_angles, (desired_pos,), method="SLSQP", bounds=bounds)
+        self.compiled_chain.update_transform_manager(res["x"])
 
         if self.verbose >= 2:
             print("Error: %g" % res["fun"])
@@ -401,9 +922,11 @@ class Chain:
         """
         if bounds is None:
             bounds = self.joint_limits
+        self.compiled_chain.update_fixed_transforms()
         res = minimize(
             self.ee_pose_error, initial_joint_angles, (desired_pose,),
             method="SLSQP", bounds=bounds)
+        self.compiled_chain.update_transform_manager(res["x"])
 
         if self.verbose >= 2:
             print("Error: %g" % res["fun"])
@@ -582,8 +1105,17 @@ class MultiChain:
 
     verbose : int, optional (default: 0)
         Verbosity level
+
+    solver : str, optional (default: 'slsqp')
+        Solver for inverse kinematics. 'slsqp' uses scipy's SLSQP with an
+        analytic gradient. 'dls' uses bounded damped least squares
+        (Levenberg-Marquardt) with the position Jacobian.
     """
-    def __init__(self, tm, joint_names, base_frame, ee_frames, verbose=0):
+    def __init__(self, tm, joint_names, base_frame, ee_frames, verbose=0,
+                 solver="slsqp"):
+        if solver not in ["slsqp", "dls"]:
+            raise ValueError(f"Unknown solver: '{solver}'")
+        self.solver = solver
         self.tm = tm
         self.joint_names = joint_names
         self.base_frame = base_frame
@@ -603,6 +1135,8 @@ class MultiChain:
         self.ee_indices = [self.tm.nodes.index(ee_frame)
                            for ee_frame in self.ee_frames]
         self.base_index = self.tm.nodes.index(base_frame)
+        self.compiled_chain = CompiledChain(
+            self.tm, self.joint_names, self.base_frame, self.ee_frames)
 
     def forward(self, joint_angles):
         """Forward kinematics.
@@ -617,10 +1151,9 @@ class MultiChain:
         ee2base : array, shape (4, 4)
             Transformation from end-effector to base frame
         """
-        for i in range(self.n_joints):
-            self.tm.set_joint(self.joint_names[i], joint_angles[i])
-        return [self.tm.get_ee2base(ee_index, self.base_index)
-                for ee_index in self.ee_indices]
+        self.compiled_chain.update_fixed_transforms()
+        self.compiled_chain.update_transform_manager(joint_angles)
+        return list(self.compiled_chain.forward(joint_angles))
 
     def ee_pos_error(self, joint_angles, desired_positions):
         """Compute position error.
@@ -638,11 +1171,35 @@ class MultiChain:
         pos_error : float
             Position error.
         """
-        actual_positions = self.forward(joint_angles)
-        return np.linalg.norm(
-            [desired_pos - actual_pos[:3, 3]
-             for desired_pos, actual_pos in zip(
-                desired_positions, actual_positions)]).sum()  # TODO why norm().sum()?
+        ee2base = self.compiled_chain.forward(joint_angles)
+        return np.linalg.norm(desired_positions - ee2base[:, :3, 3])
+
+    def ee_pos_error_and_gradient(self, joint_angles, desired_positions):
+        """Compute position error and its gradient.
+
+        Parameters
+        ----------
+        joint_angles : array-like, shape (n_joints,)
+            Actual joint angles for which we compute forward kinematics.
+
+        desired_positions : array-like, shape (n_end_effectors, 3)
+            Desired position.
+
+        Returns
+        -------
+        pos_error : float
+            Position error.
+
+        gradient : array, shape (n_joints,)
+            Gradient of position error with respect to joint angles.
+        """
+        ee2base, jacobian = self.compiled_chain.forward_position_jacobian(
+            joint_angles)
+        diff = ee2base[:, :3, 3] - desired_positions
+        error = np.linalg.norm(diff)
+        if error == 0.0:
+            return error, np.zeros(self.n_joints)
+        return error, np.einsum("ed,edj->j", diff, jacobian) / error
 
     def inverse_position(self, desired_positions, initial_joint_angles, return_error=False, bounds=None):
         """Inverse kinematics.
@@ -671,16 +1228,85 @@ class MultiChain:
         """
         if bounds is None:
             bounds = self.joint_limits
-        res = minimize(
-            self.ee_pos_error, initial_joint_angles,
-            (desired_positions,), method="SLSQP", bounds=bounds)
+        desired_positions = np.asarray(desired_positions)
+        self.compiled_chain.update_fixed_transforms()
+        if self.solver == "dls":
+            joint_angles = self._damped_least_squares(
+                desired_positions, initial_joint_angles, np.asarray(bounds))
+            error = self.ee_pos_error(joint_angles, desired_positions)
+        else:
+            res = minimize(
+                self.ee_pos_error_and_gradient, initial_joint_angles,
+                (desired_positions,), jac=True, method="SLSQP", bounds=bounds)
+            joint_angles, error = res["x"], res["fun"]
+        self.compiled_chain.update_transform_manager(joint_angles)
 
         if self.verbose >= 2:
-            print("Error: %g" % res["fun"])
+            print("Error: %g" % error)
         if return_error:
-            return res["x"], res["fun"]
+            return joint_angles, error
         else:
-            return res["x"]
+            return joint_angles
+
+    def _damped_least_squares(
+            self, desired_positions, initial_joint_angles, bounds,
+            max_iter=50, initial_damping=1e-3, xtol=1e-8, ftol=1e-3):
+        """Bounded damped least squares for inverse position kinematics.
+
+        Steps are projected onto the bounds. Joints that are at a bound and
+        would be pushed outside of it are excluded from the step. The damping
+        factor is updated according to Nielsen (1999).
+        """
+        lower = bounds[:, 0]
+        upper = bounds[:, 1]
+        q = np.clip(initial_joint_angles, lower, upper)
+        ee2base, jacobian = self.compiled_chain.forward_position_jacobian(q)
+        r = (ee2base[:, :3, 3] - desired_positions).ravel()
+        J = jacobian.reshape(-1, self.n_joints)
+        cost = np.dot(r, r)
+        damping = -1.0
+        damping_factor = 2.0
+
+        for _ in range(max_iter):
+            g = J.T.dot(r)
+            H = J.T.dot(J)
+            active = np.logical_or(np.logical_and(q <= lower, g > 0.0),
+                                   np.logical_and(q >= upper, g < 0.0))
+            g[active] = 0.0
+            H[active] = 0.0
+            H[:, active] = 0.0
+            if damping < 0.0:
+                damping = initial_damping * max(np.max(np.diag(H)), 1e-12)
+
+            q_new = np.clip(
+                q - np.linalg.solve(H + damping * np.eye(self.n_joints), g),
+                lower, upper)
+            step = q_new - q
+            ee2base, jacobian = self.compiled_chain.forward_position_jacobian(
+                q_new)
+            r_new = (ee2base[:, :3, 3] - desired_positions).ravel()
+            cost_new = np.dot(r_new, r_new)
+
+            # ratio of actual and predicted decrease of the error
+            predicted_decrease = -2.0 * np.dot(g, step) - np.dot(
+                step, H.dot(step))
+            decrease = cost - cost_new
+            if decrease > 0.0 and predicted_decrease > 0.0:
+                rho = decrease / predicted_decrease
+                damping *= max(1.0 / 3.0, 1.0 - (2.0 * rho - 1.0) ** 3)
+                damping_factor = 2.0
+                q = q_new
+                r = r_new
+                J = jacobian.reshape(-1, self.n_joints)
+                cost = cost_new
+                if np.linalg.norm(step) < xtol or decrease <= ftol * cost:
+                    break
+            else:
+                damping *= damping_factor
+                damping_factor *= 2.0
+                if np.linalg.norm(step) < xtol:
+                    break
+        return q
 
 
 @numba.jit(nopython=True, cache=True)
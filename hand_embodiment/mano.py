@@ -4,10 +4,13 @@ See https://mano.is.tue.mpg.de/ for details on the model.
 Their code has been refactored and documented here.
 """
 import json
+import os
+import warnings
 from scipy import sparse
 import pytransform3d.rotations as pr
 import pytransform3d.transformations as pt
 import numpy as np
+import numba
 from pkg_resources import resource_filename
 import open3d as o3d
 
@@ -23,14 +26,23 @@ class HandState:
     https://ps.is.tuebingen.mpg.de/uploads_file/attachment/attachment/392/Embodied_Hands_SiggraphAsia2017.pdf
     website: https://mano.is.tue.mpg.de/
 
+    The numpy array 'vertices' is the source of truth. Open3D
+    representations (mesh, point cloud, and normals) will only be updated
+    when they are accessed through hand_mesh or hand_pointcloud.
+
     Parameters
     ----------
     left : bool, optional (default: True)
         Left hand. Right hand otherwise.
+
+    headless : bool, optional (default: False)
+        Don't create any Open3D objects. hand_mesh, hand_pointcloud, and
+        material are not available in this mode.
     """
-    def __init__(self, left=True):
+    def __init__(self, left=True, headless=False):
         model_parameters = load_model(left)
 
+        self.headless = headless
         self.betas = np.zeros(10)
         self.pose = np.zeros(48)
 
@@ -45,30 +57,35 @@ class HandState:
             "kintree_table": model_parameters["kintree_table"],
             "posedirs": model_parameters["posedirs"],
         }
+        self.pose_parameters["parents"], \
+            self.pose_parameters["traversal_order"] = compile_kintree(
+                self.pose_parameters["kintree_table"])
 
         self.pose_parameters["J"], self.pose_parameters["v_template"] = \
             apply_shape_parameters(betas=self.betas, **self.shape_parameters)
-        self.vertices = hand_vertices(pose=self.pose, **self.pose_parameters)
-
-        color = np.array([245, 214, 175, 255]) / 255.0
-        try:  # Open3D <= 0.13
-            self.material = o3d.visualization.rendering.Material()
-            self.material.base_color = color
-            self.material.shader = "defaultLit"
-        except AttributeError:  # Open3d >= 0.14
-            self.material = o3d.visualization.rendering.MaterialRecord()
-            self.material.base_color = color
-            self.material.shader = "defaultLit"
-
-        self._mesh = o3d.geometry.TriangleMesh(
-            o3d.utility.Vector3dVector(self.vertices),
-            o3d.utility.Vector3iVector(self.faces))
-        self._mesh.compute_vertex_normals()
-        self._mesh.paint_uniform_color(color[:3])
-
-        self._points = o3d.geometry.PointCloud(
-            o3d.utility.Vector3dVector(self.vertices))
-        self._points.paint_uniform_color((0, 0, 0))
+        self._vertices = hand_vertices(
+            pose=self.pose, **self.pose_parameters)
+        self._vertices_outdated = False
+        self._mesh2world = None
+
+        self.color = np.array([245, 214, 175, 255]) / 255.0
+        if not headless:
+            try:  # Open3D <= 0.13
+                self.material = o3d.visualization.rendering.Material()
+                self.material.base_color = self.color
+                self.material.shader = "defaultLit"
+            except AttributeError:  # Open3d >= 0.14
+                self.material = o3d.visualization.rendering.MaterialRecord()
+                self.material.base_color = self.color
+                self.material.shader = "defaultLit"
+
+        self._mesh = None
+        self._points = None
+        # normals that have to be computed when the mesh is accessed
+        self._vertex_normals = True
+        self._triangle_normals = False
+        self._mesh_outdated = True
+        self._points_outdated = True
 
         self.mesh_updated = False
 
@@ -95,53 +112,159 @@ class HandState:
         return self.betas.shape[0]
 
     @property
-    def hand_mesh(self):
+    def vertices(self):
+        """Vertices after changes of pose or shape parameters.
+
+        Returns
+        -------
+        vertices : array, shape (n_vertices, 3)
+            Vertices of the mesh.
+        """
         if self.mesh_updated:
             self.recompute_mesh()
-            self.mesh_updated = False
+        elif self._vertices_outdated:
+            self._skin_vertices()
+        return self._vertices
 
+    @property
+    def hand_mesh(self):
+        self._check_not_headless()
+        vertices = self.vertices
+        if self._mesh is None:
+            self._mesh = o3d.geometry.TriangleMesh(
+                o3d.utility.Vector3dVector(vertices),
+                o3d.utility.Vector3iVector(self.faces))
+            self._mesh.paint_uniform_color(self.color[:3])
+        elif self._mesh_outdated:
+            self._mesh.vertices = o3d.utility.Vector3dVector(vertices)
+        if self._mesh_outdated:
+            if self._vertex_normals:
+                self._mesh.compute_vertex_normals()
+            if self._triangle_normals:
+                self._mesh.compute_triangle_normals()
+            self._mesh_outdated = False
         return self._mesh
 
     def recompute_mesh(self, mesh2world=None, vertex_normals=True,
-                       triangle_normals=True):
-        self.vertices[:, :] = hand_vertices(
+                       triangle_normals=True, lazy=False):
+        """Recompute vertices from pose and shape parameters.
+
+        Parameters
+        ----------
+        mesh2world : array, shape (4, 4), optional (default: None)
+            Pose of the mesh in world frame.
+
+        vertex_normals : bool, optional (default: True)
+            Compute vertex normals when the mesh is accessed.
+
+        triangle_normals : bool, optional (default: True)
+            Compute triangle normals when the mesh is accessed.
+
+        lazy : bool, optional (default: False)
+            Defer skinning of all vertices until vertices, hand_mesh, or
+            hand_pointcloud are accessed. The pose parameters at that time
+            will be used.
+        """
+        self._mesh2world = None if mesh2world is None else np.copy(mesh2world)
+        self._vertex_normals = vertex_normals
+        self._triangle_normals = triangle_normals
+        self._vertices_outdated = True
+        self.mesh_updated = False
+        if not lazy:
+            self._skin_vertices()
+
+    def _skin_vertices(self):
+        self._vertices[:, :] = hand_vertices(
             pose=self.pose, **self.pose_parameters)
-        if mesh2world is not None:
-            self.vertices[:, :] = self.vertices.dot(
-                mesh2world[:3, :3].T) + mesh2world[:3, 3]
-        self._mesh.vertices = o3d.utility.Vector3dVector(self.vertices)
-        if vertex_normals:
-            self._mesh.compute_vertex_normals()
-        if triangle_normals:
-            self._mesh.compute_triangle_normals()
-        self._points.points = o3d.utility.Vector3dVector(self.vertices)
+        if self._mesh2world is not None:
+            self._vertices[:, :] = self._vertices.dot(
+                self._mesh2world[:3, :3].T) + self._mesh2world[:3, 3]
+        self._vertices_outdated = False
+        self._mesh_outdated = True
+        self._points_outdated = True
 
     @property
     def hand_pointcloud(self):
-        if self.mesh_updated:
-            self.recompute_mesh()
-            self.mesh_updated = False
-
+        self._check_not_headless()
+        vertices = self.vertices
+        if self._points is None:
+            self._points = o3d.geometry.PointCloud(
+                o3d.utility.Vector3dVector(vertices))
+            self._points.paint_uniform_color((0, 0, 0))
+        elif self._points_outdated:
+            self._points.points = o3d.utility.Vector3dVector(vertices)
+        self._points_outdated = False
         return self._points
 
+    def _check_not_headless(self):
+        if self.headless:
+            raise RuntimeError(
+                "Open3D objects are not available in headless mode.")
+
 
-def load_model(left=True):
+MANO_CACHE_VERSION = 1
+_MODELS = {}
+
+
+def load_model(left=True, use_cache=True):
     """Load model parameters.
 
+    The model is stored in a JSON file. Parsing it is slow. Hence, a binary
+    copy of the model will be stored next to it ('<json>.cache.npz') and
+    used in subsequent calls as long as the JSON file is not modified.
+    In addition, the model will only be loaded once per process.
+
     Parameters
     ----------
     left : bool, optional (default: True)
         Left hand. Right hand otherwise.
 
+    use_cache : bool, optional (default: True)
+        Use binary cache and the model that has already been loaded by this
+        process. Arrays of a cached model are shared and read-only.
+
     Returns
     -------
     model_parameters : dict
         Parameters that we need to compute mesh of hand.
     """
     side = "left" if left else "right"
+    if use_cache and side in _MODELS:
+        return dict(_MODELS[side])
+
     filename = resource_filename(
         "hand_embodiment", f"model/mano/mano_{side}.json")
 
+    model_kwargs = _load_model_cache(filename) if use_cache else None
+    if model_kwargs is None:
+        model_kwargs = _load_model_json(filename)
+        if use_cache:
+            _write_model_cache(filename, model_kwargs)
+
+    if use_cache:
+        for value in model_kwargs.values():
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+            elif sparse.issparse(value):
+                for array in [value.data, value.indices, value.indptr]:
+                    array.setflags(write=False)
+        _MODELS[side] = model_kwargs
+        model_kwargs = dict(model_kwargs)
+    return model_kwargs
+
+
+def write_model_cache(filename):
+    """Convert model from JSON file to binary cache that load_model uses.
+
+    Parameters
+    ----------
+    filename : str
+        JSON file that contains the model.
+    """
+    _write_model_cache(filename, _load_model_json(filename))
+
+
+def _load_model_json(filename):
     with open(filename, "r") as f:
         model_kwargs = json.load(f)
 
@@ -157,6 +280,56 @@ def load_model(left=True):
     return model_kwargs
 
 
+def _model_cache_key(filename):
+    stat = os.stat(filename)
+    return np.array([MANO_CACHE_VERSION, stat.st_size, stat.st_mtime_ns],
+                    dtype=np.int64)
+
+
+def _load_model_cache(filename):
+    """Load cache if it is valid, otherwise return None."""
+    cache_filename = filename + ".cache.npz"
+    if not os.path.exists(cache_filename):
+        return None
+    try:
+        with np.load(cache_filename) as cache:
+            if not np.array_equal(cache["key"], _model_cache_key(filename)):
+                return None
+            model_kwargs = json.loads(str(cache["header"]))
+            for k in json.loads(str(cache["array_keys"])):
+                model_kwargs[k] = cache[k]
+            model_kwargs["J_regressor"] = sparse.csc_matrix(
+                (cache["J_regressor.data"], cache["J_regressor.indices"],
+                 cache["J_regressor.indptr"]),
+                shape=tuple(cache["J_regressor.shape"]))
+    except (OSError, ValueError, KeyError):
+        return None
+    return model_kwargs
+
+
+def _write_model_cache(filename, model_kwargs):
+    """Write cache next to the model file if possible."""
+    cache_filename = filename + ".cache.npz"
+    arrays = {k: v for k, v in model_kwargs.items()
+              if isinstance(v, np.ndarray)}
+    header = {k: v for k, v in model_kwargs.items()
+              if k not in arrays and k != "J_regressor"}
+    J_regressor = model_kwargs["J_regressor"]
+    try:
+        with open(cache_filename + ".tmp", "wb") as f:
+            np.savez(
+                f, key=_model_cache_key(filename), header=json.dumps(header),
+                array_keys=json.dumps(list(arrays.keys())),
+                **{"J_regressor.data": J_regressor.data,
+                   "J_regressor.indices": J_regressor.indices,
+                   "J_regressor.indptr": J_regressor.indptr,
+                   "J_regressor.shape": np.array(J_regressor.shape)},
+                **arrays)
+        os.replace(cache_filename + ".tmp", cache_filename)
+    except OSError as e:
+        warnings.warn(f"Could not write cache of '{filename}': {e}")
+
+
 def apply_shape_parameters(v_template, J_regressor, shapedirs, betas):
     """Apply shape parameters.
 
@@ -188,9 +361,56 @@ def apply_shape_parameters(v_template, J_regressor, shapedirs, betas):
     return J_regressor.dot(v_shaped), v_shaped
 
 
-def hand_vertices(J, weights, kintree_table, v_template, posedirs, pose=None):
+def hand_vertices(J, weights, kintree_table, v_template, posedirs, pose=None,
+                  parents=None, traversal_order=None):
     """Compute vertices of hand mesh.
 
+    The computation is done by the backend that has been selected with
+    set_hand_vertices_backend. See hand_vertices_python for details.
+
+    Parameters
+    ----------
+    J : array, shape (n_parts, 3)
+        Joint positions
+
+    weights : array, shape (n_vertices, n_parts)
+        Blend weight matrix, how much does the rotation of each part effect
+        each vertex
+
+    kintree_table : array, shape (2, n_parts)
+        Table that describes the kinematic tree of the hand.
+
+    v_template : array, shape (n_vertices, 3)
+        Vertices of template model
+
+    posedirs : array, shape (n_vertices, 3, 9 * (n_parts - 1))
+        Orthonormal principal components of pose displacements.
+
+    pose : array, shape (n_parts * 3)
+        Hand pose parameters
+
+    parents : array, shape (n_parts,), optional (default: None)
+        Index of the parent of each part, see compile_kintree. Will be
+        computed from kintree_table if not given.
+
+    traversal_order : array, shape (n_parts,), optional (default: None)
+        Order in which parts are visited, see compile_kintree. Will be
+        computed from kintree_table if not given.
+
+    Returns
+    -------
+    vertices : array, shape (n_vertices, 3)
+        Vertices of the hand mesh
+    """
+    return _hand_vertices_backend(
+        J, weights, kintree_table, v_template, posedirs, pose, parents,
+        traversal_order)
+
+
+def hand_vertices_python(J, weights, kintree_table, v_template, posedirs,
+                         pose=None, parents=None, traversal_order=None):
+    """Compute vertices of hand mesh (Python backend).
+
     n_parts = 16
     n_vertices = 778
     n_principal_shape_parameters = 10
@@ -224,21 +444,29 @@ def hand_vertices(J, weights, kintree_table, v_template, posedirs, pose=None):
 
     pose : array, shape (n_parts * 3)
         Hand pose parameters
+
+    parents : array, shape (n_parts,), optional (default: None)
+        Index of the parent of each part, see compile_kintree. Will be
+        computed from kintree_table if not given.
+
+    traversal_order : array, shape (n_parts,), optional (default: None)
+        Order in which parts are visited, see compile_kintree. Will be
+        computed from kintree_table if not given.
+
+    Returns
+    -------
+    vertices : array, shape (n_vertices, 3)
+        Vertices of the hand mesh
     """
     if pose is None:
         pose = np.zeros(kintree_table.shape[1] * 3)
     pose = pose.reshape(-1, 3)
     v_posed = v_template + posedirs.dot(lrotmin(pose))
-    vertices = forward_kinematic(pose, v_posed, J, weights, kintree_table)
+    vertices = forward_kinematic(pose, v_posed, J, weights, kintree_table,
+                                 parents, traversal_order)
     return vertices
 
 
-try:
-    from .mano_fast import hand_vertices
-except ImportError:
-    pass  # using Python version
-
-
 def lrotmin(p):
     """Compute offset magnitudes to the template model from pose parameters.
 
@@ -257,7 +485,8 @@ def lrotmin(p):
          for pp in p[1:]]).ravel()
 
 
-def forward_kinematic(pose, v, J, weights, kintree_table):
+def forward_kinematic(pose, v, J, weights, kintree_table, parents=None,
+                      traversal_order=None):
     """Computes the blending of joint influences for each vertex.
 
     Parameters
@@ -280,12 +509,21 @@ def forward_kinematic(pose, v, J, weights, kintree_table):
         kintree_table[0, i] contains the index of the parent part of part i
         and kintree_table[1, :] does not matter for the MANO model.
 
+    parents : array, shape (n_parts,), optional (default: None)
+        Index of the parent of each part, see compile_kintree. Will be
+        computed from kintree_table if not given.
+
+    traversal_order : array, shape (n_parts,), optional (default: None)
+        Order in which parts are visited, see compile_kintree. Will be
+        computed from kintree_table if not given.
+
     Returns
     -------
     v : array, shape (n_vertices, 3)
         Transformed vertices
     """
-    A = global_rigid_transformation(pose, J, kintree_table)
+    A = global_rigid_transformation(
+        pose, J, kintree_table, parents, traversal_order)
     T = A.dot(weights.T)
 
     rest_shape_h = np.vstack((v.T, np.ones((1, v.shape[0]))))
@@ -298,7 +536,8 @@ def forward_kinematic(pose, v, J, weights, kintree_table):
     return v[:, :3]
 
 
-def global_rigid_transformation(pose, J, kintree_table):
+def global_rigid_transformation(pose, J, kintree_table, parents=None,
+                                traversal_order=None):
     """Computes global rotation and translation of the model.
 
     Parameters
@@ -314,27 +553,601 @@ def global_rigid_transformation(pose, J, kintree_table):
         kintree_table[0, i] contains the index of the parent part of part i
         and kintree_table[1, :] does not matter for the MANO model.
 
+    parents : array, shape (n_parts,), optional (default: None)
+        Index of the parent of each part, see compile_kintree. Will be
+        computed from kintree_table if not given.
+
+    traversal_order : array, shape (n_parts,), optional (default: None)
+        Order in which parts are visited, see compile_kintree. Will be
+        computed from kintree_table if not given.
+
     Returns
     -------
     A : array, shape (4, 4, n_parts)
         Transformed joint poses
     """
-    id_to_col = {kintree_table[1, i]: i
-                 for i in range(kintree_table.shape[1])}
-    parent = {i: id_to_col[kintree_table[0, i]]
-              for i in range(1, kintree_table.shape[1])}
-
-    results = {0: pt.transform_from(
-        pr.matrix_from_compact_axis_angle(pose[0, :]), J[0, :])}
-    for i in range(1, kintree_table.shape[1]):
-        T = pt.transform_from(pr.matrix_from_compact_axis_angle(
-            pose[i, :]), J[i, :] - J[parent[i], :])
-        results[i] = results[parent[i]].dot(T)
-
-    results = [results[i] for i in sorted(results.keys())]
+    parents, traversal_order = _compiled_kintree(
+        kintree_table, parents, traversal_order)
+
+    results = np.empty((len(parents), 4, 4))
+    for i in traversal_order:
+        p = parents[i]
+        R = pr.matrix_from_compact_axis_angle(pose[i, :])
+        if p < 0:
+            results[i] = pt.transform_from(R, J[i, :])
+        else:
+            results[i] = results[p].dot(
+                pt.transform_from(R, J[i, :] - J[p, :]))
 
     def pack(x):
         return np.hstack([np.zeros((4, 3)), x.reshape((4, 1))])
     return np.dstack(
         [results[i] - pack(results[i].dot(np.hstack(((J[i, :]), (0,)))))
          for i in range(len(results))])
+
+
+def hand_vertices_numba(J, weights, kintree_table, v_template, posedirs,
+                        pose=None, parents=None, traversal_order=None):
+    """Compute vertices of hand mesh (numba backend).
+
+    See hand_vertices_python for details.
+    """
+    if pose is None:
+        pose = np.zeros(kintree_table.shape[1] * 3)
+    parents, traversal_order = _compiled_kintree(
+        kintree_table, parents, traversal_order)
+    return _hand_vertices_numba(
+        J, weights, parents, traversal_order, v_template, posedirs,
+        pose.reshape(-1, 3))
+
+
+def compile_kintree(kintree_table):
+    """Compile kinematic tree to arrays that can be used for traversal.
+
+    Parameters
+    ----------
+    kintree_table : array, shape (2, n_parts)
+        Table that describes the kinematic tree of the hand.
+        kintree_table[0, i] contains the ID of the parent part of part i
+        and kintree_table[1, i] contains the ID of part i. The first
+        column is the root.
+
+    Returns
+    -------
+    parents : array, shape (n_parts,)
+        Column of the parent of each part. The root has the parent -1.
+
+    traversal_order : array, shape (n_parts,)
+        Columns of all parts in depth-first order, i.e., each part is visited
+        after its parent.
+    """
+    n_parts = kintree_table.shape[1]
+    id_to_col = {kintree_table[1, i]: i for i in range(n_parts)}
+    parents = np.empty(n_parts, dtype=np.int64)
+    parents[0] = -1
+    children = [[] for _ in range(n_parts)]
+    for i in range(1, n_parts):
+        parents[i] = id_to_col[kintree_table[0, i]]
+        children[parents[i]].append(i)
+
+    traversal_order = []
+    stack = [0]
+    while stack:
+        i = stack.pop()
+        traversal_order.append(i)
+        stack.extend(reversed(children[i]))
+    return parents, np.array(traversal_order, dtype=np.int64)
+
+
+def _compiled_kintree(kintree_table, parents, traversal_order):
+    if parents is None or traversal_order is None:
+        return compile_kintree(kintree_table)
+    return parents, traversal_order
+
+
+@numba.njit(cache=True)
+def _hand_vertices_numba(J, weights, parents, traversal_order, v_template,
+                         posedirs, pose):
+    n_parts = len(parents)
+    n_vertices = len(v_template)
+    vertices = np.empty((n_vertices, 3))
+    _hand_vertices_numba_inplace(
+        J, weights, parents, traversal_order, v_template, posedirs, pose,
+        np.empty((n_parts, 3, 3)), np.empty(9 * (n_parts - 1)),
+        np.empty((n_vertices, 3)), np.empty((n_parts, 3, 4)), vertices)
+    return vertices
+
+
+@numba.njit(cache=True)
+def _hand_vertices_numba_inplace(
+        J, weights, parents, traversal_order, v_template, posedirs, pose,
+        rotations, offsets, v_posed, transforms, vertices):
+    """Compute vertices of hand mesh without allocating memory.
+
+    rotations (n_parts, 3, 3), offsets (9 * (n_parts - 1),), v_posed
+    (n_vertices, 3), and transforms (n_parts, 3, 4) are used as workspace.
+    The result will be stored in vertices (n_vertices, 3).
+    """
+    for i in range(len(parents)):
+        _matrix_from_compact_axis_angle_numba(pose[i], rotations[i])
+        if i > 0:  # see lrotmin
+            for j in range(3):
+                for k in range(3):
+                    offsets[9 * (i - 1) + 3 * j + k] = rotations[i, j, k]
+                offsets[9 * (i - 1) + 4 * j] -= 1.0
+    _pose_blend_shapes_numba(posedirs, offsets, v_template, v_posed)
+    _global_rigid_transformation_numba(
+        rotations, J, parents, traversal_order, transforms)
+    _linear_blend_skinning_numba(transforms, weights, v_posed, vertices)
+
+
+@numba.njit(cache=True)
+def _matrix_from_compact_axis_angle_numba(a, out):
+    angle = np.sqrt(a[0] * a[0] + a[1] * a[1] + a[2] * a[2])
+    if angle == 0.0:
+        out[:, :] = 0.0
+        out[0, 0] = out[1, 1] = out[2, 2] = 1.0
+        return
+    ux = a[0] / angle
+    uy = a[1] / angle
+    uz = a[2] / angle
+    c = np.cos(angle)
+    s = np.sin(angle)
+    ci = 1.0 - c
+    out[0, 0] = ci * ux * ux + c
+    out[0, 1] = ci * ux * uy - uz * s
+    out[0, 2] = ci * ux * uz + uy * s
+    out[1, 0] = ci * uy * ux + uz * s
+    out[1, 1] = ci * uy * uy + c
+    out[1, 2] = ci * uy * uz - ux * s
+    out[2, 0] = ci * uz * ux - uy * s
+    out[2, 1] = ci * uz * uy + ux * s
+    out[2, 2] = ci * uz * uz + c
+
+
+@numba.njit(cache=True)
+def _pose_blend_shapes_numba(posedirs, offsets, v_template, v_posed):
+    for v in range(posedirs.shape[0]):
+        for d in range(3):
+            acc = v_template[v, d]
+            for k in range(offsets.shape[0]):
+                acc += posedirs[v, d, k] * offsets[k]
+            v_posed[v, d] = acc
+
+
+@numba.njit(cache=True)
+def _global_rigid_transformation_numba(
+        rotations, J, parents, traversal_order, A):
+    """Numba version of global_rigid_transformation.
+
+    Only the upper 3x4 part of each transformation will be stored in
+    A (n_parts, 3, 4).
+    """
+    for i in traversal_order:
+        p = parents[i]
+        if p < 0:
+            A[i, :, :3] = rotations[i]
+            A[i, :, 3] = J[i]
+            continue
+        for r in range(3):
+            for c in range(3):
+                A[i, r, c] = (A[p, r, 0] * rotations[i, 0, c]
+                              + A[p, r, 1] * rotations[i, 1, c]
+                              + A[p, r, 2] * rotations[i, 2, c])
+            A[i, r, 3] = A[p, r, 3]
+            for c in range(3):
+                A[i, r, 3] += A[p, r, c] * (J[i, c] - J[p, c])
+    for i in range(len(parents)):
+        for r in range(3):
+            for c in range(3):
+                A[i, r, 3] -= A[i, r, c] * J[i, c]
+
+
+@numba.njit(cache=True)
+def _linear_blend_skinning_numba(A, weights, v_posed, vertices):
+    for v in range(v_posed.shape[0]):
+        x = v_posed[v, 0]
+        y = v_posed[v, 1]
+        z = v_posed[v, 2]
+        vertices[v, :] = 0.0
+        for k in range(A.shape[0]):
+            w = weights[v, k]
+            if w == 0.0:
+                continue
+            for r in range(3):
+                vertices[v, r] += w * (A[k, r, 0] * x + A[k, r, 1] * y
+                                       + A[k, r, 2] * z + A[k, r, 3])
+
+
+HAND_VERTICES_BACKENDS = {
+    "python": hand_vertices_python,
+    "numba": hand_vertices_numba,
+}
+try:
+    from .mano_fast import hand_vertices as hand_vertices_cython
+    HAND_VERTICES_BACKENDS["cython"] = hand_vertices_cython
+except ImportError:
+    pass  # Cython extension has not been built
+_hand_vertices_backend = hand_vertices_numba
+
+
+def set_hand_vertices_backend(backend):
+    """Select implementation of hand_vertices.
+
+    Parameters
+    ----------
+    backend : str
+        Either 'python', 'numba', or 'cython' (only if the Cython extension
+        has been built). The default is 'numba'.
+
+    Raises
+    ------
+    ValueError
+        If the backend is not available.
+    """
+    global _hand_vertices_backend
+    if backend not in HAND_VERTICES_BACKENDS:
+        raise ValueError(
+            f"Unknown or unavailable backend: '{backend}'. Available backends: "
+            f"{', '.join(HAND_VERTICES_BACKENDS.keys())}")
+    _hand_vertices_backend = HAND_VERTICES_BACKENDS[backend]
+
+
+class HandVerticesWorkspace:
+    """Preallocated memory to compute vertices of the same model repeatedly.
+
+    Intermediate results and the vertices are stored in arrays that are
+    reused for each call so that no memory will be allocated. The model
+    parameters are the same as for hand_vertices.
+
+    Parameters
+    ----------
+    J : array, shape (n_parts, 3)
+        Joint positions
+
+    weights : array, shape (n_vertices, n_parts)
+        Blend weight matrix, how much does the rotation of each part effect
+        each vertex
+
+    kintree_table : array, shape (2, n_parts)
+        Table that describes the kinematic tree of the hand.
+
+    v_template : array, shape (n_vertices, 3)
+        Vertices of template model
+
+    posedirs : array, shape (n_vertices, 3, 9 * (n_parts - 1))
+        Orthonormal principal components of pose displacements.
+
+    parents : array, shape (n_parts,), optional (default: None)
+        Index of the parent of each part, see compile_kintree.
+
+    traversal_order : array, shape (n_parts,), optional (default: None)
+        Order in which parts are visited, see compile_kintree.
+
+    Attributes
+    ----------
+    pose : array, shape (n_parts * 3,)
+        Hand pose parameters that will be used if no pose is passed to
+        __call__. Can be modified in place.
+
+    vertices : array, shape (n_vertices, 3)
+        Result of the last call.
+    """
+    def __init__(self, J, weights, kintree_table, v_template, posedirs,
+                 parents=None, traversal_order=None):
+        parents, traversal_order = _compiled_kintree(
+            kintree_table, parents, traversal_order)
+        self._model = tuple(np.ascontiguousarray(a, dtype=dtype) for a, dtype
+                            in [(J, float), (weights, float),
+                                (parents, np.int64),
+                                (traversal_order, np.int64),
+                                (v_template, float), (posedirs, float)])
+        n_parts = len(parents)
+        n_vertices = len(v_template)
+
+        self.pose = np.zeros(3 * n_parts)
+        self._pose_matrix = self.pose.reshape(n_parts, 3)
+        self._rotations = np.empty((n_parts, 3, 3))
+        self._offsets = np.empty(9 * (n_parts - 1))
+        self._v_posed = np.empty((n_vertices, 3))
+        self._transforms = np.empty((n_parts, 3, 4))
+        self.vertices = np.empty((n_vertices, 3))
+
+    def __call__(self, pose=None):
+        """Compute vertices of hand mesh.
+
+        Parameters
+        ----------
+        pose : array, shape (n_parts * 3,), optional (default: None)
+            Hand pose parameters. Will be copied to the attribute pose.
+            The current content of the attribute pose will be used otherwise.
+
+        Returns
+        -------
+        vertices : array, shape (n_vertices, 3)
+            Vertices of the hand mesh. The array will be overwritten by the
+            next call.
+        """
+        if pose is not None:
+            self.pose[:] = pose
+        _hand_vertices_numba_inplace(
+            *self._model, self._pose_matrix, self._rotations, self._offsets,
+            self._v_posed, self._transforms, self.vertices)
+        return self.vertices
+
+
+def hand_vertices_batch(J, weights, kintree_table, v_template, posedirs,
+                        poses, parents=None, traversal_order=None):
+    """Compute vertices of hand mesh for multiple poses at once.
+
+    This is the vectorized version of :func:`hand_vertices`. All poses share
+    the same shape parameters.
+
+    Parameters
+    ----------
+    J : array, shape (n_parts, 3)
+        Joint positions
+
+    weights : array, shape (n_vertices, n_parts)
+        Blend weight matrix, how much does the rotation of each part effect
+        each vertex
+
+    kintree_table : array, shape (2, n_parts)
+        Table that describes the kinematic tree of the hand.
+        kintree_table[0, i] contains the index of the parent part of part i
+        and kintree_table[1, :] does not matter for the MANO model.
+
+    v_template : array, shape (n_vertices, 3)
+        Vertices of template model
+
+    posedirs : array, shape (n_vertices, 3, 9 * (n_parts - 1))
+        Orthonormal principal components of pose displacements.
+
+    poses : array, shape (n_poses, n_parts * 3)
+        Hand pose parameters
+
+    parents : array, shape (n_parts,), optional (default: None)
+        Index of the parent of each part, see compile_kintree. Will be
+        computed from kintree_table if not given.
+
+    traversal_order : array, shape (n_parts,), optional (default: None)
+        Order in which parts are visited, see compile_kintree. Will be
+        computed from kintree_table if not given.
+
+    Returns
+    -------
+    vertices : array, shape (n_poses, n_vertices, 3)
+        Vertices of the hand mesh for each pose
+    """
+    poses = np.asarray(poses, dtype=float)
+    n_poses = len(poses)
+    rotations = batch_matrices_from_compact_axis_angle(
+        poses.reshape(n_poses, -1, 3))
+    pose_offsets = rotations[:, 1:] - np.eye(3)
+    v_posed = v_template[np.newaxis] + np.einsum(
+        "vdk,nk->nvd", posedirs, pose_offsets.reshape(n_poses, -1))
+    A = global_rigid_transformation_batch(
+        rotations, J, kintree_table, parents, traversal_order)
+    T = np.einsum("npij,vp->nvij", A[:, :, :3], weights)
+    return np.einsum("nvij,nvj->nvi", T[:, :, :, :3], v_posed) + T[:, :, :, 3]
+
+
+def batch_matrices_from_compact_axis_angle(a):
+    """Compute rotation matrices from compact axis-angle representations.
+
+    Parameters
+    ----------
+    a : array, shape (..., 3)
+        Axes of rotation scaled by rotation angles
+
+    Returns
+    -------
+    R : array, shape (..., 3, 3)
+        Rotation matrices
+    """
+    angles = np.linalg.norm(a, axis=-1)
+    zero = angles == 0.0
+    axes = a / np.where(zero, 1.0, angles)[..., np.newaxis]
+    ux, uy, uz = axes[..., 0], axes[..., 1], axes[..., 2]
+    c = np.cos(angles)
+    s = np.sin(angles)
+    ci = 1.0 - c
+
+    R = np.empty(a.shape[:-1] + (3, 3))
+    R[..., 0, 0] = ci * ux * ux + c
+    R[..., 0, 1] = ci * ux * uy - uz * s
+    R[..., 0, 2] = ci * ux * uz + uy * s
+    R[..., 1, 0] = ci * uy * ux + uz * s
+    R[..., 1, 1] = ci * uy * uy + c
+    R[..., 1, 2] = ci * uy * uz - ux * s
+    R[..., 2, 0] = ci * uz * ux - uy * s
+    R[..., 2, 1] = ci * uz * uy + ux * s
+    R[..., 2, 2] = ci * uz * uz + c
+    return R
+
+
+def global_rigid_transformation_batch(rotations, J, kintree_table,
+                                      parents=None, traversal_order=None):
+    """Computes global rotation and translation of the model for many poses.
+
+    Parameters
+    ----------
+    rotations : array, shape (n_poses, n_parts, 3, 3)
+        Local rotation of each part
+
+    J : array, shape (n_parts, 3)
+        Joint positions
+
+    kintree_table : array, shape (2, n_parts)
+        Table that describes the kinematic tree of the hand.
+        kintree_table[0, i] contains the index of the parent part of part i
+        and kintree_table[1, :] does not matter for the MANO model.
+
+    parents : array, shape (n_parts,), optional (default: None)
+        Index of the parent of each part, see compile_kintree. Will be
+        computed from kintree_table if not given.
+
+    traversal_order : array, shape (n_parts,), optional (default: None)
+        Order in which parts are visited, see compile_kintree. Will be
+        computed from kintree_table if not given.
+
+    Returns
+    -------
+    A : array, shape (n_poses, n_parts, 4, 4)
+        Transformed joint poses
+    """
+    parents, traversal_order = _compiled_kintree(
+        kintree_table, parents, traversal_order)
+
+    n_poses, n_parts = rotations.shape[:2]
+    A = np.zeros((n_poses, n_parts, 4, 4))
+    A[:, :, 3, 3] = 1.0
+    for i in traversal_order:
+        p = parents[i]
+        if p < 0:
+            A[:, i, :3, :3] = rotations[:, i]
+            A[:, i, :3, 3] = J[i]
+            continue
+        A[:, i, :3, :3] = np.matmul(A[:, p, :3, :3], rotations[:, i])
+        A[:, i, :3, 3] = A[:, p, :3, 3] + np.einsum(
+            "nij,j->ni", A[:, p, :3, :3], J[i] - J[p])
+
+    A[:, :, :3, 3] -= np.einsum("npij,pj->npi", A[:, :, :3, :3], J)
+    return A
+
+
+def hand_vertices_jacobian(J, weights, kintree_table, v_template, posedirs,
+                           pose, parents=None, traversal_order=None):
+    """Compute vertices of hand mesh and their derivatives w.r.t. the pose.
+
+    The Jacobian is computed analytically with forward-mode differentiation
+    through the kinematic tree, pose blend shapes, and linear blend skinning.
+    This is intended for small (reduced) models like the ones that are used
+    for each finger in the record mapping.
+
+    Parameters
+    ----------
+    J : array, shape (n_parts, 3)
+        Joint positions
+
+    weights : array, shape (n_vertices, n_parts)
+        Blend weight matrix, how much does the rotation of each part effect
+        each vertex
+
+    kintree_table : array, shape (2, n_parts)
+        Table that describes the kinematic tree of the hand.
+        kintree_table[0, i] contains the index of the parent part of part i
+        and kintree_table[1, :] does not matter for the MANO model.
+
+    v_template : array, shape (n_vertices, 3)
+        Vertices of template model
+
+    posedirs : array, shape (n_vertices, 3, 9 * (n_parts - 1))
+        Orthonormal principal components of pose displacements.
+
+    pose : array, shape (n_parts * 3)
+        Hand pose parameters
+
+    parents : array, shape (n_parts,), optional (default: None)
+        Index of the parent of each part, see compile_kintree. Will be
+        computed from kintree_table if not given.
+
+    traversal_order : array, shape (n_parts,), optional (default: None)
+        Order in which parts are visited, see compile_kintree. Will be
+        computed from kintree_table if not given.
+
+    Returns
+    -------
+    vertices : array, shape (n_vertices, 3)
+        Vertices of the hand mesh
+
+    jacobian : array, shape (n_vertices, 3, n_parts * 3)
+        Derivatives of vertex positions w.r.t. pose parameters
+    """
+    n_parts = kintree_table.shape[1]
+    n_params = 3 * n_parts
+    pose = np.asarray(pose, dtype=float).reshape(-1, 3)
+
+    parents, traversal_order = _compiled_kintree(
+        kintree_table, parents, traversal_order)
+
+    R = np.empty((n_parts, 3, 3))
+    dR = np.empty((n_parts, 3, 3, 3))
+    for i in range(n_parts):
+        R[i], dR[i] = _matrix_and_derivatives_from_compact_axis_angle(pose[i])
+
+    # forward kinematics with derivatives of global joint transformations
+    W = np.zeros((n_parts, 4, 4))
+    dW = np.zeros((n_parts, n_params, 4, 4))
+    for i in traversal_order:
+        T = np.eye(4)
+        T[:3, :3] = R[i]
+        dT = np.zeros((3, 4, 4))
+        dT[:, :3, :3] = dR[i]
+        p = parents[i]
+        if p < 0:
+            T[:3, 3] = J[i]
+            W[i] = T
+            dW[i, 3 * i:3 * i + 3] = dT
+        else:
+            T[:3, 3] = J[i] - J[p]
+            W[i] = W[p].dot(T)
+            dW[i] = np.matmul(dW[p], T)
+            dW[i, 3 * i:3 * i + 3] += np.matmul(W[p], dT)
+
+    # remove rest pose from joint transformations
+    A = W.copy()
+    A[:, :3, 3] -= np.einsum("pij,pj->pi", W[:, :3, :3], J)
+    dA = dW.copy()
+    dA[:, :, :3, 3] -= np.einsum("pqij,pj->pqi", dW[:, :, :3, :3], J)
+
+    pose_offsets = (R[1:] - np.eye(3)).ravel()
+    v_posed = v_template + posedirs.dot(pose_offsets)
+    dpose_offsets = np.zeros((9 * (n_parts - 1), n_params))
+    for i in range(1, n_parts):
+        dpose_offsets[9 * (i - 1):9 * i, 3 * i:3 * i + 3] = \
+            dR[i].reshape(3, 9).T
+    dv_posed = posedirs.dot(dpose_offsets)
+
+    T = np.einsum("pij,vp->vij", A[:, :3], weights)
+    dT = np.einsum("pqij,vp->vqij", dA[:, :, :3], weights)
+    vertices = np.einsum("vij,vj->vi", T[:, :, :3], v_posed) + T[:, :, 3]
+    jacobian = (np.einsum("vqij,vj->viq", dT[:, :, :, :3], v_posed)
+                + np.einsum("vqi->viq", dT[:, :, :, 3])
+                + np.einsum("vij,vjq->viq", T[:, :, :3], dv_posed))
+    return vertices, jacobian
+
+
+def _matrix_and_derivatives_from_compact_axis_angle(a):
+    """Compute rotation matrix and its derivatives from compact axis-angle.
+
+    See G. Gallego, A. Yezzi: A compact formula for the derivative of a 3-D
+    rotation in exponential coordinates (2015), Journal of Mathematical
+    Imaging and Vision, 51, pp. 378-384.
+
+    Parameters
+    ----------
+    a : array, shape (3,)
+        Axis of rotation scaled by rotation angle
+
+    Returns
+    -------
+    R : array, shape (3, 3)
+        Rotation matrix
+
+    dR : array, shape (3, 3, 3)
+        Derivatives of the rotation matrix w.r.t. each component of a
+    """
+    R = pr.matrix_from_compact_axis_angle(a)
+    angle_squared = np.dot(a, a)
+    dR = np.empty((3, 3, 3))
+    if angle_squared < 1e-16:
+        for i in range(3):
+            dR[i] = pr.cross_product_matrix(np.eye(3)[i])
+        return R, dR
+    I_minus_R = np.eye(3) - R
+    for i in range(3):
+        dR[i] = (a[i] * pr.cross_product_matrix(a)
+                 + pr.cross_product_matrix(np.cross(a, I_minus_R[:, i]))
+                 ).dot(R) / angle_squared
+    return R, dR
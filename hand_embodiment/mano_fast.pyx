@@ -15,11 +15,36 @@ cpdef hand_vertices(
         np.ndarray[long, ndim=2] kintree_table,
         np.ndarray[double, ndim=2] v_template,
         np.ndarray[double, ndim=3] posedirs,
-        np.ndarray[double, ndim=1] pose):
+        np.ndarray[double, ndim=1] pose,
+        parents=None, traversal_order=None):
     cdef np.ndarray[double, ndim=2] pose_reshaped = pose.reshape(-1, 3)
     cdef np.ndarray[double, ndim=2] v_posed = v_template + posedirs.dot(lrotmin(pose_reshaped))
 
-    return forward_kinematic(pose_reshaped, v_posed, J, weights, kintree_table)
+    if parents is None or traversal_order is None:
+        parents, traversal_order = compile_kintree(kintree_table)
+    cdef np.ndarray[long, ndim=1] parents_array = parents
+    cdef np.ndarray[long, ndim=1] traversal_order_array = traversal_order
+    return forward_kinematic(pose_reshaped, v_posed, J, weights, parents_array, traversal_order_array)
+
+
+def compile_kintree(np.ndarray[long, ndim=2] kintree_table):
+    cdef int n_parts = kintree_table.shape[1]
+    cdef int i
+    cdef dict id_to_col = {kintree_table[1, i]: i for i in range(n_parts)}
+    cdef np.ndarray[long, ndim=1] parents = np.empty(n_parts, dtype=np.int64)
+    cdef list children = [[] for _ in range(n_parts)]
+    parents[0] = -1
+    for i in range(1, n_parts):
+        parents[i] = id_to_col[kintree_table[0, i]]
+        children[parents[i]].append(i)
+
+    cdef list traversal_order = []
+    cdef list stack = [0]
+    while stack:
+        i = stack.pop()
+        traversal_order.append(i)
+        stack.extend(reversed(children[i]))
+    return parents, np.array(traversal_order, dtype=np.int64)
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
@@ -77,8 +102,9 @@ cdef np.ndarray[double, ndim=2] forward_kinematic(
         np.ndarray[double, ndim=2] v,
         np.ndarray[double, ndim=2] J,
         np.ndarray[double, ndim=2] weights,
-        np.ndarray[long, ndim=2] kintree_table):
-    cdef np.ndarray[double, ndim=3] A = global_rigid_transformation(pose, J, kintree_table)
+        np.ndarray[long, ndim=1] parents,
+        np.ndarray[long, ndim=1] traversal_order):
+    cdef np.ndarray[double, ndim=3] A = global_rigid_transformation(pose, J, parents, traversal_order)
     cdef np.ndarray[double, ndim=3] T = np.einsum("kij,lk->lji", A, weights)
 
     cdef np.ndarray[double, ndim=2] v_transformed = (
@@ -93,19 +119,21 @@ cdef np.ndarray[double, ndim=2] forward_kinematic(
 @cython.boundscheck(False)
 @cython.wraparound(False)
 @cython.nonecheck(False)
-cdef np.ndarray[double, ndim=3] global_rigid_transformation(np.ndarray[double, ndim=2] pose, np.ndarray[double, ndim=2] J, np.ndarray[long, ndim=2] kintree_table):
-    cdef int n_parts = kintree_table.shape[1]
-    cdef int i
-
-    cdef dict id_to_col = {kintree_table[1, i]: i for i in range(kintree_table.shape[1])}
-    cdef dict parent = {i: id_to_col[kintree_table[0, i]] for i in range(1, kintree_table.shape[1])}
+cdef np.ndarray[double, ndim=3] global_rigid_transformation(np.ndarray[double, ndim=2] pose, np.ndarray[double, ndim=2] J, np.ndarray[long, ndim=1] parents, np.ndarray[long, ndim=1] traversal_order):
+    cdef int n_parts = parents.shape[0]
+    cdef int i, j
+    cdef long p
 
     cdef np.ndarray[double, ndim=3] results = np.empty((n_parts, 4, 4))
-    _fast_transform_from(pose[0, :], J[0, :], results[0])
     cdef np.ndarray[double, ndim=2] T = np.empty((4, 4))
-    for i in range(1, n_parts):
-        _fast_transform_from(pose[i, :], J[i] - J[parent[i]], T)
-        results[i] = results[parent[i]].dot(T)
+    for j in range(n_parts):
+        i = traversal_order[j]
+        p = parents[i]
+        if p < 0:
+            _fast_transform_from(pose[i, :], J[i, :], results[i])
+        else:
+            _fast_transform_from(pose[i, :], J[i] - J[p], T)
+            results[i] = results[p].dot(T)
 
     for i in range(n_parts):
         results[i, :3, 3] -= results[i, :3, :3].dot(J[i])
@@ -1,4 +1,7 @@
 """Metrics for evaluation of the embodiment mapping."""
+import hashlib
+import os
+import re
 import numpy as np
 import open3d as o3d
 import numba
@@ -141,25 +144,33 @@ def highlight_mesh_vertices(mesh, vertex_indices, color=(1, 0, 0)):
     mesh.vertex_colors = o3d.utility.Vector3dVector(vertex_colors)
 
 
-def distances_robot_to_mano(hand_state, robot_graph, robot_contact_surfaces, finger_names):
+def distances_robot_to_mano(hand_state, robot_graph, robot_contact_surfaces,
+                            finger_names, cache_dir=None):
     distances = {}
     for finger_name in finger_names:
         mano_vertices, mano_triangles = extract_mano_contact_surface(
             hand_state, finger_name)
         robot_vertices = extract_graph_vertices(
-            robot_graph, robot_contact_surfaces, finger_name)
+            robot_graph, robot_contact_surfaces, finger_name,
+            cache_dir=cache_dir)
         mano_triangles = convert_mesh_to_triangles(mano_vertices, mano_triangles)
         distances[finger_name] = vertices_to_surface_mesh(
             robot_vertices, mano_triangles)
     return distances
 
 
-def extract_graph_vertices(graph, vertex_indices_per_visual, finger_name):
+def extract_graph_vertices(graph, vertex_indices_per_visual, finger_name,
+                           cache_dir=None):
     """Extract vertices from URDF meshes that are equally distributed.
 
     Poisson disk sampling is used to extract equally distributed vertices.
     See http://www.cemyuksel.com/research/sampleelimination/
 
+    Samples are computed once per visual and contact surface in the local
+    frame of the visual and cached in memory (and optionally on disk).
+    Subsequent calls only transform the samples to the current pose of the
+    visual.
+
     Parameters
     ----------
     graph : pytransform3d.visualizer.Graph
@@ -171,6 +182,10 @@ def extract_graph_vertices(graph, vertex_indices_per_visual, finger_name):
     finger_name : str
         Name of the finger for which we extract the vertices.
 
+    cache_dir : str, optional (default: None)
+        Directory in which samples will be stored and from which they will
+        be loaded.
+
     Returns
     -------
     vertices : array, shape (n_vertices, 3)
@@ -178,52 +193,503 @@ def extract_graph_vertices(graph, vertex_indices_per_visual, finger_name):
     """
     vertices = []
     for visual in vertex_indices_per_visual[finger_name]:
-        original_mesh = graph.visuals[visual].geometries[0]
-        vertex_indices = set(vertex_indices_per_visual[finger_name][visual])
-
-        mesh = o3d.geometry.TriangleMesh()
-        mesh.vertices = original_mesh.vertices
-        triangles = np.array(original_mesh.triangles)
-        triangles = np.array([
-            triangle for triangle in triangles
-            if any([vi in vertex_indices for vi in triangle])])
-        mesh.triangles = o3d.utility.Vector3iVector(triangles)
-
-        pc = mesh.sample_points_poisson_disk(100, seed=0)
-        vertices.append(np.array(pc.points))
+        visual2base = graph.tm.get_transform(visual, graph.frame)
+        samples = _contact_surface_samples(
+            visual, graph.visuals[visual].geometries[0],
+            vertex_indices_per_visual[finger_name][visual], visual2base,
+            cache_dir)
+        vertices.append(
+            np.dot(samples, visual2base[:3, :3].T) + visual2base[:3, 3])
     return np.concatenate(vertices, axis=0)
 
 
+_CONTACT_SURFACE_SAMPLES = {}
+
+
+def _contact_surface_samples(visual, mesh, vertex_indices, visual2base,
+                             cache_dir):
+    """Get Poisson disk samples of contact surface in frame of the visual.
+
+    Samples are cached by the name of the visual and a hash of the contact
+    surface's vertex indices. The surface area of the visual's mesh is stored
+    with the samples to detect meshes that are scaled differently.
+    """
+    area = mesh.get_surface_area()
+    digest = hashlib.sha1(np.unique(np.asarray(
+        vertex_indices, dtype=np.int64)).tobytes())
+    digest.update(np.int64(len(mesh.vertices)).tobytes())
+    key = (visual, digest.hexdigest()[:16])
+    filename = None
+    if cache_dir is not None:
+        filename = os.path.join(
+            cache_dir, re.sub(r"[^\w\-]", "_", "_".join(key)) + ".npz")
+
+    if key in _CONTACT_SURFACE_SAMPLES:
+        cached_area, samples = _CONTACT_SURFACE_SAMPLES[key]
+        if np.isclose(cached_area, area):
+            return samples
+    if filename is not None and os.path.exists(filename):
+        with np.load(filename) as cache:
+            if np.isclose(cache["area"], area):
+                _CONTACT_SURFACE_SAMPLES[key] = area, cache["samples"]
+                return cache["samples"]
+
+    base2visual_rotation = visual2base[:3, :3].T
+    local_vertices = np.dot(
+        np.asarray(mesh.vertices) - visual2base[:3, 3],
+        base2visual_rotation.T)
+    triangles = np.asarray(mesh.triangles)
+    triangles = triangles[np.any(
+        np.isin(triangles, np.asarray(vertex_indices)), axis=1)]
+
+    contact_surface = o3d.geometry.TriangleMesh()
+    contact_surface.vertices = o3d.utility.Vector3dVector(local_vertices)
+    contact_surface.triangles = o3d.utility.Vector3iVector(triangles)
+    samples = np.array(
+        contact_surface.sample_points_poisson_disk(100, seed=0).points)
+
+    _CONTACT_SURFACE_SAMPLES[key] = area, samples
+    if filename is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez(filename, area=area, samples=samples)
+    return samples
+
+
 def extract_mano_contact_surface(hand_state, finger_name):
-    """TODO"""
-    mesh = hand_state.hand_mesh
-    vertex_indices = set(MANO_CONTACT_SURFACE_VERTICES[finger_name])
-    vertices = np.array(mesh.vertices)
-    triangles = np.array(mesh.triangles)
-    triangles = [triangle for triangle in triangles
-                 if any([vi in vertex_indices for vi in triangle])]
-    return vertices, triangles
+    """Extract contact surface of a finger from MANO mesh.
+
+    Parameters
+    ----------
+    hand_state : HandState
+        MANO hand state with current vertices.
+
+    finger_name : str
+        Name of the finger.
+
+    Returns
+    -------
+    vertices : array, shape (n_vertices, 3)
+        All vertices of the MANO mesh.
+
+    triangles : array, shape (n_triangles, 3)
+        Indices of vertices of triangles that belong to the contact surface.
+    """
+    faces = mano_contact_surface_faces(hand_state.faces)[finger_name]
+    return hand_state.vertices, hand_state.faces[faces]
+
+
+_MANO_CONTACT_SURFACE_FACES = {}
+
+
+def mano_contact_surface_faces(faces):
+    """Indices of MANO faces that belong to the contact surface of fingers.
+
+    The result will be computed once per array of faces.
+
+    Parameters
+    ----------
+    faces : array, shape (n_faces, 3)
+        Faces of MANO mesh.
+
+    Returns
+    -------
+    face_indices : dict
+        Indices of faces that contain at least one vertex of
+        MANO_CONTACT_SURFACE_VERTICES per finger.
+    """
+    key = id(faces)
+    if key in _MANO_CONTACT_SURFACE_FACES \
+            and _MANO_CONTACT_SURFACE_FACES[key][0] is faces:
+        return _MANO_CONTACT_SURFACE_FACES[key][1]
+    face_indices = {
+        finger_name: np.nonzero(np.any(
+            np.isin(faces, vertex_indices), axis=1))[0]
+        for finger_name, vertex_indices
+        in MANO_CONTACT_SURFACE_VERTICES.items()}
+    _MANO_CONTACT_SURFACE_FACES[key] = faces, face_indices
+    return face_indices
 
 
 def convert_mesh_to_triangles(mesh_vertices, mesh_triangles):
-    """TODO"""
+    """Convert indexed mesh to triangle soup.
+
+    Parameters
+    ----------
+    mesh_vertices : array, shape (n_vertices, 3)
+        Vertices of the mesh.
+
+    mesh_triangles : array, shape (n_triangles, 3)
+        Indices of vertices of triangles.
+
+    Returns
+    -------
+    triangles : array, shape (n_triangles, 3, 3)
+        Triangle soup. Each triangle consists of three points.
+    """
     return mesh_vertices[mesh_triangles]
 
 
+BRUTE_FORCE_MAX_TRIANGLES = 16
+
+
 def vertices_to_surface_mesh(vertices, triangles):
     """Compute average distance of a set of vertices to a surface mesh.
 
-    TODO
+    Parameters
+    ----------
+    vertices : array, shape (n_vertices, 3)
+        Vertices.
+
+    triangles : array, shape (n_triangles, 3, 3)
+        Triangle soup that represents the surface mesh. Each triangle
+        consists of three points.
+
+    Returns
+    -------
+    mean_distance : float
+        Average of the shortest distances between each vertex and the mesh.
     """
-    distances = np.empty(len(vertices))
-    for vertex_idx, vertex in enumerate(vertices):
-        distances_per_vertex = np.empty(len(triangles))
-        for triangle_idx, triangle in enumerate(triangles):
-            distances_per_vertex[triangle_idx], _ = point_to_triangle(vertex, triangle)
-        distances[vertex_idx] = min(distances_per_vertex)
+    if len(triangles) <= BRUTE_FORCE_MAX_TRIANGLES:
+        distances, _ = points_to_triangles(vertices, triangles)
+    else:
+        distances, _, _ = TriangleBVH(triangles).query(vertices)
     return np.mean(distances)
 
 
+def points_to_triangles(points, triangles, return_triangle_indices=False):
+    """Compute the shortest distances between points and a triangle soup.
+
+    All pairs of points and triangles will be checked in parallel. For large
+    numbers of triangles, TriangleBVH is faster.
+
+    Parameters
+    ----------
+    points : array, shape (n_points, 3)
+        3D points.
+
+    triangles : array, shape (n_triangles, 3, 3)
+        Triangle soup. Each triangle consists of three points.
+
+    return_triangle_indices : bool, optional (default: False)
+        Return indices of closest triangles.
+
+    Returns
+    -------
+    distances : array, shape (n_points,)
+        Shortest distance of each point to the triangles.
+
+    closest_points : array, shape (n_points, 3)
+        Closest points on the triangles.
+
+    triangle_indices : array, shape (n_points,), optional
+        Indices of closest triangles.
+    """
+    points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 3)
+    triangles = np.ascontiguousarray(
+        triangles, dtype=np.float64).reshape(-1, 3, 3)
+    if len(triangles) == 0:
+        raise ValueError("No triangles given.")
+    distances, closest_points, triangle_indices = _points_to_triangles(
+        points, triangles)
+    if return_triangle_indices:
+        return distances, closest_points, triangle_indices
+    return distances, closest_points
+
+
+@numba.njit(parallel=True, cache=True)
+def _points_to_triangles(points, triangles):
+    n_points = len(points)
+    distances = np.empty(n_points)
+    closest_points = np.empty((n_points, 3))
+    triangle_indices = np.empty(n_points, dtype=np.int64)
+    for i in numba.prange(n_points):
+        best_distance = np.inf
+        best_index = -1
+        candidate = np.empty(3)
+        for j in range(len(triangles)):
+            distance = _closest_point_on_triangle(
+                points[i], triangles[j], candidate)
+            if distance < best_distance:
+                best_distance = distance
+                best_index = j
+                closest_points[i] = candidate
+        distances[i] = np.sqrt(best_distance)
+        triangle_indices[i] = best_index
+    return distances, closest_points, triangle_indices
+
+
+class TriangleBVH:
+    """Bounding volume hierarchy of a triangle soup.
+
+    The hierarchy of axis-aligned bounding boxes is used to find the closest
+    triangle of query points. Only triangles in boxes that are closer than
+    the closest triangle found so far will be checked with
+    point_to_triangle.
+
+    Parameters
+    ----------
+    triangles : array, shape (n_triangles, 3, 3)
+        Triangle soup. Each triangle consists of three points.
+
+    leaf_size : int, optional (default: 4)
+        Maximum number of triangles in a leaf.
+    """
+    def __init__(self, triangles, leaf_size=4):
+        triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+        if len(triangles) == 0:
+            raise ValueError("No triangles given.")
+        (self.triangle_indices, self.node_mins, self.node_maxs,
+         self.node_children, self.node_ranges) = _build_bvh(
+            triangles, leaf_size)
+        self.triangles = np.ascontiguousarray(
+            triangles[self.triangle_indices])
+
+    def query(self, points):
+        """Find closest points on the triangle soup.
+
+        Parameters
+        ----------
+        points : array, shape (n_points, 3)
+            Query points.
+
+        Returns
+        -------
+        distances : array, shape (n_points,)
+            Shortest distance of each point to the triangles.
+
+        closest_points : array, shape (n_points, 3)
+            Closest points on the triangles.
+
+        triangle_indices : array, shape (n_points,)
+            Indices of closest triangles.
+        """
+        points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 3)
+        distances, closest_points, sorted_indices = _query_bvh(
+            points, self.triangles, self.node_mins, self.node_maxs,
+            self.node_children, self.node_ranges)
+        return (distances, closest_points,
+                self.triangle_indices[sorted_indices])
+
+
+@numba.njit(cache=True)
+def _build_bvh(triangles, leaf_size):
+    """Build BVH with median splits along the largest extent of centroids."""
+    n_triangles = len(triangles)
+    centroids = np.empty((n_triangles, 3))
+    triangle_mins = np.empty((n_triangles, 3))
+    triangle_maxs = np.empty((n_triangles, 3))
+    for i in range(n_triangles):
+        for d in range(3):
+            centroids[i, d] = (triangles[i, 0, d] + triangles[i, 1, d]
+                               + triangles[i, 2, d]) / 3.0
+            triangle_mins[i, d] = min(triangles[i, 0, d], triangles[i, 1, d],
+                                      triangles[i, 2, d])
+            triangle_maxs[i, d] = max(triangles[i, 0, d], triangles[i, 1, d],
+                                      triangles[i, 2, d])
+
+    triangle_indices = np.arange(n_triangles)
+    max_nodes = 2 * n_triangles - 1
+    node_mins = np.empty((max_nodes, 3))
+    node_maxs = np.empty((max_nodes, 3))
+    node_children = -np.ones((max_nodes, 2), dtype=np.int64)
+    node_ranges = np.empty((max_nodes, 2), dtype=np.int64)
+    node_ranges[0, 0] = 0
+    node_ranges[0, 1] = n_triangles
+    n_nodes = 1
+
+    stack = np.empty(max_nodes, dtype=np.int64)
+    stack[0] = 0
+    stack_size = 1
+    while stack_size > 0:
+        stack_size -= 1
+        node = stack[stack_size]
+        start = node_ranges[node, 0]
+        end = node_ranges[node, 1]
+
+        centroid_min = np.full(3, np.inf)
+        centroid_max = np.full(3, -np.inf)
+        node_mins[node] = np.inf
+        node_maxs[node] = -np.inf
+        for i in triangle_indices[start:end]:
+            for d in range(3):
+                node_mins[node, d] = min(node_mins[node, d],
+                                         triangle_mins[i, d])
+                node_maxs[node, d] = max(node_maxs[node, d],
+                                         triangle_maxs[i, d])
+                centroid_min[d] = min(centroid_min[d], centroids[i, d])
+                centroid_max[d] = max(centroid_max[d], centroids[i, d])
+
+        if end - start <= leaf_size:
+            continue
+        axis = np.argmax(centroid_max - centroid_min)
+        if centroid_max[axis] == centroid_min[axis]:
+            continue
+
+        node_triangles = triangle_indices[start:end]
+        triangle_indices[start:end] = node_triangles[
+            np.argsort(centroids[node_triangles, axis])]
+        middle = (start + end) // 2
+        for child, child_start, child_end in (
+                (n_nodes, start, middle), (n_nodes + 1, middle, end)):
+            node_ranges[child, 0] = child_start
+            node_ranges[child, 1] = child_end
+            stack[stack_size] = child
+            stack_size += 1
+        node_children[node, 0] = n_nodes
+        node_children[node, 1] = n_nodes + 1
+        n_nodes += 2
+
+    return (triangle_indices, node_mins[:n_nodes], node_maxs[:n_nodes],
+            node_children[:n_nodes], node_ranges[:n_nodes])
+
+
+@numba.njit(parallel=True, cache=True)
+def _query_bvh(points, triangles, node_mins, node_maxs, node_children,
+               node_ranges):
+    """Find closest triangles of BVH for multiple points in parallel."""
+    n_points = len(points)
+    distances = np.empty(n_points)
+    closest_points = np.empty((n_points, 3))
+    triangle_indices = np.empty(n_points, dtype=np.int64)
+    for i in numba.prange(n_points):
+        stack = np.empty(len(node_mins), dtype=np.int64)
+        distances[i], triangle_indices[i] = _bvh_closest_triangle(
+            points[i], triangles, node_mins, node_maxs, node_children,
+            node_ranges, stack, closest_points[i])
+    return distances, closest_points, triangle_indices
+
+
+@numba.njit(cache=True)
+def _bvh_closest_triangle(point, triangles, node_mins, node_maxs,
+                          node_children, node_ranges, stack, closest_point):
+    """Branch and bound search for the closest triangle in a BVH."""
+    best_distance = np.inf
+    best_index = -1
+    candidate = np.empty(3)
+    stack[0] = 0
+    stack_size = 1
+    while stack_size > 0:
+        stack_size -= 1
+        node = stack[stack_size]
+        if _aabb_squared_distance(
+                point, node_mins[node], node_maxs[node]) >= best_distance:
+            continue
+
+        if node_children[node, 0] < 0:
+            for j in range(node_ranges[node, 0], node_ranges[node, 1]):
+                distance = _closest_point_on_triangle(
+                    point, triangles[j], candidate)
+                if distance < best_distance:
+                    best_distance = distance
+                    best_index = j
+                    closest_point[:] = candidate
+            continue
+
+        left = node_children[node, 0]
+        right = node_children[node, 1]
+        # the closer child is pushed last, so that it is visited first
+        if (_aabb_squared_distance(point, node_mins[left], node_maxs[left])
+                < _aabb_squared_distance(
+                    point, node_mins[right], node_maxs[right])):
+            left, right = right, left
+        stack[stack_size] = left
+        stack[stack_size + 1] = right
+        stack_size += 2
+    return np.sqrt(best_distance), best_index
+
+
+@numba.njit(cache=True)
+def _aabb_squared_distance(point, box_min, box_max):
+    """Squared distance between point and axis-aligned bounding box."""
+    squared_distance = 0.0
+    for d in range(3):
+        if point[d] < box_min[d]:
+            squared_distance += (box_min[d] - point[d]) ** 2
+        elif point[d] > box_max[d]:
+            squared_distance += (point[d] - box_max[d]) ** 2
+    return squared_distance
+
+
+@numba.njit(cache=True)
+def _closest_point_on_triangle(point, triangle_points, closest_point):
+    """Allocation-free version of point_to_triangle.
+
+    Parameters
+    ----------
+    point : array, shape (3,)
+        3D point.
+
+    triangle_points : array, shape (3, 3)
+        Each row contains a point of the triangle (A, B, C).
+
+    closest_point : array, shape (3,)
+        Output: closest point on triangle.
+
+    Returns
+    -------
+    squared_distance : float
+        The squared shortest distance between point and triangle.
+    """
+    a = triangle_points[0]
+    b = triangle_points[1]
+    c = triangle_points[2]
+    abx, aby, abz = b[0] - a[0], b[1] - a[1], b[2] - a[2]
+    acx, acy, acz = c[0] - a[0], c[1] - a[1], c[2] - a[2]
+
+    apx, apy, apz = point[0] - a[0], point[1] - a[1], point[2] - a[2]
+    d1 = abx * apx + aby * apy + abz * apz
+    d2 = acx * apx + acy * apy + acz * apz
+    d3 = d4 = d5 = d6 = 0.0
+    region = 0
+    if d1 <= 0.0 and d2 <= 0.0:
+        region = 1  # vertex region outside A
+    if region == 0:
+        bpx, bpy, bpz = point[0] - b[0], point[1] - b[1], point[2] - b[2]
+        d3 = abx * bpx + aby * bpy + abz * bpz
+        d4 = acx * bpx + acy * bpy + acz * bpz
+        if d3 >= 0.0 and d4 <= d3:
+            region = 2  # vertex region outside B
+    vc = d1 * d4 - d3 * d2
+    if region == 0 and vc <= 0.0 <= d1 and d3 <= 0.0:
+        region = 3  # edge region of AB
+    if region == 0:
+        cpx, cpy, cpz = point[0] - c[0], point[1] - c[1], point[2] - c[2]
+        d5 = abx * cpx + aby * cpy + abz * cpz
+        d6 = acx * cpx + acy * cpy + acz * cpz
+        if d6 >= 0.0 and d5 <= d6:
+            region = 4  # vertex region outside C
+    vb = d5 * d2 - d1 * d6
+    if region == 0 and vb <= 0.0 <= d2 and d6 <= 0.0:
+        region = 5  # edge region of AC
+    va = d3 * d6 - d5 * d4
+    if region == 0 and va <= 0.0 <= d4 - d3 and d5 - d6 >= 0.0:
+        region = 6  # edge region of BC
+
+    for d in range(3):
+        if region == 1:
+            closest_point[d] = a[d]
+        elif region == 2:
+            closest_point[d] = b[d]
+        elif region == 3:
+            closest_point[d] = a[d] + d1 / (d1 - d3) * (b[d] - a[d])
+        elif region == 4:
+            closest_point[d] = c[d]
+        elif region == 5:
+            closest_point[d] = a[d] + d2 / (d2 - d6) * (c[d] - a[d])
+        elif region == 6:
+            closest_point[d] = b[d] + (d4 - d3) / (
+                (d4 - d3) + (d5 - d6)) * (c[d] - b[d])
+        else:  # face region
+            denom = 1.0 / (va + vb + vc)
+            closest_point[d] = (a[d] + vb * denom * (b[d] - a[d])
+                                + vc * denom * (c[d] - a[d]))
+
+    squared_distance = 0.0
+    for d in range(3):
+        squared_distance += (point[d] - closest_point[d]) ** 2
+    return squared_distance
+
+
 @numba.njit(numba.types.Tuple(
     (numba.float64, numba.float64[:]))(numba.float64[:], numba.float64[:, :]),
     cache=True)
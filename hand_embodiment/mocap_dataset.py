@@ -1,4 +1,6 @@
 """Motion capture dataset and preprocessing tools."""
+import json
+import os
 import re
 import warnings
 import yaml
@@ -7,7 +9,282 @@ import pandas as pd
 from scipy.signal import medfilt
 
 
-def read_qualisys_tsv(filename, unit="m", verbose=0):
+QUALISYS_CACHE_VERSION = 1
+
+
+class QualisysRecording:
+    """Marker trajectories of a Qualisys recording.
+
+    Parameters
+    ----------
+    meta : dict
+        Meta data from the header of the file, e.g., 'FREQUENCY'.
+
+    events : list of tuple
+        Events from the header of the file: (name, type, frame, time).
+
+    marker_names : list of str
+        Names of markers.
+
+    frames : array, shape (n_frames,)
+        Frame indices.
+
+    time : array, shape (n_frames,)
+        Time of each frame in seconds.
+
+    positions : array, shape (n_frames, n_markers, 3)
+        Positions of markers. Missing markers are NaN.
+
+    unit : str
+        Unit of positions. Either meters 'm' or millimeters 'mm'.
+    """
+    def __init__(self, meta, events, marker_names, frames, time, positions,
+                 unit):
+        self.meta = meta
+        self.events = events
+        self.marker_names = marker_names
+        self.frames = frames
+        self.time = time
+        self.positions = positions
+        self.unit = unit
+
+    @property
+    def n_frames(self):
+        """Number of frames."""
+        return len(self.positions)
+
+    @property
+    def frequency(self):
+        """Frequency of the recording in Hz."""
+        return float(self.meta["FREQUENCY"])
+
+    def marker_positions(self, marker_name):
+        """Get trajectory of a marker.
+
+        Parameters
+        ----------
+        marker_name : str
+            Name of the marker.
+
+        Returns
+        -------
+        positions : array, shape (n_frames, 3)
+            Positions of the marker.
+        """
+        return self.positions[:, self.marker_names.index(marker_name)]
+
+    def to_dataframe(self):
+        """Convert to the format of read_qualisys_tsv.
+
+        Returns
+        -------
+        df : DataFrame
+            Columns 'Frame', 'Time', and '<marker> X', '<marker> Y',
+            '<marker> Z' for each marker.
+        """
+        columns = [f"{marker_name} {axis}" for marker_name in self.marker_names
+                   for axis in "XYZ"]
+        df = pd.DataFrame(
+            self.positions.reshape(self.n_frames, -1).astype(float),
+            columns=columns)
+        df.insert(0, "Time", self.time)
+        df.insert(0, "Frame", self.frames)
+        return df
+
+
+def load_qualisys_tsv(filename, unit="m", dtype=np.float64, use_cache=True,
+                      mmap_mode=None, verbose=0):
+    """Load marker trajectories from Qualisys tsv file into an array.
+
+    The header is parsed once and marker columns are loaded directly into
+    an array. A sidecar cache ('<filename>.cache.npz' and
+    '<filename>.cache.npy') will be written next to the file and used in
+    subsequent calls as long as size and modification time of the file do
+    not change. The positions are stored in millimeters as float64 in the
+    memory-mappable file '<filename>.cache.npy' and converted to dtype.
+
+    Parameters
+    ----------
+    filename : str
+        Source file
+
+    unit : str, optional (default: 'm')
+        Unit to measure positions. Either meters 'm' or millimeters 'mm'.
+
+    dtype : type, optional (default: np.float64)
+        Type of positions, e.g., np.float32 or np.float64.
+
+    use_cache : bool, optional (default: True)
+        Read and write the cache.
+
+    mmap_mode : str, optional (default: None)
+        Memory-map positions from the cache with this mode, e.g., 'r'.
+        Requires use_cache=True, unit='mm', and dtype=np.float64, otherwise
+        positions will be loaded into memory.
+
+    verbose : int, optional (default: 0)
+        Verbosity level
+
+    Returns
+    -------
+    recording : QualisysRecording
+        Marker trajectories
+
+    Raises
+    ------
+    ValueError
+        If columns of the file are not 'Frame', 'Time', and three columns
+        per marker.
+    """
+    if unit not in ["m", "mm"]:
+        raise ValueError(f"Unknown unit: '{unit}'")
+    recording = None
+    if use_cache:
+        recording = _load_qualisys_cache(filename, dtype, mmap_mode)
+        if verbose >= 1 and recording is not None:
+            print(f"[load_qualisys_tsv] Loaded cache of '{filename}'")
+    if recording is None:
+        # the cache always stores float64 so that it can be reused for any
+        # dtype without loss of precision
+        recording = _parse_qualisys_tsv(
+            filename, np.float64 if use_cache else dtype)
+        if use_cache:
+            _write_qualisys_cache(filename, recording)
+            if mmap_mode is not None:
+                recording = _load_qualisys_cache(
+                    filename, dtype, mmap_mode) or recording
+            recording.positions = recording.positions.astype(
+                dtype, copy=False)
+    if unit == "m":
+        recording.positions = recording.positions * recording.positions.dtype.type(0.001)
+        recording.unit = "m"
+
+    if verbose >= 1:
+        print("[load_qualisys_tsv] Meta data:")
+        print("  " + str(recording.meta))
+        print("[load_qualisys_tsv] Events:")
+        print("  " + str(recording.events))
+        print("[load_qualisys_tsv] Available markers:")
+        print("  " + (", ".join(recording.marker_names)))
+        print("[load_qualisys_tsv] Time delta: %g"
+              % (1.0 / recording.frequency))
+
+    return recording
+
+
+def _parse_qualisys_header(filename):
+    """Parse header of Qualisys tsv file in a single pass.
+
+    Returns
+    -------
+    meta : dict
+        Meta data.
+
+    events : list of tuple
+        Events.
+
+    columns : list of str
+        Names of data columns.
+
+    n_header_lines : int
+        Number of lines before the data, including the line with columns.
+    """
+    meta = {}
+    events = []
+    with open(filename, "r") as f:
+        for i, line in enumerate(f):
+            fields = line.rstrip("\r\n").split("\t")
+            if fields[0] == "Frame":
+                columns = [c for c in fields if c != ""]
+                return meta, events, columns, i + 1
+            elif fields[0] == "EVENT":
+                events.append(tuple(fields[1:]))
+            elif len(fields) == 2:
+                meta[fields[0]] = fields[1]
+            else:
+                meta[fields[0]] = fields[1:]
+    raise ValueError(f"No data columns in '{filename}'")
+
+
+def _parse_qualisys_tsv(filename, dtype):
+    """Parse Qualisys tsv file, positions will be in millimeters."""
+    meta, events, columns, n_header_lines = _parse_qualisys_header(filename)
+    if columns[:2] != ["Frame", "Time"] or (len(columns) - 2) % 3 != 0:
+        raise ValueError(f"Unexpected columns in '{filename}'")
+    marker_names = [c[:-2] for c in columns[2::3]]
+    for i, marker_name in enumerate(marker_names):
+        if columns[2 + 3 * i:5 + 3 * i] != [
+                f"{marker_name} {axis}" for axis in "XYZ"]:
+            raise ValueError(
+                f"Unexpected columns of marker '{marker_name}' in "
+                f"'{filename}'")
+
+    data = pd.read_csv(
+        filename, sep="\t", header=None, skiprows=n_header_lines,
+        usecols=range(len(columns)), na_values=["null"], dtype=np.float64,
+        engine="c").to_numpy()
+    frames = data[:, 0].astype(np.int64)
+    time = data[:, 1].copy()
+    positions = data[:, 2:].astype(dtype).reshape(
+        len(data), len(marker_names), 3)
+    return QualisysRecording(
+        meta, events, marker_names, frames, time, positions, "mm")
+
+
+def _qualisys_cache_filenames(filename):
+    return filename + ".cache.npz", filename + ".cache.npy"
+
+
+def _qualisys_cache_key(filename):
+    stat = os.stat(filename)
+    return np.array([QUALISYS_CACHE_VERSION, stat.st_size, stat.st_mtime_ns],
+                    dtype=np.int64)
+
+
+def _load_qualisys_cache(filename, dtype, mmap_mode=None):
+    """Load cache if it is valid, otherwise return None."""
+    meta_filename, positions_filename = _qualisys_cache_filenames(filename)
+    if not (os.path.exists(meta_filename)
+            and os.path.exists(positions_filename)):
+        return None
+    try:
+        with np.load(meta_filename) as cache:
+            if not np.array_equal(cache["key"], _qualisys_cache_key(filename)):
+                return None
+            header = json.loads(str(cache["header"]))
+            frames = cache["frames"]
+            time = cache["time"]
+        positions = np.load(positions_filename, mmap_mode=mmap_mode)
+    except (OSError, ValueError, KeyError):
+        return None
+    if positions.dtype != np.float64:
+        return None
+    return QualisysRecording(
+        header["meta"], [tuple(e) for e in header["events"]],
+        header["marker_names"], frames, time,
+        positions.astype(dtype, copy=False), "mm")
+
+
+def _write_qualisys_cache(filename, recording):
+    """Write cache next to the source file if possible."""
+    meta_filename, positions_filename = _qualisys_cache_filenames(filename)
+    header = json.dumps({"meta": recording.meta, "events": recording.events,
+                         "marker_names": recording.marker_names})
+    try:
+        # the meta file contains the key and is written last, so that an
+        # interrupted process cannot leave a cache that looks valid
+        with open(positions_filename + ".tmp", "wb") as f:
+            np.save(f, recording.positions.astype(np.float64, copy=False))
+        os.replace(positions_filename + ".tmp", positions_filename)
+        with open(meta_filename + ".tmp", "wb") as f:
+            np.savez(f, key=_qualisys_cache_key(filename), header=header,
+                     frames=recording.frames, time=recording.time)
+        os.replace(meta_filename + ".tmp", meta_filename)
+    except OSError as e:
+        warnings.warn(f"Could not write cache of '{filename}': {e}")
+
+
+def read_qualisys_tsv(filename, unit="m", verbose=0, use_cache=True):
     """Reads motion capturing data from tsv into pandas data frame.
 
     Parameters
@@ -21,11 +298,22 @@ def read_qualisys_tsv(filename, unit="m", verbose=0):
     verbose : int, optional (default: 0)
         Verbosity level
 
+    use_cache : bool, optional (default: True)
+        Use cache of load_qualisys_tsv if the file contains only marker
+        positions.
+
     Returns
     -------
     df : DataFrame
         Raw data streams from source file
     """
+    try:
+        return load_qualisys_tsv(
+            filename, unit=unit, use_cache=use_cache,
+            verbose=verbose).to_dataframe()
+    except ValueError:  # unknown file structure
+        pass
+
     n_kv, n_meta = _header_sizes(filename)
     meta = pd.read_csv(
         filename, sep="\t", names=["Key", "Value"], header=None, nrows=7)
@@ -226,6 +514,190 @@ def interpolate_nan(X):
         return X
 
 
+class MarkerStore:
+    """Marker trajectories in a single, possibly memory-mapped array.
+
+    Scaling, conversion of zeros to NaN, and selection of frames are applied
+    lazily when markers are accessed, so that the source array will not be
+    modified or loaded into memory.
+
+    Parameters
+    ----------
+    positions : array, shape (n_frames, n_markers, 3)
+        Raw positions of markers, e.g., a memory-mapped array.
+
+    marker_names : list of str
+        Names of markers.
+
+    scale : float, optional (default: 1.0)
+        Scaling factor for positions.
+
+    frames : range, optional (default: all frames)
+        Indices of selected frames.
+    """
+    def __init__(self, positions, marker_names, scale=1.0, frames=None):
+        self.positions = positions
+        self.marker_names = marker_names
+        self.scale = scale
+        if frames is None:
+            frames = range(len(positions))
+        self.frames = frames
+
+    def __len__(self):
+        return len(self.frames)
+
+    def select_frames(self, start_idx=None, end_idx=None, skip_frames=1):
+        """Select frames.
+
+        Parameters
+        ----------
+        start_idx : int, optional (default: None)
+            Index of the first selected frame.
+
+        end_idx : int, optional (default: None)
+            Index of the last selected frame.
+
+        skip_frames : int, optional (default: 1)
+            Step size.
+        """
+        self.frames = self.frames[start_idx:end_idx][::skip_frames]
+
+    def marker_indices(self, marker_names):
+        """Get indices of markers.
+
+        Parameters
+        ----------
+        marker_names : list of str
+            Names of markers.
+
+        Returns
+        -------
+        marker_indices : list of int
+            Indices of markers.
+
+        Raises
+        ------
+        ValueError
+            If a marker is missing.
+        """
+        return [self.marker_names.index(mn) for mn in marker_names]
+
+    def view(self, marker_names, squeeze=False):
+        """Get trajectories of a group of markers.
+
+        Parameters
+        ----------
+        marker_names : list of str
+            Names of markers.
+
+        squeeze : bool, optional (default: False)
+            Remove the marker dimension. Only possible for a single marker.
+
+        Returns
+        -------
+        view : MarkerTrajectoryView
+            Trajectories of the markers.
+        """
+        return MarkerTrajectoryView(
+            self, self.marker_indices(marker_names), squeeze)
+
+    def read(self, frame_key, marker_indices):
+        """Read positions of markers.
+
+        Parameters
+        ----------
+        frame_key : int, slice, or array-like
+            Frames relative to the selected frames.
+
+        marker_indices : list of int
+            Indices of markers.
+
+        Returns
+        -------
+        positions : array, shape (..., len(marker_indices), 3)
+            Scaled positions, missing markers are NaN.
+        """
+        if isinstance(frame_key, (int, np.integer, slice)):
+            frames = self.frames[frame_key]
+            if isinstance(frames, range):
+                frames = slice(frames.start, frames.stop, frames.step)
+        else:
+            frames = np.asarray(self.frames)[frame_key]
+        positions = self.positions[frames][..., marker_indices, :]
+        positions = positions * positions.dtype.type(self.scale)
+        positions[positions == 0.0] = np.nan
+        return positions
+
+    def materialize(self, marker_names=None):
+        """Load selected frames into memory.
+
+        Parameters
+        ----------
+        marker_names : list of str, optional (default: all markers)
+            Names of markers that should be loaded. Unknown markers will be
+            ignored.
+
+        Returns
+        -------
+        store : MarkerStore
+            Store with positions in memory, scaled, and with NaNs.
+        """
+        if marker_names is None:
+            marker_names = self.marker_names
+        marker_names = [mn for mn in marker_names if mn in self.marker_names]
+        return MarkerStore(
+            self.read(slice(None), self.marker_indices(marker_names)),
+            marker_names)
+
+
+class MarkerTrajectoryView:
+    """Lazy view of trajectories of a group of markers from a MarkerStore.
+
+    Indexing returns arrays. np.asarray(view) loads the whole trajectory.
+
+    Parameters
+    ----------
+    store : MarkerStore
+        Source of data.
+
+    marker_indices : list of int
+        Indices of markers in the store.
+
+    squeeze : bool
+        Remove the marker dimension.
+    """
+    def __init__(self, store, marker_indices, squeeze):
+        self.store = store
+        self.marker_indices = marker_indices
+        self.squeeze = squeeze
+
+    def __len__(self):
+        return len(self.store)
+
+    @property
+    def shape(self):
+        if self.squeeze:
+            return len(self.store), 3
+        return len(self.store), len(self.marker_indices), 3
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            frame_key, other_keys = key[0], key[1:]
+            if not isinstance(frame_key, (int, np.integer)):
+                other_keys = (slice(None),) + other_keys
+            return self[frame_key][other_keys]
+        positions = self.store.read(key, self.marker_indices)
+        if self.squeeze:
+            positions = positions[..., 0, :]
+        return positions
+
+    def __array__(self, dtype=None, copy=None):
+        positions = self[:]
+        if dtype is not None:
+            positions = positions.astype(dtype)
+        return positions
+
+
 class MotionCaptureDatasetBase:
     """Base class of motion capture datasets.
 
@@ -293,12 +765,13 @@ class MotionCaptureDatasetBase:
                 else:
                     warnings.warn(f"Missing marker: '{marker}'.")
 
-    def _scale(self, trajectory):
+    def _scale(self, trajectory, inplace=False):
         data_columns = list(trajectory.columns)
         data_columns.remove("Time")
-        new_trajectory = trajectory.copy()
-        new_trajectory[data_columns] *= self.config["scale"]
-        return new_trajectory
+        if not inplace:
+            trajectory = trajectory.copy()
+        trajectory[data_columns] *= self.config["scale"]
+        return trajectory
 
     def _hand_trajectories(self, hand_marker_names, trajectory):
         hand_trajectories = []
@@ -343,11 +816,35 @@ class MotionCaptureDatasetBase:
             additional_trajectories.append(additional_trajectory)
         self.additional_trajectories = additional_trajectories
 
+    def _store_trajectories(self, store):
+        for marker_name in self._finger_marker_names():
+            if marker_name not in store.marker_names:
+                raise Exception(f"Missing marker: '{marker_name}'.")
+        self.hand_trajectories = [
+            store.view([marker_name], squeeze=True)
+            for marker_name in self.config["hand_marker_names"]]
+        self.finger_trajectories = {
+            finger_name: store.view(
+                self.config["finger_marker_names"][finger_name])
+            for finger_name in self.finger_names}
+        self.additional_trajectories = []
+        for marker_name in self.config.get("additional_markers", ()):
+            if marker_name not in store.marker_names:
+                warnings.warn(
+                    f"Could not find additional marker '{marker_name}'.")
+                continue
+            self.additional_trajectories.append(
+                store.view([marker_name], squeeze=True))
+
+    def _finger_marker_names(self):
+        return [mn for fn in self.finger_names
+                for mn in self.config["finger_marker_names"][fn]]
+
     def _convert_zeros_to_nans(self, hand_trajectory, marker_names):
         column_names = match_columns(
             hand_trajectory, marker_names, keep_time=False)
-        for column_name in column_names:
-            hand_trajectory[column_name].replace(0.0, np.nan, inplace=True)
+        hand_trajectory[column_names] = hand_trajectory[column_names].replace(
+            0.0, np.nan)
         return hand_trajectory
 
     def get_hand_markers(self, t):
@@ -410,15 +907,28 @@ class HandMotionCaptureDataset(MotionCaptureDatasetBase):
 
     interpolate_missing_markers : bool, optional (default: False)
         Interpolate unknown marker positions (indicated by nan).
+
+    memory_map : bool, optional (default: False)
+        Memory-map marker positions from the cache of load_qualisys_tsv.
+        Trajectories will be views of a MarkerStore that are scaled and
+        converted lazily. Marker positions are loaded into memory only if
+        missing markers have to be interpolated.
     """
     def __init__(self, filename, mocap_config=None, skip_frames=1,
                  start_idx=None, end_idx=None,
-                 interpolate_missing_markers=False, **kwargs):
+                 interpolate_missing_markers=False, memory_map=False,
+                 **kwargs):
         super(HandMotionCaptureDataset, self).__init__(mocap_config, **kwargs)
 
+        if memory_map:
+            self._load_marker_store(
+                filename, skip_frames, start_idx, end_idx,
+                interpolate_missing_markers)
+            return
+
         trajectory = read_qualisys_tsv(filename=filename)
-        trajectory = self._scale(trajectory)
         trajectory = extract_markers(trajectory, self.marker_names).copy()
+        trajectory = self._scale(trajectory, inplace=True)
         trajectory = self._convert_zeros_to_nans(trajectory, self.marker_names)
         if interpolate_missing_markers:
             trajectory = interpolate_nan(trajectory)
@@ -436,6 +946,23 @@ class HandMotionCaptureDataset(MotionCaptureDatasetBase):
         self._additional_trajectories(
             self.config.get("additional_markers", ()), trajectory)
 
+    def _load_marker_store(self, filename, skip_frames, start_idx, end_idx,
+                           interpolate_missing_markers):
+        recording = load_qualisys_tsv(filename, unit="mm", mmap_mode="r")
+        store = MarkerStore(recording.positions, recording.marker_names,
+                            scale=0.001 * self.config["scale"])
+        if interpolate_missing_markers:
+            store = store.materialize(self.marker_names)
+            n_frames = len(store)
+            trajectory = pd.DataFrame(store.positions.reshape(n_frames, -1))
+            trajectory = median_filter(interpolate_nan(trajectory), 3)
+            store.positions = trajectory.to_numpy().reshape(n_frames, -1, 3)
+        store.select_frames(start_idx, end_idx, skip_frames)
+
+        self.marker_store = store
+        self.n_steps = len(store)
+        self._store_trajectories(store)
+
 
 class SegmentedHandMotionCaptureDataset(MotionCaptureDatasetBase):
     """Segmented hand motion capture dataset.
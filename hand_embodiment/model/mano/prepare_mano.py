@@ -40,3 +40,11 @@ if __name__ == '__main__':
 
     prepare_mano_json(OFFICIAL_MANO_LEFT_PATH, HAND_MESH_MODEL_LEFT_PATH_JSON)
     prepare_mano_json(OFFICIAL_MANO_RIGHT_PATH, HAND_MESH_MODEL_RIGHT_PATH_JSON)
+
+    # binary cache for faster loading, otherwise created on first use
+    try:
+        from hand_embodiment.mano import write_model_cache
+        write_model_cache(HAND_MESH_MODEL_LEFT_PATH_JSON)
+        write_model_cache(HAND_MESH_MODEL_RIGHT_PATH_JSON)
+    except ImportError:
+        pass
@@ -1,5 +1,7 @@
 """Pipelines are high-level interfaces that map human data to robotic hands."""
+import numpy as np
 import pytransform3d.transformations as pt
+import tqdm
 import yaml
 
 from hand_embodiment.target_configurations import TARGET_CONFIG
@@ -33,10 +35,15 @@ class MoCapToRobot:
 
     robot_config : str, optional (default: None)
         Target system configuration.
+
+    headless : bool, optional (default: False)
+        Only compute what is required for the conversion: the MANO hand
+        state has no Open3D objects and the target system has no visual
+        model. Artists cannot be created in this mode.
     """
     def __init__(self, hand, mano_config, use_fingers,
                  record_mapping_config=None, verbose=0, measure_time=False,
-                 robot_config=None):
+                 robot_config=None, headless=False):
         self.hand_config_ = self._hand_config(hand, robot_config)
         mano2hand_markers, betas = load_mano_config(mano_config)
 
@@ -49,13 +56,14 @@ class MoCapToRobot:
             shape_parameters=betas,
             record_mapping_config=record_mapping_config,
             use_fingers=use_fingers, verbose=verbose,
-            measure_time=measure_time)
+            measure_time=measure_time, headless=headless)
         self.embodiment_mapping_ = HandEmbodiment(
             self.record_mapping_.hand_state_, self.hand_config_,
             use_fingers=use_fingers,
             mano_finger_kinematics=self.record_mapping_.mano_finger_kinematics_,
             initial_handbase2world=self.record_mapping_.mano2world_,
-            verbose=verbose, measure_time=measure_time)
+            verbose=verbose, measure_time=measure_time, headless=headless)
+        self.headless = headless
 
     def _hand_config(self, hand, robot_config):
         hand_config_ = TARGET_CONFIG[hand]
@@ -75,8 +83,9 @@ class MoCapToRobot:
         return self.embodiment_mapping_.transform_manager_
 
     def reset(self):
-        """Reset record mapping."""
+        """Reset record mapping and embodiment mapping."""
         self.record_mapping_.reset()
+        self.embodiment_mapping_.reset()
 
     def set_constant_joint(self, joint_name, angle):
         """Set constant joint angle of target hand.
@@ -157,6 +166,83 @@ class MoCapToRobot:
         self.estimate_hand(hand_markers, finger_markers)
         return self.estimate_robot(mocap_origin2origin)
 
+    def estimate_trajectory(self, hand_markers, finger_markers,
+                            mocap_origin2origin=None, progress_bar=False):
+        """Estimate states of target system from MoCap marker trajectories.
+
+        Hand poses are estimated and finger markers are transformed to the
+        MANO base frame for the whole trajectory at once. Only the inverse
+        kinematics of the fingers is solved step by step. The MANO mesh is
+        updated once for the last step.
+
+        Parameters
+        ----------
+        hand_markers : list of array, shape (n_steps, 3)
+            Trajectories of markers on hand in order 'hand_top', 'hand_left',
+            'hand_right'.
+
+        finger_markers : dict (str to array, shape (n_steps, n_markers, 3))
+            Trajectories of markers on fingers.
+
+        mocap_origin2origin : array, shape (4, 4) or (n_steps, 4, 4), optional (default: None)
+            Transform that will be applied to end-effector poses.
+
+        progress_bar : bool, optional (default: False)
+            Show progress bar.
+
+        Returns
+        -------
+        ee_poses : array, shape (n_steps, 4, 4)
+            Poses of the end effector.
+
+        joint_angles : dict (str to array, shape (n_steps, n_joints))
+            Maps finger names to corresponding joint angles in the order that
+            is given in the target configuration.
+        """
+        assert len(hand_markers) == 3, hand_markers
+        n_steps = len(hand_markers[0])
+
+        mano2world = self.record_mapping_.estimate_mano2world_trajectory(
+            hand_markers)
+        world2mano_rotations = np.transpose(mano2world[:, :3, :3], (0, 2, 1))
+        world2mano_translations = -np.einsum(
+            "nij,nj->ni", world2mano_rotations, mano2world[:, :3, 3])
+        markers_in_mano = {}
+        for finger_name in self.record_mapping_.finger_names_.intersection(
+                finger_markers.keys()):
+            markers_in_world = np.asarray(finger_markers[finger_name])
+            markers_in_world = markers_in_world.reshape(n_steps, -1, 3)
+            markers_in_mano[finger_name] = np.einsum(
+                "nij,nmj->nmi", world2mano_rotations, markers_in_world
+            ) + world2mano_translations[:, np.newaxis]
+
+        joint_angles = {
+            finger_name: np.empty((n_steps, len(angles)))
+            for finger_name, angles
+            in self.embodiment_mapping_.joint_angles.items()}
+        steps = range(n_steps)
+        if progress_bar:
+            steps = tqdm.tqdm(steps)
+        for t in steps:
+            self.record_mapping_.estimate_finger_poses(
+                {finger_name: markers[t]
+                 for finger_name, markers in markers_in_mano.items()},
+                mano2world[t])
+            joint_angles_t = self.embodiment_mapping_.solve(
+                mano2world[t], use_cached_forward_kinematics=True)
+            for finger_name in joint_angles:
+                joint_angles[finger_name][t] = joint_angles_t[finger_name]
+        if n_steps > 0:
+            self.record_mapping_.hand_state_.recompute_mesh(
+                mano2world[-1], lazy=self.record_mapping_.defer_mesh_update)
+
+        robotbase2handbase = pt.invert_transform(
+            self.hand_config_["handbase2robotbase"], check=False)
+        ee_poses = np.matmul(mano2world, robotbase2handbase)
+        if mocap_origin2origin is not None:
+            ee_poses = np.matmul(mocap_origin2origin, ee_poses)
+        return ee_poses, joint_angles
+
     def make_hand_artist(self, show_expected_markers=False):
         """Create artist that visualizes internal state of the hand.
 
@@ -182,7 +268,15 @@ class MoCapToRobot:
         -------
         graph : pytransform3d.visualizer.Graph
             Representation of the robotic hand.
+
+        Raises
+        ------
+        RuntimeError
+            In headless mode.
         """
+        if self.headless:
+            raise RuntimeError(
+                "Robot artist is not available in headless mode.")
         from pytransform3d import visualizer as pv
         return pv.Graph(
             self.transform_manager_, "world", show_frames=True,
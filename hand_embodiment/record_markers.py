@@ -2,12 +2,16 @@
 
 Estimates MANO states from marker positions.
 """
+import math
 import warnings
 
+import numba
 import numpy as np
 from pytransform3d import transformations as pt, rotations as pr
 from scipy.optimize import minimize
-from .mano import HandState, hand_vertices, apply_shape_parameters
+from .mano import (
+    HandState, HandVerticesWorkspace, apply_shape_parameters,
+    compile_kintree)
 from .timing import TimeableMixin
 
 
@@ -108,14 +112,16 @@ MANO_CONFIG = {
 }
 
 
-def make_finger_kinematics(hand_state, finger_name, mano_config=MANO_CONFIG):
+def make_finger_kinematics(hand_state, finger_name, mano_config=MANO_CONFIG,
+                           solver="slsqp"):
     return ManoFingerKinematics(
         hand_state,
         mano_config["pose_parameters_per_finger"][finger_name],
         mano_config["vertex_indices_per_finger"][finger_name],
         mano_config["joint_indices_per_finger"][finger_name],
         mano_config["action_weights_per_finger"][finger_name],
-        mano_config["tip_vertex_offsets_per_finger"][finger_name])
+        mano_config["tip_vertex_offsets_per_finger"][finger_name],
+        solver=solver)
 
 
 class MarkerBasedRecordMapping(TimeableMixin):
@@ -151,6 +157,18 @@ class MarkerBasedRecordMapping(TimeableMixin):
     measure_time : bool
         Measure computation time for each frame.
 
+    solver : str, optional (default: 'slsqp')
+        Solver for the inverse kinematics of the fingers: 'slsqp' or 'lm'.
+        See ManoFingerKinematics.
+
+    defer_mesh_update : bool, optional (default: True)
+        Skin the full MANO mesh only when vertices of hand_state_ are
+        accessed, not after each estimate.
+
+    headless : bool, optional (default: False)
+        Create the hand state without Open3D objects. Only used if no
+        hand_state is given.
+
     Attributes
     ----------
     finger_names_ : set of str
@@ -174,12 +192,14 @@ class MarkerBasedRecordMapping(TimeableMixin):
             self, left=False, mano2hand_markers=None, shape_parameters=None,
             hand_state=None, record_mapping_config=None,
             use_fingers=("thumb", "index", "middle", "ring", "little"),
-            verbose=0, measure_time=False):
+            verbose=0, measure_time=False, solver="slsqp",
+            defer_mesh_update=True, headless=False):
         super(MarkerBasedRecordMapping, self).__init__(verbose or measure_time)
         self.finger_names_ = set(use_fingers)
+        self.defer_mesh_update = defer_mesh_update
 
         if hand_state is None:
-            self.hand_state_ = HandState(left=left)
+            self.hand_state_ = HandState(left=left, headless=headless)
             if shape_parameters is not None:
                 self.hand_state_.betas[:] = shape_parameters
                 self.hand_state_.pose_parameters["J"], \
@@ -196,7 +216,7 @@ class MarkerBasedRecordMapping(TimeableMixin):
 
         self.mano_finger_kinematics_ = {
             finger_name: make_finger_kinematics(
-                self.hand_state_, finger_name, record_mapping_config)
+                self.hand_state_, finger_name, record_mapping_config, solver)
             for finger_name in self.finger_names_
         }
 
@@ -205,15 +225,18 @@ class MarkerBasedRecordMapping(TimeableMixin):
         else:
             self.mano2hand_markers_ = mano2hand_markers
         self.current_hand_markers2world = np.eye(4)
-        self.mano2world_ = pt.concat(
-            self.mano2hand_markers_, self.current_hand_markers2world)
+        self.mano2world_ = compute_mano2world(
+            self.current_hand_markers2world, self.mano2hand_markers_)
         self.markers_in_mano = {
             finger_name: None for finger_name in self.mano_finger_kinematics_}
 
     def reset(self):
-        """Reset current joint poses of MANO."""
+        """Reset current joint poses of MANO and hand pose."""
         for finger_name in self.mano_finger_kinematics_:
             self.mano_finger_kinematics_[finger_name].reset()
+        self.current_hand_markers2world = np.eye(4)
+        self.mano2world_ = compute_mano2world(
+            self.current_hand_markers2world, self.mano2hand_markers_)
 
     def estimate(self, hand_markers, finger_markers):
         """Estimate hand state from positions of hand markers and finger markers.
@@ -226,15 +249,16 @@ class MarkerBasedRecordMapping(TimeableMixin):
         finger_markers : dict (str to array-like)
             Positions of markers on fingers.
         """
-        current_hand_markers2world = estimate_hand_pose(*hand_markers)
-        if np.any(np.isnan(current_hand_markers2world)):
+        current_hand_markers2world, valid = estimate_hand_pose(
+            *hand_markers, return_valid=True)
+        if valid:
+            self.current_hand_markers2world = current_hand_markers2world
+        else:
             warnings.warn(
                 "[MarkerBasedRecordMapping] Cannot estimate hand pose. "
                 "Detected NaN.")
-        else:
-            self.current_hand_markers2world = current_hand_markers2world
-        self.mano2world_ = pt.concat(
-            self.mano2hand_markers_, self.current_hand_markers2world)
+        self.mano2world_ = compute_mano2world(
+            self.current_hand_markers2world, self.mano2hand_markers_)
 
         available_fingers = self.finger_names_.intersection(
             finger_markers.keys())
@@ -245,6 +269,74 @@ class MarkerBasedRecordMapping(TimeableMixin):
             self.markers_in_mano[finger_name] = np.dot(
                 pt.vectors_to_points(markers_in_world), world2mano.T)[:, :3]
 
+        self._estimate_finger_poses(available_fingers)
+
+        self.hand_state_.recompute_mesh(
+            self.mano2world_, lazy=self.defer_mesh_update)
+
+    def estimate_mano2world_trajectory(self, hand_markers, return_valid=False):
+        """Estimate MANO base poses from a trajectory of hand markers.
+
+        Frames in which the hand pose cannot be estimated because of NaNs
+        keep the previous hand pose, like in estimate. The last hand pose
+        becomes the current hand pose.
+
+        Parameters
+        ----------
+        hand_markers : list of array, shape (n_steps, 3)
+            Trajectories of markers on hand in order 'hand_top', 'hand_left',
+            'hand_right'.
+
+        return_valid : bool, optional (default: False)
+            Return mask of frames in which the hand pose could be estimated.
+
+        Returns
+        -------
+        mano2world : array, shape (n_steps, 4, 4)
+            MANO base poses in world frame.
+
+        valid : array, shape (n_steps,), optional
+            Frames in which the hand pose could be estimated.
+        """
+        hand_markers2world, valid = estimate_hand_pose(
+            *hand_markers, return_valid=True)
+        if not np.all(valid):
+            warnings.warn(
+                f"[MarkerBasedRecordMapping] Cannot estimate hand pose in "
+                f"{np.count_nonzero(~valid)} frames. Detected NaN.")
+            hand_markers2world = hold_last_valid_pose(
+                hand_markers2world, valid, self.current_hand_markers2world)
+        if len(hand_markers2world) > 0:
+            self.current_hand_markers2world = hand_markers2world[-1]
+        mano2world = compute_mano2world(
+            hand_markers2world, self.mano2hand_markers_)
+        if return_valid:
+            return mano2world, valid
+        return mano2world
+
+    def estimate_finger_poses(self, markers_in_mano, mano2world):
+        """Estimate finger configurations from markers in MANO base frame.
+
+        In contrast to estimate, the MANO base pose has to be known and the
+        mesh will not be updated. This is useful to process trajectories.
+
+        Parameters
+        ----------
+        markers_in_mano : dict (str to array-like)
+            Positions of markers on fingers in MANO base frame.
+
+        mano2world : array-like, shape (4, 4)
+            MANO base pose in world frame.
+        """
+        self.mano2world_ = mano2world
+        available_fingers = self.finger_names_.intersection(
+            markers_in_mano.keys())
+        for finger_name in available_fingers:
+            self.markers_in_mano[finger_name] = markers_in_mano[finger_name]
+        self._estimate_finger_poses(available_fingers)
+
+    def _estimate_finger_poses(self, available_fingers):
+        """Inverse kinematics of fingers from markers in MANO base frame."""
         self.start_measurement()
 
         for finger_name in available_fingers:
@@ -271,10 +363,8 @@ class MarkerBasedRecordMapping(TimeableMixin):
             print(f"[{type(self).__name__}] Time for optimization: "
                   f"{self.last_timing():.4f} s")
 
-        self.hand_state_.recompute_mesh(self.mano2world_)
-
 
-def estimate_hand_pose(hand_top, hand_left, hand_right):
+def estimate_hand_pose(hand_top, hand_left, hand_right, return_valid=False):
     """Estimate pose of the hand from markers on the back of the hand.
 
     To estimate the pose of the MANO frame in world frame, we first derive
@@ -286,32 +376,102 @@ def estimate_hand_pose(hand_top, hand_left, hand_right):
     markers). The origin of the hand frame can be any point in the plane of
     the three markers. We choose the right marker.
 
+    All arguments can also be trajectories of marker positions, in which
+    case a trajectory of poses will be computed.
+
     Parameters
     ----------
-    hand_top : array, shape (3,)
+    hand_top : array, shape (3,) or (n_steps, 3)
         Position of hand_top marker.
 
-    hand_left : array, shape (3,)
+    hand_left : array, shape (3,) or (n_steps, 3)
         Position of hand_left marker.
 
-    hand_right : array, shape (3,)
+    hand_right : array, shape (3,) or (n_steps, 3)
         Position of hand_right marker.
 
+    return_valid : bool, optional (default: False)
+        Return mask of valid poses, i.e., poses without NaN.
+
     Returns
     -------
-    hand_markers2world : array, shape (4, 4)
+    hand_markers2world : array, shape (4, 4) or (n_steps, 4, 4)
         Pose of hand marker frame.
+
+    valid : bool or array, shape (n_steps,), optional
+        Poses that could be estimated, i.e., no marker is NaN.
     """
+    hand_top = np.asarray(hand_top)
+    hand_left = np.asarray(hand_left)
+    hand_right = np.asarray(hand_right)
     right2left = hand_left - hand_right
-    approach = pr.norm_vector(hand_top - hand_right)
-    orientation = pr.norm_vector(np.cross(approach, right2left))
+    approach = _norm_vectors(hand_top - hand_right)
+    orientation = _norm_vectors(np.cross(approach, right2left))
     normal = np.cross(orientation, approach)
-    hand_pose = np.eye(4)
-    hand_pose[:3, :3] = np.column_stack((normal, orientation, approach))
-    hand_pose[:3, 3] = hand_right
+    hand_pose = np.zeros(hand_right.shape[:-1] + (4, 4))
+    hand_pose[..., :3, 0] = normal
+    hand_pose[..., :3, 1] = orientation
+    hand_pose[..., :3, 2] = approach
+    hand_pose[..., :3, 3] = hand_right
+    hand_pose[..., 3, 3] = 1.0
+    if return_valid:
+        valid = np.logical_not(np.any(np.isnan(hand_pose), axis=(-2, -1)))
+        return hand_pose, valid
     return hand_pose
 
 
+def compute_mano2world(hand_markers2world, mano2hand_markers):
+    """Compute pose of MANO base frame from pose of hand marker frame.
+
+    Parameters
+    ----------
+    hand_markers2world : array, shape (4, 4) or (n_steps, 4, 4)
+        Pose of hand marker frame.
+
+    mano2hand_markers : array, shape (4, 4)
+        Transformation from MANO base frame to marker base frame.
+
+    Returns
+    -------
+    mano2world : array, shape (4, 4) or (n_steps, 4, 4)
+        MANO base pose in world frame.
+    """
+    return np.matmul(hand_markers2world, mano2hand_markers)
+
+
+def hold_last_valid_pose(poses, valid, initial_pose):
+    """Replace invalid poses by the last valid pose.
+
+    Parameters
+    ----------
+    poses : array, shape (n_steps, 4, 4)
+        Poses.
+
+    valid : array, shape (n_steps,)
+        Mask of valid poses.
+
+    initial_pose : array, shape (4, 4)
+        Pose that will be used before the first valid pose.
+
+    Returns
+    -------
+    poses : array, shape (n_steps, 4, 4)
+        Poses without invalid poses.
+    """
+    last_valid = np.maximum.accumulate(
+        np.where(valid, np.arange(len(poses)), -1))
+    poses = np.where(
+        (last_valid >= 0)[:, np.newaxis, np.newaxis], poses[last_valid],
+        initial_pose)
+    return poses
+
+
+def _norm_vectors(V):
+    """Normalize vectors along the last axis, zero vectors are unchanged."""
+    norms = np.linalg.norm(V, axis=-1)[..., np.newaxis]
+    return np.divide(V, norms, out=np.copy(V), where=norms != 0.0)
+
+
 class ManoFingerKinematics:
     """Estimates the state of a finger.
 
@@ -334,10 +494,18 @@ class ManoFingerKinematics:
 
     tip_vertex_offsets : list of array
         Offsets of vertex with respect to original vertex in MANO base frame.
+
+    solver : str, optional (default: 'slsqp')
+        Solver for inverse kinematics. 'slsqp' uses scipy's SLSQP with an
+        analytic gradient. 'lm' uses a bounded Levenberg-Marquardt solver
+        that exploits the least-squares structure of the problem.
     """
     def __init__(self, hand_state, finger_pose_param_indices,
                  finger_vertex_indices, finger_joint_indices, action_weights,
-                 tip_vertex_offsets):
+                 tip_vertex_offsets, solver="slsqp"):
+        if solver not in ["slsqp", "lm"]:
+            raise ValueError(f"Unknown solver: '{solver}'")
+        self.solver = solver
         self.finger_pose_param_indices = finger_pose_param_indices
         self.finger_vertex_indices = finger_vertex_indices
         self.finger_joint_indices = np.asarray(
@@ -349,12 +517,17 @@ class ManoFingerKinematics:
 
         self.finger_pose_params, self.finger_opt_vertex_indices = \
             self.reduce_pose_parameters(hand_state)
-        self.finger_error = FingerError(self.forward, action_weights)
+        self.finger_error = FingerError(
+            self._forward, action_weights, self._forward_with_jacobian)
 
         self.current_pose = np.zeros_like(
             self.finger_pose_param_indices).astype(dtype=float)
 
-        self._optimizer_pose = np.zeros(len(self.current_pose) + 3)
+        self._finger_vertices = HandVerticesWorkspace(
+            **self.finger_pose_params)
+        self._optimizer_pose = self._finger_vertices.pose
+        self._finger_jacobian = _FingerJacobianWorkspace(
+            **self.finger_pose_params)
         self.bounds = np.array([
             [-0.4 * np.pi, 0.4 * np.pi]] * len(self.current_pose))
 
@@ -383,7 +556,8 @@ class ManoFingerKinematics:
         -------
         pose_params : dict
             Reduced set of pose parameters of MANO. Contains fields 'J',
-            'weights', 'kintree_table', 'v_template', 'posedirs'.
+            'weights', 'kintree_table', 'v_template', 'posedirs', 'parents',
+            'traversal_order'.
 
         finger_opt_vertex_indices : list
             Indices of vertices that will be used during numerical inverse
@@ -410,6 +584,8 @@ class ManoFingerKinematics:
             "v_template": v_template,
             "posedirs": hand_state.pose_parameters["posedirs"][self.finger_vertex_indices][:, :, pose_dir_joint_indices]
         }
+        pose_params["parents"], pose_params["traversal_order"] = \
+            compile_kintree(pose_params["kintree_table"])
         return pose_params, finger_opt_vertex_indices
 
     def has_cached_forward_kinematics(self):
@@ -434,13 +610,40 @@ class ManoFingerKinematics:
         """
         if return_cached_result:
             assert self.last_forward_result is not None
-            return self.last_forward_result
+            return self.last_forward_result.copy()
+        return self._forward(pose).copy()
 
+    def _forward(self, pose):
+        """Forward kinematics for the solver, reuses the output array."""
         self._optimizer_pose[3:] = pose
-        self.last_forward_result = hand_vertices(
-            pose=self._optimizer_pose, **self.finger_pose_params)
+        self.last_forward_result = self._finger_vertices()
         return self.last_forward_result
 
+    def forward_with_jacobian(self, pose):
+        """Compute positions at the finger and their derivatives.
+
+        Parameters
+        ----------
+        pose : array, shape (n_finger_joints * 3,)
+            Joint angles.
+
+        Returns
+        -------
+        pos : array, shape (n_markers_per_finger, 3)
+            Vertex positions.
+
+        jacobian : array, shape (n_markers_per_finger, 3, n_finger_joints * 3)
+            Derivatives of vertex positions w.r.t. joint angles.
+        """
+        positions, jacobian = self._forward_with_jacobian(pose)
+        return positions.copy(), jacobian.copy()
+
+    def _forward_with_jacobian(self, pose):
+        """Forward kinematics for the solver, reuses the output arrays."""
+        self._finger_jacobian.pose[3:] = pose
+        self.last_forward_result = self._finger_jacobian()
+        return self.last_forward_result, self._finger_jacobian.finger_jacobian
+
     def inverse(self, position):
         """Estimate finger joint parameters from position.
 
@@ -453,10 +656,28 @@ class ManoFingerKinematics:
         -------
         current_pose : array, shape (n_finger_joints * 3,)
             Joint angles.
+
+        Raises
+        ------
+        ValueError
+            If there are more desired positions than finger markers.
         """
-        res = minimize(self.finger_error, self.current_pose, args=(position,),
-                       method="SLSQP", bounds=self.bounds)  # SLSQP, COBYLA
-        self.current_pose[:] = res["x"]
+        if len(np.atleast_2d(position)) > len(self.finger_vertex_indices):
+            raise ValueError("More desired positions than finger markers")
+        if self.solver == "lm":
+            desired_positions = np.atleast_2d(position).astype(float)
+            self.current_pose[:], self.last_forward_result = \
+                levenberg_marquardt_finger(
+                    self.current_pose, self.bounds, desired_positions,
+                    self.finger_error.action_weights,
+                    self.finger_pose_params["parents"],
+                    *[np.ascontiguousarray(self.finger_pose_params[k])
+                      for k in ["J", "weights", "v_template", "posedirs"]])
+        else:
+            res = minimize(self.finger_error.value_and_gradient,
+                           self.current_pose, args=(position,), jac=True,
+                           method="SLSQP", bounds=self.bounds)  # SLSQP, COBYLA
+            self.current_pose[:] = res["x"]
         return self.current_pose
 
 
@@ -470,10 +691,16 @@ class FingerError:
 
     action_weights : array, shape (2, n_joints * 3)
         Weight of action penalty in error function for fingers.
+
+    forward_kinematics_jacobian : callable, optional (default: None)
+        Forward kinematics that returns positions and their derivatives
+        w.r.t. the joint angles. Required to compute the gradient.
     """
-    def __init__(self, forward_kinematics, action_weights):
+    def __init__(self, forward_kinematics, action_weights,
+                 forward_kinematics_jacobian=None):
         self.forward_kinematics = forward_kinematics
         self.action_weights = action_weights
+        self.forward_kinematics_jacobian = forward_kinematics_jacobian
 
     def __call__(self, finger_pose, desired_finger_pos):
         """Compute error for numerical inverse kinematics.
@@ -488,21 +715,477 @@ class FingerError:
         """
         positions = self.forward_kinematics(finger_pose)
         desired_finger_pos = np.atleast_2d(desired_finger_pos)
+        return _finger_error(
+            positions, desired_finger_pos, finger_pose, self.action_weights)
+
+    def value_and_gradient(self, finger_pose, desired_finger_pos):
+        """Compute error and its gradient for numerical inverse kinematics.
+
+        Parameters
+        ----------
+        finger_pose : array, shape (n_finger_joints * 3,)
+            Joint angles.
+
+        desired_finger_pos : array, shape (n_markers_per_finger, 3)
+            Desired finger positions.
+
+        Returns
+        -------
+        error : float
+            Error.
+
+        gradient : array, shape (n_finger_joints * 3,)
+            Gradient of the error w.r.t. the joint angles.
+        """
+        positions, jacobian = self.forward_kinematics_jacobian(finger_pose)
+        desired_finger_pos = np.atleast_2d(desired_finger_pos)
+        return _finger_error_and_gradient(
+            positions, jacobian, desired_finger_pos, finger_pose,
+            self.action_weights)
+
+
+@numba.njit(cache=True)
+def _finger_error(positions, desired_finger_pos, finger_pose, action_weights):
+    """Compiled error function of FingerError."""
+    # TODO seems fragile, what if we only have a middle marker and no tip?
+    # in case there are no middle markers available, we only use the first
+    # len(desired_finger_pos) positions
+
+    if len(desired_finger_pos) > len(positions):
+        raise ValueError("More desired positions than finger markers")
+
+    # squared cost improves result and speed drastically in comparison
+    # to non-squared cost
+    error = 0.0
+    for m in range(len(desired_finger_pos)):
+        squared_distance = 0.0
+        for d in range(3):
+            diff = desired_finger_pos[m, d] - positions[m, d]
+            squared_distance += diff * diff
+        if not math.isnan(squared_distance):  # missing marker
+            error += squared_distance
+
+    pos_penalty = 0.0
+    neg_penalty = 0.0
+    for i in range(len(finger_pose)):
+        if finger_pose[i] > 0.0:
+            pos_penalty += action_weights[0, i] * finger_pose[i]
+        else:
+            neg_penalty -= action_weights[1, i] * finger_pose[i]
+    return error + pos_penalty ** 2 + neg_penalty ** 2
+
+
+@numba.njit(cache=True)
+def _finger_error_and_gradient(positions, jacobian, desired_finger_pos,
+                               finger_pose, action_weights):
+    """Compiled error function of FingerError and its gradient.
+
+    Only the returned gradient is allocated.
+    """
+    if len(desired_finger_pos) > len(positions):
+        raise ValueError("More desired positions than finger markers")
+
+    n_params = len(finger_pose)
+    gradient = np.zeros(n_params)
+    error = 0.0
+    for m in range(len(desired_finger_pos)):
+        for d in range(3):
+            residual = desired_finger_pos[m, d] - positions[m, d]
+            if math.isnan(residual):  # missing marker
+                continue
+            error += residual * residual
+            for q in range(n_params):
+                gradient[q] -= 2.0 * residual * jacobian[m, d, q]
+
+    pos_penalty = 0.0
+    neg_penalty = 0.0
+    for i in range(n_params):
+        if finger_pose[i] > 0.0:
+            pos_penalty += action_weights[0, i] * finger_pose[i]
+        else:
+            neg_penalty -= action_weights[1, i] * finger_pose[i]
+    for i in range(n_params):
+        if finger_pose[i] > 0.0:
+            gradient[i] += 2.0 * pos_penalty * action_weights[0, i]
+        elif finger_pose[i] < 0.0:
+            gradient[i] -= 2.0 * neg_penalty * action_weights[1, i]
+    return error + pos_penalty ** 2 + neg_penalty ** 2, gradient
+
+
+@numba.njit(cache=True)
+def levenberg_marquardt_finger(
+        finger_pose, bounds, desired_positions, action_weights, parents, J,
+        weights, v_template, posedirs, max_iter=50, initial_damping=1e-3,
+        xtol=1e-8, ftol=1e-2):
+    """Bounded Levenberg-Marquardt solver for the inverse kinematics of a finger.
+
+    Minimizes the same error as FingerError. Bounds are handled by projecting
+    each step onto the box. Joint angles that are at a bound and would be
+    pushed outside of it are excluded from the step. The damping factor is
+    updated according to Nielsen (1999).
+
+    Parameters
+    ----------
+    finger_pose : array, shape (n_finger_joints * 3,)
+        Initial joint angles, e.g., the solution of the previous frame.
+
+    bounds : array, shape (n_finger_joints * 3, 2)
+        Lower and upper bounds of joint angles.
+
+    desired_positions : array, shape (n_markers_per_finger, 3)
+        Desired finger positions. NaN marks missing markers.
 
-        # TODO seems fragile, what if we only have a middle marker and no tip?
-        # in case there are no middle markers available:
-        positions = positions[:len(desired_finger_pos)]
+    action_weights : array, shape (2, n_finger_joints * 3)
+        Weight of action penalty in error function for fingers.
+
+    parents : array, shape (n_parts,)
+        Index of the parent of each part of the reduced MANO model.
+
+    J : array, shape (n_parts, 3)
+        Joint positions of the reduced MANO model.
+
+    weights : array, shape (n_vertices, n_parts)
+        Blend weights of the reduced MANO model.
+
+    v_template : array, shape (n_vertices, 3)
+        Vertices of the reduced MANO model.
+
+    posedirs : array, shape (n_vertices, 3, 9 * (n_parts - 1))
+        Pose blend shapes of the reduced MANO model.
+
+    max_iter : int, optional (default: 50)
+        Maximum number of iterations.
+
+    initial_damping : float, optional (default: 1e-3)
+        Initial damping factor relative to the diagonal of the approximate
+        Hessian.
+
+    xtol : float, optional (default: 1e-8)
+        Tolerance for the norm of the step.
+
+    ftol : float, optional (default: 1e-2)
+        Tolerance for the relative decrease of the error.
+
+    Returns
+    -------
+    finger_pose : array, shape (n_finger_joints * 3,)
+        Joint angles.
+
+    positions : array, shape (n_vertices, 3)
+        Vertex positions for the returned joint angles.
+    """
+    n_params = len(finger_pose)
+    lower = bounds[:, 0]
+    upper = bounds[:, 1]
+    x = np.minimum(np.maximum(finger_pose, lower), upper)
+    r, Jr, positions = _finger_residuals_and_jacobian(
+        x, desired_positions, action_weights, parents, J, weights,
+        v_template, posedirs)
+    cost = np.dot(r, r)
+    damping = -1.0
+    damping_factor = 2.0
+
+    for _ in range(max_iter):
+        g = np.dot(Jr.T, r)
+        H = np.dot(Jr.T, Jr)
+        active = np.logical_or(np.logical_and(x <= lower, g > 0.0),
+                               np.logical_and(x >= upper, g < 0.0))
+        for i in range(n_params):
+            if active[i]:
+                g[i] = 0.0
+                H[i, :] = 0.0
+                H[:, i] = 0.0
+        if damping < 0.0:
+            damping = initial_damping * max(np.max(np.diag(H)), 1e-12)
+
+        A = H + damping * np.eye(n_params)
+        x_new = np.minimum(np.maximum(x - np.linalg.solve(A, g), lower),
+                           upper)
+        step = x_new - x
+        r_new, Jr_new, positions_new = _finger_residuals_and_jacobian(
+            x_new, desired_positions, action_weights, parents, J, weights,
+            v_template, posedirs)
+        cost_new = np.dot(r_new, r_new)
+
+        # ratio of actual and predicted decrease of the error
+        predicted_decrease = -2.0 * np.dot(g, step) - np.dot(
+            step, np.dot(H, step))
+        decrease = cost - cost_new
+        if decrease > 0.0 and predicted_decrease > 0.0:
+            rho = decrease / predicted_decrease
+            damping *= max(1.0 / 3.0, 1.0 - (2.0 * rho - 1.0) ** 3)
+            damping_factor = 2.0
+            x = x_new
+            r = r_new
+            Jr = Jr_new
+            positions = positions_new
+            cost = cost_new
+            if np.linalg.norm(step) < xtol or decrease <= ftol * cost:
+                break
+        else:
+            damping *= damping_factor
+            damping_factor *= 2.0
+            if np.linalg.norm(step) < xtol:
+                break
+    return x, positions
 
-        pos_finger_pose = np.maximum(0.0, finger_pose)
-        neg_finger_pose = -np.minimum(0.0, finger_pose)
 
-        # squared cost improves result and speed drastically in comparison
-        # to non-squared cost
-        errors = np.linalg.norm(desired_finger_pos - positions, axis=1) ** 2
-        error = np.nansum(errors)
+@numba.njit(cache=True)
+def _finger_residuals_and_jacobian(
+        finger_pose, desired_positions, action_weights, parents, J, weights,
+        v_template, posedirs):
+    """Residuals of FingerError and their derivatives w.r.t. the joint angles.
 
-        regularization = (
-                np.dot(self.action_weights[0], pos_finger_pose) ** 2
-                + np.dot(self.action_weights[1], neg_finger_pose) ** 2)
+    The sum of squared residuals is the error of FingerError.
+    """
+    n_markers = len(desired_positions)
+    n_params = len(finger_pose)
+    pose = np.zeros(n_params + 3)
+    pose[3:] = finger_pose
+    positions, jacobian = _reduced_hand_vertices_jacobian(
+        pose, parents, J, weights, v_template, posedirs)
+
+    r = np.zeros(3 * n_markers + 2)
+    Jr = np.zeros((3 * n_markers + 2, n_params))
+    for m in range(n_markers):
+        for d in range(3):
+            residual = positions[m, d] - desired_positions[m, d]
+            if not math.isnan(residual):  # missing markers have no effect
+                r[3 * m + d] = residual
+                Jr[3 * m + d] = jacobian[m, d, 3:]
+
+    for i in range(n_params):
+        if finger_pose[i] > 0.0:
+            r[-2] += action_weights[0, i] * finger_pose[i]
+            Jr[-2, i] = action_weights[0, i]
+        elif finger_pose[i] < 0.0:
+            r[-1] -= action_weights[1, i] * finger_pose[i]
+            Jr[-1, i] = -action_weights[1, i]
+    return r, Jr, positions
+
+
+class _FingerJacobianWorkspace:
+    """Preallocated memory to compute vertices and their Jacobian repeatedly.
+
+    Counterpart of HandVerticesWorkspace for the reduced MANO model of a
+    finger. Parents must be ordered before their children.
+
+    Attributes
+    ----------
+    pose : array, shape (n_parts * 3,)
+        Pose parameters. Can be modified in place.
+
+    vertices : array, shape (n_vertices, 3)
+        Vertices of the last call.
 
-        return error + regularization
+    jacobian : array, shape (n_vertices, 3, n_parts * 3)
+        Derivatives of the vertices w.r.t. the pose of the last call.
+
+    finger_jacobian : array, shape (n_vertices, 3, n_parts * 3 - 3)
+        View of jacobian without the derivatives w.r.t. the root joint.
+    """
+    def __init__(self, J, weights, v_template, posedirs, parents, **kwargs):
+        self._model = tuple(np.ascontiguousarray(a, dtype=dtype) for a, dtype
+                            in [(parents, np.int64), (J, float),
+                                (weights, float), (v_template, float),
+                                (posedirs, float)])
+        n_parts = len(parents)
+        n_params = 3 * n_parts
+        n_vertices = len(v_template)
+
+        self.pose = np.zeros(n_params)
+        self._buffers = (
+            np.empty((n_parts, 3, 3)), np.empty((n_parts, 3, 3, 3)),
+            np.empty((n_parts, 3, 4)), np.empty((n_parts, n_params, 3, 4)),
+            np.empty((3, 4)), np.empty(3), np.empty((3, n_params)))
+        self.vertices = np.empty((n_vertices, 3))
+        self.jacobian = np.empty((n_vertices, 3, n_params))
+        self.finger_jacobian = self.jacobian[:, :, 3:]
+
+    def __call__(self):
+        """Compute vertices and Jacobian for the current pose.
+
+        Returns
+        -------
+        vertices : array, shape (n_vertices, 3)
+            Vertices. Will be overwritten by the next call.
+        """
+        _reduced_hand_vertices_jacobian_inplace(
+            self.pose, *self._model, *self._buffers, self.vertices,
+            self.jacobian)
+        return self.vertices
+
+
+@numba.njit(cache=True)
+def _reduced_hand_vertices_jacobian(
+        pose, parents, J, weights, v_template, posedirs):
+    """Compiled version of mano.hand_vertices_jacobian.
+
+    Parents must be ordered before their children.
+    """
+    n_parts = len(J)
+    n_params = 3 * n_parts
+    n_vertices = len(v_template)
+    vertices = np.empty((n_vertices, 3))
+    jacobian = np.empty((n_vertices, 3, n_params))
+    _reduced_hand_vertices_jacobian_inplace(
+        pose, parents, J, weights, v_template, posedirs,
+        np.empty((n_parts, 3, 3)), np.empty((n_parts, 3, 3, 3)),
+        np.empty((n_parts, 3, 4)), np.empty((n_parts, n_params, 3, 4)),
+        np.empty((3, 4)), np.empty(3), np.empty((3, n_params)), vertices,
+        jacobian)
+    return vertices, jacobian
+
+
+@numba.njit(cache=True)
+def _reduced_hand_vertices_jacobian_inplace(
+        pose, parents, J, weights, v_template, posedirs, R, dR, W, dW, T,
+        v_posed, dv_posed, vertices, jacobian):
+    """Compute vertices and Jacobian without allocating memory.
+
+    R (n_parts, 3, 3), dR (n_parts, 3, 3, 3), W (n_parts, 3, 4),
+    dW (n_parts, n_params, 3, 4), T (3, 4), v_posed (3,), and
+    dv_posed (3, n_params) are used as workspace. The results will be
+    stored in vertices (n_vertices, 3) and jacobian (n_vertices, 3,
+    n_params). Parents must be ordered before their children.
+    """
+    n_parts = len(J)
+    n_params = 3 * n_parts
+    n_vertices = len(v_template)
+
+    # global joint transformations and their derivatives, only the upper
+    # 3x4 part of each homogeneous matrix is stored
+    dW[:, :, :, :] = 0.0
+    for i in range(n_parts):
+        _matrix_and_derivatives_from_compact_axis_angle(
+            pose[3 * i:3 * i + 3], R[i], dR[i])
+        T[:, :3] = R[i]
+        if i == 0:
+            T[:, 3] = J[0]
+            W[0] = T
+            for c in range(3):
+                dW[0, c, :, :3] = dR[0, c]
+        else:
+            p = parents[i]
+            for d in range(3):
+                T[d, 3] = J[i, d] - J[p, d]
+            _concat_affine(W[p], T, W[i])
+            for q in range(3 * i):
+                _concat_affine(dW[p, q], T, dW[i, q])
+            for c in range(3):
+                for a in range(3):
+                    for b in range(3):
+                        dW[i, 3 * i + c, a, b] = (
+                            W[p, a, 0] * dR[i, c, 0, b]
+                            + W[p, a, 1] * dR[i, c, 1, b]
+                            + W[p, a, 2] * dR[i, c, 2, b])
+
+    # remove rest pose from joint transformations
+    for i in range(n_parts):
+        for a in range(3):
+            W[i, a, 3] -= (W[i, a, 0] * J[i, 0] + W[i, a, 1] * J[i, 1]
+                           + W[i, a, 2] * J[i, 2])
+            for q in range(3 * i + 3):
+                dW[i, q, a, 3] -= (
+                    dW[i, q, a, 0] * J[i, 0] + dW[i, q, a, 1] * J[i, 1]
+                    + dW[i, q, a, 2] * J[i, 2])
+
+    vertices[:, :] = 0.0
+    jacobian[:, :, :] = 0.0
+    dv_posed[:, :] = 0.0
+    for v in range(n_vertices):
+        for d in range(3):
+            v_posed[d] = v_template[v, d]
+            for i in range(1, n_parts):
+                for j in range(3):
+                    for k in range(3):
+                        offset = R[i, j, k]
+                        if j == k:
+                            offset -= 1.0
+                        v_posed[d] += posedirs[
+                            v, d, 9 * (i - 1) + 3 * j + k] * offset
+                for c in range(3):
+                    dv = 0.0
+                    for j in range(3):
+                        for k in range(3):
+                            dv += posedirs[v, d, 9 * (i - 1) + 3 * j + k] * \
+                                dR[i, c, j, k]
+                    dv_posed[d, 3 * i + c] = dv
+
+        for p in range(n_parts):
+            w = weights[v, p]
+            if w == 0.0:
+                continue
+            for d in range(3):
+                vertices[v, d] += w * (
+                    W[p, d, 0] * v_posed[0] + W[p, d, 1] * v_posed[1]
+                    + W[p, d, 2] * v_posed[2] + W[p, d, 3])
+                for q in range(n_params):
+                    jacobian[v, d, q] += w * (
+                        dW[p, q, d, 0] * v_posed[0]
+                        + dW[p, q, d, 1] * v_posed[1]
+                        + dW[p, q, d, 2] * v_posed[2] + dW[p, q, d, 3]
+                        + W[p, d, 0] * dv_posed[0, q]
+                        + W[p, d, 1] * dv_posed[1, q]
+                        + W[p, d, 2] * dv_posed[2, q])
+
+
+@numba.njit(cache=True)
+def _concat_affine(A, B, out):
+    """Compute out = A * B for the upper 3x4 part of homogeneous matrices."""
+    for a in range(3):
+        for b in range(4):
+            out[a, b] = (A[a, 0] * B[0, b] + A[a, 1] * B[1, b]
+                         + A[a, 2] * B[2, b])
+        out[a, 3] += A[a, 3]
+
+
+@numba.njit(cache=True)
+def _matrix_and_derivatives_from_compact_axis_angle(a, R, dR):
+    """Compiled version of mano._matrix_and_derivatives_from_compact_axis_angle."""
+    angle_squared = a[0] * a[0] + a[1] * a[1] + a[2] * a[2]
+    if angle_squared < 1e-16:
+        for j in range(3):
+            for k in range(3):
+                R[j, k] = 1.0 if j == k else 0.0
+        for i in range(3):
+            _cross_product_matrix_dot(
+                R[0, i], R[1, i], R[2, i], R, 1.0, dR[i])
+        return
+
+    angle = math.sqrt(angle_squared)
+    ux = a[0] / angle
+    uy = a[1] / angle
+    uz = a[2] / angle
+    c = math.cos(angle)
+    s = math.sin(angle)
+    ci = 1.0 - c
+    R[0, 0] = ci * ux * ux + c
+    R[0, 1] = ci * ux * uy - uz * s
+    R[0, 2] = ci * ux * uz + uy * s
+    R[1, 0] = ci * uy * ux + uz * s
+    R[1, 1] = ci * uy * uy + c
+    R[1, 2] = ci * uy * uz - ux * s
+    R[2, 0] = ci * uz * ux - uy * s
+    R[2, 1] = ci * uz * uy + ux * s
+    R[2, 2] = ci * uz * uz + c
+
+    # dR_i = (a_i [a] + [a x (I - R)_i]) R / |a|^2 and [.] is linear
+    for i in range(3):
+        w0 = (1.0 if i == 0 else 0.0) - R[0, i]
+        w1 = (1.0 if i == 1 else 0.0) - R[1, i]
+        w2 = (1.0 if i == 2 else 0.0) - R[2, i]
+        _cross_product_matrix_dot(
+            a[i] * a[0] + a[1] * w2 - a[2] * w1,
+            a[i] * a[1] + a[2] * w0 - a[0] * w2,
+            a[i] * a[2] + a[0] * w1 - a[1] * w0,
+            R, 1.0 / angle_squared, dR[i])
+
+
+@numba.njit(cache=True)
+def _cross_product_matrix_dot(v0, v1, v2, A, scale, out):
+    """Compute out = scale * [v] A, where [v] is the cross product matrix."""
+    for k in range(3):
+        out[0, k] = scale * (v1 * A[2, k] - v2 * A[1, k])
+        out[1, k] = scale * (v2 * A[0, k] - v0 * A[2, k])
+        out[2, k] = scale * (v0 * A[1, k] - v1 * A[0, k])
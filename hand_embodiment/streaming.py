@@ -0,0 +1,705 @@
+"""Streaming conversion of motion capture data to robotic hands.
+
+Marker frames are received from a source (e.g., a UDP socket or a replayed
+recording), converted with MoCapToRobot, and the resulting states of the
+robotic hand are published to subscribers.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import inspect
+import json
+import socket
+import time
+import numpy as np
+import yaml
+
+from .mocap_dataset import load_qualisys_tsv
+
+
+class MarkerFrame:
+    """Marker positions of one frame of a motion capture system.
+
+    Parameters
+    ----------
+    frame : int
+        Frame index.
+
+    time : float
+        Time of the frame in seconds, as reported by the motion capture
+        system.
+
+    marker_names : list of str
+        Names of markers.
+
+    positions : array, shape (n_markers, 3)
+        Positions of markers in meters. Missing markers are NaN.
+
+    received : float, optional (default: None)
+        Time at which the frame has been received (time.perf_counter()).
+        Current time by default.
+    """
+    def __init__(self, frame, time, marker_names, positions, received=None):
+        self.frame = frame
+        self.time = time
+        self.marker_names = marker_names
+        self.positions = positions
+        if received is None:
+            received = _now()
+        self.received = received
+
+
+class RobotState:
+    """State of the robotic hand that has been computed from a marker frame.
+
+    Parameters
+    ----------
+    frame : int
+        Frame index of the marker frame.
+
+    time : float
+        Time of the marker frame.
+
+    ee_pose : array, shape (4, 4)
+        Pose of the end effector.
+
+    joint_angles : dict
+        Maps finger names to corresponding joint angles in the order that
+        is given in the target configuration.
+
+    latencies : dict
+        Latencies of processing stages ('queue', 'estimate') in seconds.
+    """
+    def __init__(self, frame, time, ee_pose, joint_angles, latencies):
+        self.frame = frame
+        self.time = time
+        self.ee_pose = ee_pose
+        self.joint_angles = joint_angles
+        self.latencies = latencies
+
+
+def encode_marker_frame(marker_frame):
+    """Encode marker frame as JSON message.
+
+    Parameters
+    ----------
+    marker_frame : MarkerFrame
+        Marker frame.
+
+    Returns
+    -------
+    message : bytes
+        JSON object with the fields 'frame', 'time', and 'markers', which
+        maps marker names to positions. Missing markers are null.
+    """
+    markers = {}
+    for marker_name, position in zip(
+            marker_frame.marker_names, marker_frame.positions):
+        if np.any(np.isnan(position)):
+            markers[marker_name] = None
+        else:
+            markers[marker_name] = [float(p) for p in position]
+    return json.dumps({
+        "frame": int(marker_frame.frame), "time": float(marker_frame.time),
+        "markers": markers}).encode("utf-8")
+
+
+def decode_marker_frame(message, received=None):
+    """Decode marker frame from JSON message.
+
+    Parameters
+    ----------
+    message : bytes
+        Message, see encode_marker_frame.
+
+    received : float, optional (default: None)
+        Time at which the message has been received.
+
+    Returns
+    -------
+    marker_frame : MarkerFrame
+        Marker frame.
+
+    Raises
+    ------
+    ValueError
+        If the message is not a valid marker frame.
+    """
+    try:
+        content = json.loads(message)
+        markers = content["markers"]
+        positions = np.array(
+            [[np.nan] * 3 if position is None else position
+             for position in markers.values()], dtype=float)
+        if positions.shape != (len(markers), 3):
+            raise ValueError(
+                f"Expected 3 coordinates for each of {len(markers)} markers, "
+                f"got array of shape {positions.shape}")
+        return MarkerFrame(
+            int(content["frame"]), float(content["time"]), list(markers),
+            positions, received)
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid marker frame: {e}") from e
+
+
+class UdpMarkerSource:
+    """Receives marker frames from UDP datagrams.
+
+    Each datagram contains one marker frame encoded with encode_marker_frame.
+    Invalid datagrams will be ignored. Iterating over this object yields
+    MarkerFrame objects until close() is called.
+
+    Parameters
+    ----------
+    host : str, optional (default: '0.0.0.0')
+        Local address.
+
+    port : int, optional (default: 6543)
+        Local port. Use 0 to select a free port.
+
+    maxsize : int, optional (default: 1)
+        Maximum number of frames that will be buffered. The oldest frame will
+        be dropped if the buffer is full.
+
+    Attributes
+    ----------
+    address_ : tuple
+        Local address and port after start().
+
+    n_invalid_ : int
+        Number of invalid datagrams.
+
+    n_dropped_ : int
+        Number of frames that have been dropped because they have not been
+        consumed in time.
+    """
+    def __init__(self, host="0.0.0.0", port=6543, maxsize=1):
+        self.host = host
+        self.port = port
+        self.maxsize = maxsize
+        self._transport = None
+        self._queue = None
+        self.address_ = None
+        self.n_invalid_ = 0
+        self.n_dropped_ = 0
+
+    async def start(self):
+        """Bind socket."""
+        if self._transport is not None:
+            return
+        self._queue = asyncio.Queue(self.maxsize + 1)  # + end of stream
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _MarkerFrameProtocol(self),
+            local_addr=(self.host, self.port))
+        self.address_ = self._transport.get_extra_info("sockname")
+
+    def close(self):
+        """Close socket and stop iteration."""
+        if self._transport is None:
+            return
+        self._transport.close()
+        self._transport = None
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    def _datagram_received(self, data):
+        try:
+            marker_frame = decode_marker_frame(data)
+        except ValueError:
+            self.n_invalid_ += 1
+            return
+        if self._queue.qsize() >= self.maxsize:
+            self._queue.get_nowait()
+            self.n_dropped_ += 1
+        self._queue.put_nowait(marker_frame)
+
+    async def __aiter__(self):
+        await self.start()
+        while True:
+            marker_frame = await self._queue.get()
+            if marker_frame is None:
+                return
+            yield marker_frame
+
+
+class _MarkerFrameProtocol(asyncio.DatagramProtocol):
+    def __init__(self, source):
+        self.source = source
+
+    def datagram_received(self, data, addr):
+        self.source._datagram_received(data)
+
+
+class UdpMarkerSink:
+    """Sends marker frames as UDP datagrams to a UdpMarkerSource.
+
+    Parameters
+    ----------
+    host : str, optional (default: '127.0.0.1')
+        Address of the receiver.
+
+    port : int, optional (default: 6543)
+        Port of the receiver.
+    """
+    def __init__(self, host="127.0.0.1", port=6543):
+        self.address = (host, port)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, marker_frame):
+        """Send marker frame.
+
+        Parameters
+        ----------
+        marker_frame : MarkerFrame
+            Marker frame.
+        """
+        self._socket.sendto(encode_marker_frame(marker_frame), self.address)
+
+    def close(self):
+        """Close socket."""
+        self._socket.close()
+
+
+class ReplayMarkerSource:
+    """Replays a Qualisys recording as a stand-in for a live source.
+
+    Frames can be replayed in real time, i.e., at the frequency of the
+    recording (FREQUENCY in its header), a multiple of it, or as fast as they
+    are consumed. The source can be iterated synchronously (generator) or
+    asynchronously (async iterator). Each iteration replays the selected
+    frames once and resets the statistics.
+
+    A frame is late if the consumer requests it more than late_tolerance
+    seconds after it is due. Frames that are already overdue because the
+    next frame is due as well can be dropped, which simulates a live stream
+    that does not wait for its consumer. Paced frames are marked as received
+    when they are due so that latencies measured by the consumer include
+    their delay.
+
+    Parameters
+    ----------
+    filename : str
+        Qualisys tsv file.
+
+    start_idx : int, optional (default: 0)
+        Index of the first frame.
+
+    end_idx : int, optional (default: None)
+        Index after the last frame. The whole recording will be used by
+        default.
+
+    skip_frames : int, optional (default: 1)
+        Only use every skip_frames-th frame.
+
+    speed : float, optional (default: None)
+        Replay speed relative to the frequency of the recording, e.g., 1.0
+        for real time or 2.0 for twice as fast. Frames will be yielded as
+        fast as they are consumed by default.
+
+    drop_late : bool, optional (default: False)
+        Drop frames if the following frame is due already when they are
+        requested. The last frame will never be dropped.
+
+    late_tolerance : float, optional (default: None)
+        Maximum delay in seconds after which a frame is not considered to be
+        late. One period between replayed frames by default.
+
+    Attributes
+    ----------
+    n_emitted_ : int
+        Number of frames that have been yielded.
+
+    n_late_ : int
+        Number of frames that have been yielded late.
+
+    n_dropped_ : int
+        Number of frames that have been dropped.
+
+    max_lateness_ : float
+        Maximum delay of a frame in seconds.
+    """
+    def __init__(self, filename, start_idx=0, end_idx=None, skip_frames=1,
+                 speed=None, drop_late=False, late_tolerance=None):
+        if speed is not None and speed <= 0.0:
+            raise ValueError(f"Speed must be positive, got {speed}")
+        self.recording = load_qualisys_tsv(filename)
+        self.frame_indices = range(
+            self.recording.n_frames)[start_idx:end_idx:skip_frames]
+        self.speed = speed
+        self.drop_late = drop_late
+        if late_tolerance is None:
+            late_tolerance = self.period
+        self.late_tolerance = late_tolerance
+        self._reset_stats()
+
+    @property
+    def period(self):
+        """Time between replayed frames in seconds (0 if not paced)."""
+        if self.speed is None:
+            return 0.0
+        return (self.frame_indices.step
+                / (self.recording.frequency * self.speed))
+
+    def _reset_stats(self):
+        self.n_emitted_ = 0
+        self.n_late_ = 0
+        self.n_dropped_ = 0
+        self.max_lateness_ = 0.0
+
+    def summary(self):
+        """Summarize the last replay.
+
+        Returns
+        -------
+        summary : dict
+            Number of emitted, late, and dropped frames and maximum lateness.
+        """
+        return {"emitted": self.n_emitted_, "late": self.n_late_,
+                "dropped": self.n_dropped_, "max_lateness": self.max_lateness_}
+
+    def _schedule(self):
+        """Generate frames and the time to wait until they are due."""
+        self._reset_stats()
+        if len(self.frame_indices) == 0:
+            return
+        frames = self.recording.frames
+        first_frame = frames[self.frame_indices[0]]
+        time_scale = 0.0 if self.speed is None else 1.0 / (
+            self.recording.frequency * self.speed)
+        start_time = _now()
+        n_frames = len(self.frame_indices)
+        for i, t in enumerate(self.frame_indices):
+            deadline = start_time + (frames[t] - first_frame) * time_scale
+            if self.speed is None:
+                delay = 0.0
+                lateness = 0.0
+            else:
+                now = _now()
+                if self.drop_late and i + 1 < n_frames:
+                    next_deadline = start_time + time_scale * (
+                        frames[self.frame_indices[i + 1]] - first_frame)
+                    if now >= next_deadline:
+                        self.n_dropped_ += 1
+                        continue
+                delay = max(0.0, deadline - now)
+                lateness = max(0.0, now - deadline)
+            if lateness > self.late_tolerance:
+                self.n_late_ += 1
+            self.max_lateness_ = max(self.max_lateness_, lateness)
+            self.n_emitted_ += 1
+            yield delay, MarkerFrame(
+                int(frames[t]), float(self.recording.time[t]),
+                self.recording.marker_names, self.recording.positions[t],
+                received=None if self.speed is None else deadline)
+
+    def __iter__(self):
+        for delay, marker_frame in self._schedule():
+            if delay > 0.0:
+                time.sleep(delay)
+                marker_frame.received = _now()
+            yield marker_frame
+
+    async def __aiter__(self):
+        for delay, marker_frame in self._schedule():
+            await asyncio.sleep(delay)  # gives other tasks a chance to run
+            if delay > 0.0:
+                marker_frame.received = _now()
+            yield marker_frame
+
+
+class LatencyStats:
+    """Statistics of latencies of a processing stage.
+
+    Parameters
+    ----------
+    n_samples : int, optional (default: 1000)
+        Number of recent latencies that will be used to compute percentiles.
+
+    Attributes
+    ----------
+    count : int
+        Number of measured latencies.
+
+    mean : float
+        Average latency in seconds.
+
+    max : float
+        Maximum latency in seconds.
+    """
+    def __init__(self, n_samples=1000):
+        self.count = 0
+        self.mean = 0.0
+        self.max = 0.0
+        self._samples = collections.deque(maxlen=n_samples)
+
+    def add(self, latency):
+        """Add measured latency.
+
+        Parameters
+        ----------
+        latency : float
+            Latency in seconds.
+        """
+        self.count += 1
+        self.mean += (latency - self.mean) / self.count
+        self.max = max(self.max, latency)
+        self._samples.append(latency)
+
+    def percentile(self, q):
+        """Percentile of recent latencies.
+
+        Parameters
+        ----------
+        q : float
+            Percentile in [0, 100].
+
+        Returns
+        -------
+        latency : float
+            Latency in seconds. NaN if there are no measurements.
+        """
+        if not self._samples:
+            return float("nan")
+        return float(np.percentile(self._samples, q))
+
+    def summary(self):
+        """Summarize statistics.
+
+        Returns
+        -------
+        summary : dict
+            Count, mean, median ('p50'), 95th percentile ('p95'), and max.
+        """
+        return {"count": self.count, "mean": self.mean,
+                "p50": self.percentile(50), "p95": self.percentile(95),
+                "max": self.max}
+
+
+class MarkerToRobotService:
+    """Converts a stream of marker frames to states of a robotic hand.
+
+    Frames from a source are stored in a bounded queue. If frames arrive
+    faster than they can be converted, the oldest frame in the queue will be
+    dropped so that the latest state is always converted. The conversion
+    runs in a separate thread so that frames can be received in the
+    meantime. Results are published to all subscribers.
+
+    Parameters
+    ----------
+    pipeline : MoCapToRobot
+        Conversion from markers to the robotic hand.
+
+    hand_marker_names : list of str
+        Names of markers on the back of the hand in order 'hand_top',
+        'hand_left', 'hand_right'.
+
+    finger_marker_names : dict (str to list of str)
+        Names of markers on each finger.
+
+    scale : float, optional (default: 1.0)
+        Scaling factor for marker positions.
+
+    maxsize : int, optional (default: 1)
+        Maximum number of frames in the queue.
+
+    n_latency_samples : int, optional (default: 1000)
+        Number of recent latencies that will be used to compute percentiles.
+
+    Attributes
+    ----------
+    n_received_ : int
+        Number of received frames.
+
+    n_dropped_ : int
+        Number of frames that have been dropped from the queue.
+
+    n_invalid_ : int
+        Number of frames that could not be converted because hand markers
+        are missing or NaN.
+
+    n_published_ : int
+        Number of published states.
+
+    latency_stats_ : dict (str to LatencyStats)
+        Latencies of stages 'queue' (from reception to start of conversion),
+        'estimate' (conversion), 'publish' (subscribers), and 'total' (from
+        reception until all subscribers have been called).
+    """
+    def __init__(self, pipeline, hand_marker_names, finger_marker_names,
+                 scale=1.0, maxsize=1, n_latency_samples=1000):
+        self.pipeline = pipeline
+        self.hand_marker_names = hand_marker_names
+        self.finger_marker_names = finger_marker_names
+        self.scale = scale
+        self.maxsize = maxsize
+        self.n_latency_samples = n_latency_samples
+        self.subscribers = []
+        self._marker_indices = {}
+        self.reset_stats()
+
+    @classmethod
+    def from_mocap_config(cls, pipeline, mocap_config, **kwargs):
+        """Create service with marker names from a motion capture config.
+
+        Parameters
+        ----------
+        pipeline : MoCapToRobot
+            Conversion from markers to the robotic hand.
+
+        mocap_config : str
+            Path to motion capture configuration, e.g., from
+            examples/config/markers.
+
+        kwargs : dict
+            Further arguments of the constructor.
+
+        Returns
+        -------
+        service : MarkerToRobotService
+            Streaming service.
+        """
+        with open(mocap_config, "r") as f:
+            config = yaml.safe_load(f)
+        finger_marker_names = {
+            finger_name: config["finger_marker_names"][finger_name]
+            for finger_name in config["finger_names"]
+            if finger_name in config["finger_marker_names"]}
+        kwargs.setdefault("scale", config.get("scale", 1.0))
+        return cls(pipeline, config["hand_marker_names"], finger_marker_names,
+                   **kwargs)
+
+    def reset_stats(self):
+        """Reset counters and latency statistics."""
+        self.n_received_ = 0
+        self.n_dropped_ = 0
+        self.n_invalid_ = 0
+        self.n_published_ = 0
+        self.latency_stats_ = {
+            stage: LatencyStats(self.n_latency_samples)
+            for stage in ["queue", "estimate", "publish", "total"]}
+
+    def subscribe(self, callback):
+        """Register subscriber.
+
+        Parameters
+        ----------
+        callback : callable
+            Will be called with a RobotState. Can be a coroutine function.
+        """
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """Remove subscriber.
+
+        Parameters
+        ----------
+        callback : callable
+            Registered subscriber.
+        """
+        self.subscribers.remove(callback)
+
+    async def run(self, source):
+        """Convert all frames from a source.
+
+        Parameters
+        ----------
+        source : async iterable of MarkerFrame
+            Source of marker frames, e.g., UdpMarkerSource.
+        """
+        queue = asyncio.Queue(self.maxsize + 1)  # + end of stream
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            receiver = asyncio.ensure_future(self._receive(source, queue))
+            try:
+                while True:
+                    marker_frame = await queue.get()
+                    if marker_frame is None:
+                        break
+                    await self._convert(marker_frame, executor)
+                await receiver
+            finally:
+                receiver.cancel()
+
+    async def _receive(self, source, queue):
+        try:
+            async for marker_frame in source:
+                self.n_received_ += 1
+                if queue.qsize() >= self.maxsize:
+                    queue.get_nowait()
+                    self.n_dropped_ += 1
+                queue.put_nowait(marker_frame)
+        finally:
+            if queue.full():
+                queue.get_nowait()
+                self.n_dropped_ += 1
+            queue.put_nowait(None)
+
+    async def _convert(self, marker_frame, executor):
+        start_time = _now()
+        markers = self._extract_markers(marker_frame)
+        if markers is None:
+            self.n_invalid_ += 1
+            return
+        hand_markers, finger_markers = markers
+
+        loop = asyncio.get_running_loop()
+        ee_pose, joint_angles = await loop.run_in_executor(
+            executor, self._estimate, hand_markers, finger_markers)
+        estimate_time = _now()
+
+        latencies = {"queue": start_time - marker_frame.received,
+                     "estimate": estimate_time - start_time}
+        state = RobotState(marker_frame.frame, marker_frame.time, ee_pose,
+                           joint_angles, latencies)
+        for subscriber in list(self.subscribers):
+            result = subscriber(state)
+            if inspect.isawaitable(result):
+                await result
+        end_time = _now()
+        latencies["publish"] = end_time - estimate_time
+        latencies["total"] = end_time - marker_frame.received
+
+        self.n_published_ += 1
+        for stage, latency in latencies.items():
+            self.latency_stats_[stage].add(latency)
+
+    def _estimate(self, hand_markers, finger_markers):
+        ee_pose, joint_angles = self.pipeline.estimate(
+            hand_markers, finger_markers)
+        return ee_pose, {finger_name: np.copy(angles)
+                         for finger_name, angles in joint_angles.items()}
+
+    def _extract_markers(self, marker_frame):
+        """Select markers of the hand, None if hand markers are missing."""
+        key = tuple(marker_frame.marker_names)
+        if key not in self._marker_indices:
+            index = {name: i for i, name in enumerate(key)}
+            hand_indices = None
+            if all(name in index for name in self.hand_marker_names):
+                hand_indices = [
+                    index[name] for name in self.hand_marker_names]
+            self._marker_indices[key] = (
+                hand_indices,
+                {finger_name: [index[name] for name in marker_names
+                               if name in index]
+                 for finger_name, marker_names
+                 in self.finger_marker_names.items()})
+        hand_indices, finger_indices = self._marker_indices[key]
+        if hand_indices is None:
+            return None
+
+        positions = marker_frame.positions
+        if self.scale != 1.0:
+            positions = positions * self.scale
+        hand_markers = [positions[i] for i in hand_indices]
+        if np.any(np.isnan(hand_markers)):
+            return None
+        finger_markers = {
+            finger_name: positions[indices]
+            for finger_name, indices in finger_indices.items() if indices}
+        return hand_markers, finger_markers
+
+
+def _now():
+    return time.perf_counter()
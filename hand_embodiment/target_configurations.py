@@ -120,6 +120,10 @@ class MiaVirtualThumbJoint:
             angle = self.min_angle
         return {self.real_joint_name: angle}
 
+    def derivative(self, value):
+        # piecewise constant, the step at 0 must not be used as a gradient
+        return {self.real_joint_name: 0.0}
+
 
 manobase2miabase = pt.transform_from_exponential_coordinates(
     [-1.006, 0.865, -1.723, -0.108, 0.088, 0.011])
@@ -277,6 +281,14 @@ class ShadowVirtualF0Joint:
         return {self.first_real_joint_name: first_joint_value,
                 self.second_real_joint_name: second_joint_value}
 
+    def derivative(self, value):
+        if value > self.first_joint_max:
+            return {self.first_real_joint_name: 0.0,
+                    self.second_real_joint_name: 1.0}
+        else:
+            return {self.first_real_joint_name: 1.0,
+                    self.second_real_joint_name: 0.0}
+
 
 manobase2shadowbase = pt.transform_from_exponential_coordinates(
     [-0.07, 1.77, -0.148, -0.309, -0.021, 0.272])
@@ -388,6 +400,14 @@ class RobotiqJoint:
                 "left_inner_finger_joint": value,
                 "right_inner_finger_joint": value}
 
+    def derivative(self, value):
+        return {"finger_joint": 1.0,
+                "right_outer_knuckle_joint": -1.0,
+                "left_inner_knuckle_joint": -1.0,
+                "right_inner_knuckle_joint": -1.0,
+                "left_inner_finger_joint": 1.0,
+                "right_inner_finger_joint": 1.0}
+
 
 manobase2robotiqbase = pt.transform_from_exponential_coordinates(
     [-0.148, 1.489, -0.881, -0.148, -0.009, 0.083])
@@ -446,6 +466,9 @@ class OffsetJoint:
     def __call__(self, value):
         return {self.joint_name: value + self.offset}
 
+    def derivative(self, value):
+        return {self.joint_name: 1.0}
+
 
 def kinematic_model_hook_barrett(kin, **kwargs):
     """Extends kinematic model to include links for embodiment mapping."""
@@ -1,6 +1,5 @@
 """Dataset that contains a sequence of robotic hand states."""
 import time
-import tqdm
 import copy
 import numpy as np
 import pandas as pd
@@ -43,6 +42,26 @@ class RoboticHandDataset:
         self.ee_poses.append(ee_pose)
         self.finger_joint_angles.append(copy.deepcopy(finger_joint_angles))
 
+    def extend(self, ee_poses, finger_joint_angles):
+        """Append trajectory to dataset.
+
+        Parameters
+        ----------
+        ee_poses : array, shape (n_steps, 4, 4)
+            Poses of the end effector.
+
+        finger_joint_angles : dict (str to array, shape (n_steps, n_joints))
+            Maps finger names to corresponding joint angles in the order that
+            is given in the target configuration.
+        """
+        n_steps = len(ee_poses)
+        self.n_samples += n_steps
+        self.ee_poses.extend(ee_poses)
+        self.finger_joint_angles.extend(
+            {finger_name: joint_angles[t]
+             for finger_name, joint_angles in finger_joint_angles.items()}
+            for t in range(n_steps))
+
     def add_constant_finger_joint(self, joint_name, angle):
         """Make finger joint constant.
 
@@ -168,7 +187,8 @@ class RoboticHandDataset:
         return self.finger_joint_angles[t]
 
 
-def convert_mocap_to_robot(dataset, pipeline, mocap_origin2origin=None, verbose=0):
+def convert_mocap_to_robot(dataset, pipeline, mocap_origin2origin=None, verbose=0,
+                           progress_bar=True):
     """Convert MoCap data to robot.
 
     Parameters
@@ -186,6 +206,9 @@ def convert_mocap_to_robot(dataset, pipeline, mocap_origin2origin=None, verbose=
     verbose : int, optional (default: 0)
         Verbosity level.
 
+    progress_bar : bool, optional (default: True)
+        Show progress bar.
+
     Returns
     -------
     output_dataset : RoboticHandDataset
@@ -195,15 +218,11 @@ def convert_mocap_to_robot(dataset, pipeline, mocap_origin2origin=None, verbose=
     pipeline.reset()
 
     start_time = time.time()
-    for t in tqdm.tqdm(range(dataset.n_steps)):
-        if mocap_origin2origin is not None and mocap_origin2origin.ndim == 3:
-            mocap_origin2origin_t = mocap_origin2origin[t]
-        else:
-            mocap_origin2origin_t = mocap_origin2origin
-        ee_pose, joint_angles = pipeline.estimate(
-            dataset.get_hand_markers(t), dataset.get_finger_markers(t),
-            mocap_origin2origin=mocap_origin2origin_t)
-        output_dataset.append(ee_pose, joint_angles)
+    ee_poses, joint_angles = pipeline.estimate_trajectory(
+        dataset.hand_trajectories, dataset.finger_trajectories,
+        mocap_origin2origin=mocap_origin2origin,
+        progress_bar=progress_bar)
+    output_dataset.extend(ee_poses, joint_angles)
 
     if verbose:
         duration = time.time() - start_time
@@ -1,5 +1,7 @@
 import numpy as np
+from hand_embodiment.embodiment import load_kinematic_model
 from hand_embodiment.kinematics import Kinematics
+from hand_embodiment.target_configurations import TARGET_CONFIG
 from numpy.testing import assert_array_almost_equal
 
 
@@ -127,3 +129,105 @@ def test_forward_inverse_trajectory_without_restarts():
     H2 = chain.forward_trajectory(Q2)
 
     assert_array_almost_equal(H, H2, decimal=3)
+
+
+def test_compiled_chain_forward():
+    kin = Kinematics(COMPI_URDF)
+    chain = kin.create_multi_chain(
+        ["joint%d" % i for i in range(1, 7)], "compi", ["tcp", "link4"])
+
+    random_state = np.random.RandomState(0)
+    for _ in range(10):
+        q = random_state.uniform(-np.pi, np.pi, chain.n_joints)
+        ee2base = chain.compiled_chain.forward(q)
+        for i in range(chain.n_joints):
+            kin.tm.set_joint(chain.joint_names[i], q[i])
+        for ee_index, ee2base_compiled in zip(chain.ee_indices, ee2base):
+            assert_array_almost_equal(
+                ee2base_compiled, kin.tm.get_ee2base(ee_index, chain.base_index))
+
+    desired_positions = chain.compiled_chain.forward(np.zeros(6))[:, :3, 3]
+    q = chain.inverse_position(desired_positions, np.full(6, 0.1))
+    assert_array_almost_equal(
+        kin.tm.get_ee2base(chain.ee_indices[0], chain.base_index),
+        chain.compiled_chain.forward(q)[0])
+
+
+def test_multi_chain_inverse_position_with_jacobian():
+    kin = Kinematics(COMPI_URDF)
+    joint_names = ["joint%d" % i for i in range(1, 7)]
+    chain = kin.create_multi_chain(joint_names, "compi", ["tcp", "link4"])
+
+    random_state = np.random.RandomState(1)
+    q = random_state.uniform(-1, 1, chain.n_joints)
+    _, jacobian = chain.compiled_chain.forward_position_jacobian(q)
+    for i in range(chain.n_joints):
+        dq = np.zeros(chain.n_joints)
+        dq[i] = 1e-6
+        numerical_derivative = (
+            chain.compiled_chain.forward(q + dq)[:, :3, 3]
+            - chain.compiled_chain.forward(q - dq)[:, :3, 3]) / 2e-6
+        assert_array_almost_equal(jacobian[:, :, i], numerical_derivative)
+
+    desired_positions = chain.compiled_chain.forward(q)[:, :3, 3]
+    for solver in ["slsqp", "dls"]:
+        chain = kin.create_multi_chain(
+            joint_names, "compi", ["tcp", "link4"], solver=solver)
+        _, error = chain.inverse_position(
+            desired_positions, q + 0.1, return_error=True)
+        assert error < 1e-3
+
+
+def test_kinematics_from_file():
+    model = TARGET_CONFIG["mia"]["model"]
+    with open(model["urdf"], "r") as f:
+        kin = Kinematics(f.read(), package_dir=model["package_dir"], scale=2.0)
+    cached_kin = Kinematics.from_file(
+        model["urdf"], package_dir=model["package_dir"], scale=2.0)
+    assert kin.tm.transforms.keys() == cached_kin.tm.transforms.keys()
+    for key, A2B in kin.tm.transforms.items():
+        assert_array_almost_equal(A2B, cached_kin.tm.transforms[key])
+    assert len(kin.tm.visuals) == len(cached_kin.tm.visuals)
+
+    # scaling must not modify the cached model
+    unscaled_kin = Kinematics.from_file(
+        model["urdf"], package_dir=model["package_dir"])
+    headless_kin = Kinematics.from_file(
+        model["urdf"], package_dir=model["package_dir"], headless=True)
+    assert not headless_kin.tm.visuals
+    assert not any(node.startswith("visual:")
+                   for node in headless_kin.tm.nodes)
+    ee2base = kin.tm.get_transform("thumb_fle", "palm")
+    assert_array_almost_equal(
+        unscaled_kin.tm.get_transform("thumb_fle", "palm")[:3, 3] * 2.0,
+        ee2base[:3, 3])
+    assert_array_almost_equal(
+        headless_kin.tm.get_transform("thumb_fle", "palm"),
+        unscaled_kin.tm.get_transform("thumb_fle", "palm"))
+
+
+def test_virtual_joint_derivatives():
+    config = TARGET_CONFIG["mia"]
+    kin, _ = load_kinematic_model(
+        config, unscaled_visual_model=False, headless=True)
+    chain = kin.create_multi_chain(
+        ["j_thumb_opp_binary", "j_thumb_fle"], config["base_frame"],
+        [config["ee_frames"]["thumb"]])
+    # the binary thumb joint is piecewise constant, also close to the step
+    _, jacobian = chain.compiled_chain.forward_position_jacobian(
+        np.array([1e-7, 0.3]))
+    assert_array_almost_equal(jacobian[:, :, 0], np.zeros((1, 3)))
+
+    config = TARGET_CONFIG["shadow"]
+    kin, _ = load_kinematic_model(
+        config, unscaled_visual_model=False, headless=True)
+    chain = kin.create_multi_chain(
+        config["joint_names"]["index"], config["base_frame"],
+        [config["ee_frames"]["index"]])
+    for q in [np.array([0.1, 0.2, 1.0]), np.array([0.1, 0.2, 2.0])]:
+        _, jacobian = chain.compiled_chain.forward_position_jacobian(q)
+        dq = np.array([0.0, 0.0, 1e-6])
+        numerical_derivative = (
+            chain.compiled_chain.forward(q + dq)[:, :3, 3]
+            - chain.compiled_chain.forward(q - dq)[:, :3, 3]) / 2e-6
+        assert_array_almost_equal(jacobian[:, :, 2], numerical_derivative)
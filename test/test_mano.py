@@ -1,5 +1,10 @@
 import numpy as np
-from hand_embodiment.mano import HandState
+import pytest
+from hand_embodiment.mano import (
+    HandState, hand_vertices, hand_vertices_batch, HAND_VERTICES_BACKENDS,
+    hand_vertices_python, set_hand_vertices_backend, compile_kintree,
+    HandVerticesWorkspace, load_model)
+from numpy.testing import assert_array_almost_equal
 
 
 def test_mano():
@@ -20,3 +25,106 @@ def test_mano():
 
     pc = mano.hand_pointcloud
     assert len(pc.points) == 778
+
+
+def test_lazy_mesh_update():
+    mano = HandState(left=False)
+    mesh = mano.hand_mesh
+    mano.pose[:] = 0.1
+    mano2world = np.eye(4)
+    mano2world[:3, 3] = 1.0
+    mano.recompute_mesh(mano2world)
+    assert mano.hand_mesh is mesh
+    assert_array_almost_equal(np.asarray(mesh.vertices), mano.vertices)
+    assert_array_almost_equal(
+        np.asarray(mano.hand_pointcloud.points), mano.vertices)
+    assert mesh.has_vertex_normals()
+
+    headless_mano = HandState(left=False, headless=True)
+    headless_mano.pose[:] = 0.1
+    headless_mano.recompute_mesh(mano2world)
+    assert_array_almost_equal(headless_mano.vertices, mano.vertices)
+
+    headless_mano.pose[:] = 0.0
+    headless_mano.recompute_mesh(np.eye(4), lazy=True)
+    headless_mano.pose[:] = 0.1
+    assert_array_almost_equal(
+        headless_mano.vertices, mano.vertices - mano2world[:3, 3])
+    with pytest.raises(RuntimeError):
+        headless_mano.hand_mesh
+
+
+def test_hand_vertices_batch():
+    mano = HandState(left=False)
+
+    random_state = np.random.RandomState(0)
+    poses = random_state.randn(5, mano.n_pose_parameters)
+    poses[0] = 0.0
+
+    vertices = hand_vertices_batch(poses=poses, **mano.pose_parameters)
+    assert vertices.shape == (5, 778, 3)
+    for t in range(len(poses)):
+        assert_array_almost_equal(
+            vertices[t], hand_vertices(pose=poses[t], **mano.pose_parameters))
+
+
+def test_hand_vertices_backends():
+    mano = HandState(left=False, headless=True)
+    pose = 0.3 * np.random.RandomState(1).randn(mano.n_pose_parameters)
+    expected = hand_vertices_python(pose=pose, **mano.pose_parameters)
+    for backend in HAND_VERTICES_BACKENDS:
+        set_hand_vertices_backend(backend)
+        try:
+            vertices = hand_vertices(pose=pose, **mano.pose_parameters)
+        finally:
+            set_hand_vertices_backend("numba")
+        assert_array_almost_equal(vertices, expected)
+
+    with pytest.raises(ValueError, match="Unknown or unavailable backend"):
+        set_hand_vertices_backend("fortran")
+
+
+def test_compile_kintree():
+    mano = HandState(left=False, headless=True)
+    parents, traversal_order = compile_kintree(
+        mano.pose_parameters["kintree_table"])
+    assert parents[0] == -1
+    for position, i in enumerate(traversal_order):
+        if parents[i] >= 0:
+            assert parents[i] in traversal_order[:position]
+
+    # parents do not have to be stored before their children
+    kintree_table = np.array([[-1, 2, 0], [0, 1, 2]])
+    parents, traversal_order = compile_kintree(kintree_table)
+    assert list(parents) == [-1, 2, 0]
+    assert list(traversal_order) == [0, 2, 1]
+
+
+def test_hand_vertices_workspace():
+    mano = HandState(left=False, headless=True)
+    workspace = HandVerticesWorkspace(**mano.pose_parameters)
+    random_state = np.random.RandomState(2)
+    for _ in range(3):
+        pose = 0.3 * random_state.randn(mano.n_pose_parameters)
+        vertices = workspace(pose)
+        assert vertices is workspace.vertices
+        assert_array_almost_equal(
+            vertices, hand_vertices_python(pose=pose, **mano.pose_parameters))
+
+    workspace.pose[:] = 0.0
+    assert_array_almost_equal(
+        workspace(), hand_vertices_python(**mano.pose_parameters))
+
+
+def test_load_model_cache():
+    model = load_model(left=False)
+    assert load_model(left=False)["posedirs"] is model["posedirs"]
+    assert not model["posedirs"].flags.writeable
+
+    reference = load_model(left=False, use_cache=False)
+    assert model.keys() == reference.keys()
+    for k in ["f", "kintree_table", "J", "weights", "posedirs", "v_template",
+              "shapedirs"]:
+        assert_array_almost_equal(model[k], reference[k])
+    assert_array_almost_equal(
+        model["J_regressor"].toarray(), reference["J_regressor"].toarray())
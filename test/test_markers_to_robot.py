@@ -1,6 +1,8 @@
 import numpy as np
+import pytest
 from hand_embodiment.mocap_dataset import HandMotionCaptureDataset
 from hand_embodiment.pipelines import MoCapToRobot
+from numpy.testing import assert_array_almost_equal
 
 
 def test_markers_to_robot_mia():
@@ -55,3 +57,61 @@ def _test_markers_to_robot(hand, demo_file, mocap_config, record_mapping_config,
         assert not np.any(np.isnan(ee_pose))
         for finger in joint_angles:
             assert not np.any(np.isnan(joint_angles[finger]))
+
+
+def test_estimate_trajectory():
+    dataset = HandMotionCaptureDataset(
+        "test/data/recording.tsv",
+        mocap_config="examples/config/markers/20210826_april.yaml",
+        skip_frames=100, start_idx=100, end_idx=1100,
+        interpolate_missing_markers=True)
+    mano_config = "examples/config/mano/20210616_april.yaml"
+    record_mapping_config = \
+        "examples/config/record_mapping/20211105_april.yaml"
+
+    pipeline = MoCapToRobot(
+        "mia", mano_config, dataset.finger_names,
+        record_mapping_config=record_mapping_config)
+    ee_poses, joint_angles = pipeline.estimate_trajectory(
+        dataset.hand_trajectories, dataset.finger_trajectories)
+    assert ee_poses.shape == (dataset.n_steps, 4, 4)
+
+    pipeline = MoCapToRobot(
+        "mia", mano_config, dataset.finger_names,
+        record_mapping_config=record_mapping_config)
+    for t in range(dataset.n_steps):
+        ee_pose, joint_angles_t = pipeline.estimate(
+            dataset.get_hand_markers(t), dataset.get_finger_markers(t))
+        assert_array_almost_equal(ee_poses[t], ee_pose)
+        for finger in joint_angles_t:
+            assert_array_almost_equal(
+                joint_angles[finger][t], joint_angles_t[finger])
+
+
+def test_headless_pipeline():
+    dataset = HandMotionCaptureDataset(
+        "test/data/recording.tsv",
+        mocap_config="examples/config/markers/20210826_april.yaml",
+        skip_frames=100, start_idx=100, end_idx=1100,
+        interpolate_missing_markers=True)
+    mano_config = "examples/config/mano/20210616_april.yaml"
+
+    results = []
+    for headless in [False, True]:
+        pipeline = MoCapToRobot(
+            "shadow", mano_config, dataset.finger_names, headless=headless)
+        results.append(pipeline.estimate_trajectory(
+            dataset.hand_trajectories, dataset.finger_trajectories))
+
+    embodiment_mapping = pipeline.embodiment_mapping_
+    assert embodiment_mapping.vis_kin is embodiment_mapping.target_kin
+    assert not pipeline.transform_manager_.visuals
+    with pytest.raises(RuntimeError):
+        pipeline.make_robot_artist()
+
+    (ee_poses, joint_angles), (headless_ee_poses, headless_joint_angles) = \
+        results
+    assert_array_almost_equal(ee_poses, headless_ee_poses)
+    for finger in joint_angles:
+        assert_array_almost_equal(
+            joint_angles[finger], headless_joint_angles[finger])
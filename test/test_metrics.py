@@ -0,0 +1,63 @@
+import numpy as np
+from hand_embodiment.mano import HandState
+from hand_embodiment.metrics import (
+    point_to_triangle, points_to_triangles, TriangleBVH,
+    vertices_to_surface_mesh, extract_mano_contact_surface,
+    MANO_CONTACT_SURFACE_VERTICES)
+from numpy.testing import assert_array_almost_equal
+
+
+def test_triangle_bvh():
+    rng = np.random.default_rng(0)
+    triangles = (0.1 * rng.standard_normal((200, 3, 3))
+                 + rng.standard_normal((200, 1, 3)))
+    points = rng.standard_normal((50, 3))
+
+    expected_distances = np.array([
+        min(point_to_triangle(point, triangle)[0] for triangle in triangles)
+        for point in points])
+    distances, closest_points, triangle_indices = TriangleBVH(
+        triangles).query(points)
+    assert_array_almost_equal(distances, expected_distances)
+    assert_array_almost_equal(
+        np.linalg.norm(points - closest_points, axis=1), distances)
+    for point, distance, triangle_idx in zip(
+            points, distances, triangle_indices):
+        assert_array_almost_equal(
+            point_to_triangle(point, triangles[triangle_idx])[0], distance)
+
+    assert_array_almost_equal(
+        vertices_to_surface_mesh(points, triangles),
+        np.mean(expected_distances))
+
+
+def test_points_to_triangles():
+    rng = np.random.default_rng(1)
+    triangles = rng.standard_normal((10, 3, 3))
+    points = 2.0 * rng.standard_normal((100, 3))
+
+    distances, closest_points, triangle_indices = points_to_triangles(
+        points, triangles, return_triangle_indices=True)
+    for i, point in enumerate(points):
+        results = [point_to_triangle(point, triangle)
+                   for triangle in triangles]
+        expected_idx = np.argmin([distance for distance, _ in results])
+        assert triangle_indices[i] == expected_idx
+        assert_array_almost_equal(distances[i], results[expected_idx][0])
+        assert_array_almost_equal(
+            closest_points[i], results[expected_idx][1])
+
+
+def test_extract_mano_contact_surface():
+    hand_state = HandState(left=False)
+    hand_state.pose[:] = 0.1
+    hand_state.recompute_mesh(np.eye(4))
+
+    vertices, triangles = extract_mano_contact_surface(hand_state, "index")
+    assert_array_almost_equal(
+        vertices, np.asarray(hand_state.hand_mesh.vertices))
+    vertex_indices = set(MANO_CONTACT_SURFACE_VERTICES["index"])
+    expected_triangles = [
+        triangle for triangle in np.asarray(hand_state.hand_mesh.triangles)
+        if any([vi in vertex_indices for vi in triangle])]
+    assert_array_almost_equal(triangles, expected_triangles)
@@ -0,0 +1,73 @@
+import os
+import shutil
+import numpy as np
+from hand_embodiment.mocap_dataset import (
+    load_qualisys_tsv, read_qualisys_tsv, HandMotionCaptureDataset)
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+
+
+def test_load_qualisys_tsv_with_cache(tmp_path):
+    filename = str(tmp_path / "recording.tsv")
+    shutil.copy("test/data/recording.tsv", filename)
+
+    recording = load_qualisys_tsv(filename, use_cache=False)
+    assert not os.path.exists(filename + ".cache.npz")
+    assert recording.positions.shape == (6000, 21, 3)
+    assert recording.frequency == 100.0
+    df = read_qualisys_tsv(filename, use_cache=False)
+    assert_array_equal(df["Frame"], recording.frames)
+    assert_array_almost_equal(
+        df[["hand_top X", "hand_top Y", "hand_top Z"]],
+        recording.marker_positions("hand_top"))
+
+    load_qualisys_tsv(filename)
+    assert os.path.exists(filename + ".cache.npz")
+    cached = load_qualisys_tsv(filename, dtype=np.float32)
+    assert cached.positions.dtype == np.float32
+    assert cached.marker_names == recording.marker_names
+    assert_array_almost_equal(cached.positions, recording.positions)
+
+    # modifying the file invalidates the cache
+    with open(filename, "r") as f:
+        lines = f.readlines()
+    with open(filename, "w") as f:
+        f.writelines(lines[:-1000])
+    os.utime(filename, ns=(0, 0))
+    assert load_qualisys_tsv(filename).n_frames == 5000
+
+
+def test_qualisys_cache_independent_of_dtype(tmp_path):
+    filename = str(tmp_path / "recording.tsv")
+    shutil.copy("test/data/recording.tsv", filename)
+    expected = load_qualisys_tsv(filename, unit="mm", use_cache=False)
+
+    recording = load_qualisys_tsv(filename, unit="mm", dtype=np.float32)
+    assert recording.positions.dtype == np.float32
+    recording = load_qualisys_tsv(filename, unit="mm")
+    assert recording.positions.dtype == np.float64
+    assert_array_equal(recording.positions, expected.positions)
+    recording = load_qualisys_tsv(filename, unit="mm", mmap_mode="r")
+    assert isinstance(recording.positions, np.memmap)
+    assert_array_equal(recording.positions, expected.positions)
+
+
+def test_memory_mapped_dataset(tmp_path):
+    filename = str(tmp_path / "recording.tsv")
+    shutil.copy("test/data/recording.tsv", filename)
+    kwargs = dict(mocap_config="examples/config/markers/20210826_april.yaml",
+                  skip_frames=7, start_idx=100, end_idx=-1, scale=2.0)
+    dataset = HandMotionCaptureDataset(filename, **kwargs)
+    mmap_dataset = HandMotionCaptureDataset(
+        filename, memory_map=True, **kwargs)
+
+    assert isinstance(mmap_dataset.marker_store.positions, np.memmap)
+    assert mmap_dataset.n_steps == dataset.n_steps
+    for t in [0, 10, dataset.n_steps - 1]:
+        assert_array_almost_equal(
+            mmap_dataset.get_markers(t), dataset.get_markers(t))
+    assert_array_almost_equal(
+        np.asarray(mmap_dataset.hand_trajectories[1]),
+        dataset.hand_trajectories[1])
+    assert_array_almost_equal(
+        mmap_dataset.finger_trajectories["thumb"][5:20, :, 2],
+        dataset.finger_trajectories["thumb"][5:20, :, 2])
@@ -1,5 +1,8 @@
 import numpy as np
-from hand_embodiment.record_markers import MarkerBasedRecordMapping
+import pytest
+from hand_embodiment.mano import hand_vertices_jacobian
+from hand_embodiment.record_markers import (
+    MarkerBasedRecordMapping, estimate_hand_pose, compute_mano2world)
 from numpy.testing import assert_array_almost_equal
 
 
@@ -27,3 +30,101 @@ def test_smoke_record():
              [0.0, 0.9961947, -0.08715574, 0.03555096],
              [0.99254615, -0.01062161, -0.12140559, 0.00757272],
              [0.0, 0.0, 0.0, 1.0]]))
+
+
+def test_finger_error_gradient():
+    rm = MarkerBasedRecordMapping()
+    random_state = np.random.RandomState(0)
+    for finger_name in ["thumb", "index"]:
+        finger_error = rm.mano_finger_kinematics_[finger_name].finger_error
+        finger_pose = 0.3 * random_state.randn(9)
+        desired_finger_pos = 0.05 * random_state.randn(2, 3)
+
+        error, gradient = finger_error.value_and_gradient(
+            finger_pose, desired_finger_pos)
+        assert_array_almost_equal(
+            error, finger_error(finger_pose, desired_finger_pos))
+
+        eps = 1e-6
+        numerical_gradient = np.array([
+            (finger_error(finger_pose + eps * e, desired_finger_pos)
+             - finger_error(finger_pose - eps * e, desired_finger_pos))
+            / (2.0 * eps) for e in np.eye(len(finger_pose))])
+        assert_array_almost_equal(gradient, numerical_gradient)
+
+    finger_kinematics = rm.mano_finger_kinematics_["index"]
+    positions, jacobian = finger_kinematics.forward_with_jacobian(finger_pose)
+    expected_positions, expected_jacobian = hand_vertices_jacobian(
+        pose=np.hstack(((0.0, 0.0, 0.0), finger_pose)),
+        **finger_kinematics.finger_pose_params)
+    assert_array_almost_equal(positions, expected_positions)
+    assert_array_almost_equal(jacobian, expected_jacobian[:, :, 3:])
+    assert not np.shares_memory(
+        jacobian, finger_kinematics.forward_with_jacobian(np.zeros(9))[1])
+
+    # list input and too many desired positions
+    assert_array_almost_equal(
+        finger_error(finger_pose, desired_finger_pos.tolist()),
+        finger_error(finger_pose, desired_finger_pos))
+    with pytest.raises(ValueError, match="More desired positions"):
+        finger_error(finger_pose, np.zeros((5, 3)))
+
+
+def test_levenberg_marquardt_solver():
+    rm = MarkerBasedRecordMapping(solver="lm")
+    finger_kinematics = rm.mano_finger_kinematics_["index"]
+    desired_finger_pos = finger_kinematics.forward(0.2 * np.ones(9))
+
+    finger_pose = finger_kinematics.inverse(desired_finger_pos)
+    assert np.all(finger_pose >= finger_kinematics.bounds[:, 0])
+    assert np.all(finger_pose <= finger_kinematics.bounds[:, 1])
+    # the action penalty keeps the solution slightly away from the targets
+    positions = finger_kinematics.forward(finger_pose)
+    assert np.all(
+        np.linalg.norm(positions - desired_finger_pos, axis=1) < 0.01)
+    slsqp_finger_kinematics = MarkerBasedRecordMapping(
+        solver="slsqp").mano_finger_kinematics_["index"]
+    assert_array_almost_equal(
+        positions, slsqp_finger_kinematics.forward(
+            slsqp_finger_kinematics.inverse(desired_finger_pos)), decimal=4)
+    cached_positions = finger_kinematics.forward(
+        None, return_cached_result=True)
+    assert_array_almost_equal(
+        cached_positions, finger_kinematics.forward(finger_pose))
+    # results are not overwritten by later calls
+    assert not np.shares_memory(
+        cached_positions, finger_kinematics.forward(np.zeros(9)))
+
+    finger_error = finger_kinematics.finger_error
+    assert (finger_error(finger_pose, desired_finger_pos)
+            < finger_error(np.zeros(9), desired_finger_pos))
+
+    with pytest.raises(ValueError, match="More desired positions"):
+        finger_kinematics.inverse(np.zeros((5, 3)))
+
+
+def test_estimate_hand_pose_trajectory():
+    random_state = np.random.RandomState(0)
+    hand_top, hand_left, hand_right = random_state.randn(3, 20, 3)
+    hand_top[5] = np.nan
+    hand_right[[0, 6]] = np.nan
+
+    hand_markers2world, valid = estimate_hand_pose(
+        hand_top, hand_left, hand_right, return_valid=True)
+    assert hand_markers2world.shape == (20, 4, 4)
+    assert not np.any(valid[[0, 5, 6]])
+    assert np.count_nonzero(valid) == 17
+    for t in np.nonzero(valid)[0]:
+        assert_array_almost_equal(
+            hand_markers2world[t],
+            estimate_hand_pose(hand_top[t], hand_left[t], hand_right[t]))
+
+    rm = MarkerBasedRecordMapping()
+    mano2world = rm.estimate_mano2world_trajectory(
+        [hand_top, hand_left, hand_right])
+    assert_array_almost_equal(mano2world[0], rm.mano2hand_markers_)
+    assert_array_almost_equal(mano2world[5], mano2world[4])
+    assert_array_almost_equal(mano2world[6], mano2world[4])
+    assert_array_almost_equal(
+        mano2world[7],
+        compute_mano2world(hand_markers2world[7], rm.mano2hand_markers_))
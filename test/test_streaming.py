@@ -0,0 +1,186 @@
+import asyncio
+import time
+import numpy as np
+from hand_embodiment.mocap_dataset import load_qualisys_tsv
+from hand_embodiment.pipelines import MoCapToRobot
+from hand_embodiment.streaming import (
+    MarkerFrame, MarkerToRobotService, ReplayMarkerSource, UdpMarkerSink,
+    UdpMarkerSource, encode_marker_frame, decode_marker_frame)
+from numpy.testing import assert_array_almost_equal
+
+
+MOCAP_CONFIG = "examples/config/markers/20210826_april.yaml"
+MANO_CONFIG = "examples/config/mano/20210616_april.yaml"
+FINGER_NAMES = ["thumb", "index", "middle", "ring", "little"]
+
+
+def test_encode_decode_marker_frame():
+    positions = np.array([[0.1, 0.2, 0.3], [np.nan, np.nan, np.nan]])
+    marker_frame = decode_marker_frame(encode_marker_frame(
+        MarkerFrame(5, 0.05, ["hand_top", "thumb_tip"], positions)))
+    assert marker_frame.frame == 5
+    assert marker_frame.time == 0.05
+    assert marker_frame.marker_names == ["hand_top", "thumb_tip"]
+    assert_array_almost_equal(marker_frame.positions, positions)
+
+
+def test_udp_marker_source():
+    async def send_and_receive():
+        source = UdpMarkerSource("127.0.0.1", 0, maxsize=10)
+        await source.start()
+        sink = UdpMarkerSink(*source.address_)
+        for i in range(3):
+            sink.send(MarkerFrame(i, 0.01 * i, ["hand_top"], np.ones((1, 3))))
+        sink.close()
+        received = []
+        async for marker_frame in source:
+            received.append(marker_frame.frame)
+            if len(received) == 3:
+                source.close()
+        return received
+
+    assert asyncio.run(send_and_receive()) == [0, 1, 2]
+
+
+def test_udp_marker_source_ignores_malformed_datagrams():
+    async def send_and_receive():
+        source = UdpMarkerSource("127.0.0.1", 0, maxsize=10)
+        await source.start()
+        sink = UdpMarkerSink(*source.address_)
+        for markers in ['{"hand_top": [1], "hand_left": [2]}',
+                        '{"hand_top": [1, 2, 3, 4, 5, 6]}',
+                        '{"hand_top": [1, 2, 3], "hand_left": [1, 2]}']:
+            sink._socket.sendto(
+                f'{{"frame": 0, "time": 0.0, "markers": {markers}}}'.encode(),
+                sink.address)
+        sink.send(MarkerFrame(1, 0.01, ["hand_top"], np.ones((1, 3))))
+        sink.close()
+        received = []
+        async for marker_frame in source:
+            received.append(marker_frame.frame)
+            source.close()
+        return source, received
+
+    source, received = asyncio.run(send_and_receive())
+    assert received == [1]
+    assert source.n_invalid_ == 3
+
+
+def test_service_replay():
+    filename = "test/data/recording.tsv"
+    pipeline = MoCapToRobot(
+        "shadow", MANO_CONFIG, FINGER_NAMES, headless=True)
+    service = MarkerToRobotService.from_mocap_config(
+        pipeline, MOCAP_CONFIG, maxsize=100)
+    states = []
+    service.subscribe(states.append)
+    source = ReplayMarkerSource(
+        filename, start_idx=100, end_idx=1100, skip_frames=100)
+    asyncio.run(service.run(source))
+
+    assert service.n_received_ == 10
+    assert service.n_dropped_ == 0
+    assert service.n_published_ + service.n_invalid_ == service.n_received_
+    assert service.latency_stats_["total"].count == service.n_published_
+
+    recording = load_qualisys_tsv(filename)
+    pipeline = MoCapToRobot(
+        "shadow", MANO_CONFIG, FINGER_NAMES, headless=True)
+    for state in states:
+        positions = recording.positions[state.frame - recording.frames[0]]
+        markers = dict(zip(recording.marker_names, positions))
+        ee_pose, joint_angles = pipeline.estimate(
+            [markers[name] for name in service.hand_marker_names],
+            {finger_name: np.array([markers[name] for name in marker_names])
+             for finger_name, marker_names
+             in service.finger_marker_names.items()})
+        assert_array_almost_equal(state.ee_pose, ee_pose)
+        for finger_name in joint_angles:
+            assert_array_almost_equal(
+                state.joint_angles[finger_name], joint_angles[finger_name])
+
+
+def test_service_drops_frames():
+    pipeline = MoCapToRobot(
+        "shadow", MANO_CONFIG, FINGER_NAMES, headless=True)
+    service = MarkerToRobotService.from_mocap_config(
+        pipeline, MOCAP_CONFIG, maxsize=1)
+    states = []
+    service.subscribe(states.append)
+
+    recording = load_qualisys_tsv("test/data/recording.tsv")
+
+    async def burst():  # does not give the service a chance to convert
+        for t in range(100, 1100, 50):
+            yield MarkerFrame(
+                recording.frames[t], recording.time[t],
+                recording.marker_names, recording.positions[t])
+
+    asyncio.run(service.run(burst()))
+    assert service.n_received_ == 20
+    assert service.n_dropped_ > 0
+    assert (service.n_published_ + service.n_invalid_ + service.n_dropped_
+            == service.n_received_)
+    assert states[-1].frame == recording.frames[1050]
+
+
+def test_service_skips_frames_without_hand_markers():
+    pipeline = MoCapToRobot(
+        "shadow", MANO_CONFIG, FINGER_NAMES, headless=True)
+    service = MarkerToRobotService.from_mocap_config(
+        pipeline, MOCAP_CONFIG, maxsize=10)
+    states = []
+    service.subscribe(states.append)
+
+    recording = load_qualisys_tsv("test/data/recording.tsv")
+    positions = recording.positions[100]
+    without_hand_top = [name != "hand_top" for name in recording.marker_names]
+    occluded = np.copy(positions)
+    occluded[recording.marker_names.index("hand_left")] = np.nan
+
+    async def frames():
+        yield MarkerFrame(
+            0, 0.0, [name for name in recording.marker_names
+                     if name != "hand_top"], positions[without_hand_top])
+        yield MarkerFrame(1, 0.01, recording.marker_names, occluded)
+        yield MarkerFrame(2, 0.02, recording.marker_names, positions)
+
+    asyncio.run(service.run(frames()))
+    assert service.n_received_ == 3
+    assert service.n_invalid_ == 2
+    assert [state.frame for state in states] == [2]
+
+
+def test_replay_marker_source_real_time():
+    source = ReplayMarkerSource(
+        "test/data/recording.tsv", end_idx=20, speed=2.0)
+    assert source.period == 0.005
+    start_time = time.perf_counter()
+    frames = [marker_frame.frame for marker_frame in source]
+    assert time.perf_counter() - start_time >= 19 * source.period
+    assert len(frames) == 20
+    assert source.n_emitted_ == 20
+    assert source.n_dropped_ == 0
+
+
+def test_replay_marker_source_slow_consumer():
+    source = ReplayMarkerSource(
+        "test/data/recording.tsv", end_idx=40, speed=5.0, drop_late=True)
+
+    async def consume():
+        frames = []
+        async for marker_frame in source:
+            frames.append(marker_frame.frame)
+            await asyncio.sleep(3 * source.period)
+        return frames
+
+    frames = asyncio.run(consume())
+    assert source.n_dropped_ > 0
+    assert source.n_emitted_ + source.n_dropped_ == 40
+    assert frames[-1] == source.recording.frames[39]
+
+    source.drop_late = False
+    asyncio.run(consume())
+    assert source.n_emitted_ == 40
+    assert source.n_late_ > 0
+    assert source.max_lateness_ > source.late_tolerance